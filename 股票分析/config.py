@@ -12,6 +12,51 @@ MODEL_CONFIG = {
     'weight_decay': 1e-5,       # 权重衰减
     'batch_size': 32,           # 批次大小
     'epochs': 100,              # 训练轮数
+    'extended_features': False, # 是否使用扩展技术指标特征（ATR、KDJ、CCI等）
+    'pooled_batch_size': 256,   # 多只股票联合训练的批次大小
+    'mixed_precision': False,   # 训练时使用 torch.autocast 混合精度（CPU 上为 bfloat16）
+    'compile_model': False,     # 训练时使用 torch.compile 编译模型（首个批次需要额外编译时间）
+    'checkpoint_interval': 10,  # 最佳模型每隔多少个epoch写盘一次（0表示只在训练结束时写）
+    'quantized_inference': False, # 预测时使用动态 int8 量化模型（仅CPU）
+    'architecture': 'full',     # 模型结构，ARCHITECTURE_CONFIG 中的名称
+}
+
+# R-CSAN 结构预设：只列出与完整结构不同的分支参数（参数含义见 rcsan_model.ARCHITECTURE_DEFAULTS）
+ARCHITECTURE_CONFIG = {
+    'full': {},                 # 卷积 + 通道/空间注意力 + Transformer + 双向LSTM + 注意力融合
+    'transformer_only': {       # 只保留 Transformer 编码器
+        'conv_layers': 0,
+        'channel_spatial_attention': False,
+        'lstm_layers': 0,
+        'attention_fusion': False,
+    },
+    'conv_lstm': {              # 卷积 + 注意力 + LSTM，去掉 Transformer 和注意力融合
+        'transformer_layers': 0,
+        'attention_fusion': False,
+    },
+    'lite': {                   # 各分支减半的轻量结构
+        'conv_layers': 2,
+        'transformer_layers': 2,
+        'lstm_layers': 1,
+        'bidirectional': False,
+        'attention_fusion': False,
+    },
+}
+
+# 超参数搜索配置
+SWEEP_CONFIG = {
+    'search_space': {           # 每个参数的候选值，按网格组合
+        'hidden_dim': [64, 128],
+        'num_layers': [2, 4],
+        'num_heads': [4, 8],
+        'dropout': [0.1, 0.2],
+        'sequence_length': [30, 60],
+    },
+    'epochs': 30,               # 每组参数的最大训练轮数
+    'batch_size': 32,           # 批次大小
+    'max_workers': None,        # 并行进程数，None 表示按CPU核数
+    'prune_after': 5,           # 前几个epoch不剪枝
+    'prune_min_trials': 3,      # 同一epoch至少有几组其他参数的结果才剪枝
 }
 
 # 数据获取配置
@@ -20,6 +65,34 @@ DATA_CONFIG = {
     'min_data_length': 100,     # 最小数据长度
     'max_retries': 3,           # 最大重试次数
     'timeout': 10,              # 请求超时时间
+    'max_workers': 8,           # 批量获取时的最大并发线程数
+    'per_host_limit': 4,        # 单个数据源主机的最大并发连接数
+    'sina_batch_size': 80,      # 新浪行情接口单次请求的股票数
+    'backoff_base': 0.5,        # 重试退避基数（秒），第n次重试最多等待 base * 2^n
+    'backoff_max': 8.0,         # 单次重试最长等待时间（秒）
+    'rate_limit': 10,           # 默认每个数据源每秒请求数
+    'rate_burst': 20,           # 令牌桶容量（允许的突发请求数）
+    'rate_limits': {            # 按数据源单独设置的每秒请求数
+        'eastmoney': 10,
+        'sina': 5,
+    },
+    'breaker_threshold': 5,     # 连续失败多少次后熔断
+    'breaker_cooldown': 60,     # 熔断冷却时间（秒）
+}
+
+# HTTP响应缓存配置
+CACHE_CONFIG = {
+    'enabled': True,            # 是否启用缓存
+    'max_entries': 1024,        # 内存中最多缓存的响应数（LRU淘汰）
+    'ttl': 600,                 # 缓存有效期（秒）
+    'sqlite_path': None,        # SQLite缓存文件路径，None表示仅使用内存
+}
+
+# 实时行情配置
+REALTIME_CONFIG = {
+    'poll_interval': 3,         # 轮询间隔（秒）
+    'buffer_size': 4096,        # 每只股票保留的快照条数
+    'bar_seconds': 60,          # 实时合成K线的周期（秒）
 }
 
 # 技术指标配置
@@ -31,6 +104,21 @@ INDICATOR_CONFIG = {
     'macd_signal': 9,               # MACD信号线
     'bb_period': 20,                # 布林带周期
     'bb_std': 2,                    # 布林带标准差倍数
+    'indicators': ['ma', 'rsi', 'macd', 'bollinger'],  # 计算的指标及输出列顺序（见 indicators.INDICATOR_REGISTRY）
+    # 扩展指标（模型的可选特征）
+    'extended_indicators': ['atr', 'obv', 'kdj', 'cci', 'williams_r', 'vwap', 'zscore'],
+    # 可选指标（加入上面两个列表即可计算）：'wilder_rsi'（Wilder 平滑的RSI，输出列 rsi_wilder）、'sar'（抛物线转向）
+    'atr_period': 14,               # ATR周期
+    'kdj_n': 9,                     # KDJ的RSV周期
+    'kdj_m1': 3,                    # K值平滑
+    'kdj_m2': 3,                    # D值平滑
+    'cci_period': 14,               # CCI周期
+    'wr_period': 14,                # 威廉指标周期
+    'vwap_period': 20,              # 滚动VWAP周期
+    'zscore_period': 20,            # 滚动Z分数周期
+    'zscore_columns': ['close', 'volume'],
+    'sar_step': 0.02,               # SAR加速因子步长
+    'sar_max': 0.2,                 # SAR加速因子上限
 }
 
 # 可视化配置
@@ -55,6 +143,12 @@ API_CONFIG = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
     },
+    'eastmoney_list': {
+        'base_url': 'https://82.push2.eastmoney.com/api/qt/clist/get',
+        'headers': {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+    },
     'sina': {
         'base_url': 'https://hq.sinajs.cn/list=',
         'headers': {
@@ -1,22 +1,98 @@
 import requests
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+import threading
+import os
+import io
+import re
 import json
 import time
 import warnings
 warnings.filterwarnings('ignore')
 
+from config import DATA_CONFIG, PATH_CONFIG, CACHE_CONFIG
+from kline_store import KlineStore, resample_klines
+from universe import StockUniverse
+from schema import compact_frame
+from indicators import IndicatorPlan, frames_to_panel
+from http_cache import ResponseCache
+from rate_limiter import (TokenBucket, CircuitBreaker, SourceUnavailableError,
+                          RetryableHTTPError, backoff_delay)
+
+# 新浪行情接口每行格式: var hq_str_sh600000="浦发银行,...";
+SINA_QUOTE_PATTERN = re.compile(r'var hq_str_(\w+)="([^"]*)";')
+
+# 东方财富K线周期参数 klt
+KLINE_PERIODS = {
+    '1min': '1',
+    '5min': '5',
+    '15min': '15',
+    '30min': '30',
+    '60min': '60',
+    'daily': '101',
+    'weekly': '102',
+    'monthly': '103',
+}
+
 class StockDataCrawler:
     """股票数据爬虫类，支持从东方财富和新浪财经获取数据"""
     
-    def __init__(self):
+    # 东方财富K线字段顺序（日期之后）
+    KLINE_COLUMNS = ['open', 'close', 'high', 'low', 'volume', 'amount',
+                     'amplitude', 'change_pct', 'change', 'turnover']
+    
+    def __init__(self, data_dir=None, use_store=True, cache=None):
         self.eastmoney_base_url = "https://push2his.eastmoney.com/api/qt/stock/kline/get"
         self.sina_base_url = "https://hq.sinajs.cn/list="
+        self.eastmoney_list_url = "https://82.push2.eastmoney.com/api/qt/clist/get"
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
         
+        # 并发配置：连接池大小与线程数保持一致，避免批量获取时连接被反复丢弃
+        self.max_workers = DATA_CONFIG.get('max_workers', 8)
+        self.per_host_limit = DATA_CONFIG.get('per_host_limit', 4)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=4, pool_maxsize=max(self.max_workers, self.per_host_limit)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._host_semaphores = {}
+        self._host_lock = threading.Lock()
+        
+        # 本地K线存储：日常刷新只请求缺失的区间
+        self.data_dir = data_dir or PATH_CONFIG['data_dir']
+        self.use_store = use_store
+        self._stores = {}
+        self.store = self.store_for('daily')
+        
+        # 全市场代码表（本地缓存，按需每日刷新）
+        self.universe = StockUniverse(self.data_dir)
+        
+        # HTTP响应缓存：同一交易时段内重复查询不再请求网络
+        if cache is None and CACHE_CONFIG.get('enabled', True):
+            cache = ResponseCache(
+                max_entries=CACHE_CONFIG.get('max_entries', 1024),
+                ttl=CACHE_CONFIG.get('ttl', 600),
+                sqlite_path=CACHE_CONFIG.get('sqlite_path')
+            )
+        self.cache = cache or None
+        
+        # 重试、限流与熔断，按数据源分别计数
+        self.max_retries = DATA_CONFIG.get('max_retries', 3)
+        self.backoff_base = DATA_CONFIG.get('backoff_base', 0.5)
+        self.backoff_max = DATA_CONFIG.get('backoff_max', 8.0)
+        self._rate_limiters = {}
+        self._breakers = {}
+        
+        # 技术指标计算图（按 INDICATOR_CONFIG 展开）
+        self.indicator_plan = IndicatorPlan()
+        self.extended_indicator_plan = IndicatorPlan(extended=True)
+        
         # 常见股票名称字典
         self.stock_names = {
             '000001': '平安银行',
@@ -41,8 +117,24 @@ class StockDataCrawler:
             '601012': '隆基绿能'
         }
     
+    def store_for(self, period='daily'):
+        """获取指定周期的本地K线存储，日K线位于 kline/，其他周期位于 kline_{周期}/"""
+        if not self.use_store:
+            return None
+        if period not in KLINE_PERIODS:
+            raise ValueError(f"不支持的K线周期: {period}")
+        with self._host_lock:
+            if period not in self._stores:
+                dirname = 'kline' if period == 'daily' else f'kline_{period}'
+                self._stores[period] = KlineStore(os.path.join(self.data_dir, dirname))
+            return self._stores[period]
+    
     def get_stock_code_format(self, stock_code):
         """格式化股票代码"""
+        exchange = self.universe.exchange(stock_code)
+        if exchange:
+            return f"{exchange}{stock_code}"
+        
         if stock_code.startswith('6'):
             return f"sh{stock_code}"  # 上海交易所
         elif stock_code.startswith(('0', '3')):
@@ -50,31 +142,57 @@ class StockDataCrawler:
         else:
             return stock_code
     
+    def refresh_universe(self, force=False, page_size=100):
+        """分页获取全市场A股代码表并缓存到本地，当天已更新过时直接使用本地文件"""
+        if not force and not self.universe.is_stale():
+            self.universe.load()
+            return self.universe
+        
+        params = {
+            'pn': 1,
+            'pz': page_size,
+            'po': 1,
+            'np': 1,
+            'fltt': 2,
+            'invt': 2,
+            'fid': 'f12',
+            'fs': 'm:0+t:6,m:0+t:80,m:1+t:2,m:1+t:23,m:0+t:81+s:2048',  # 沪深主板、创业板、科创板、北交所
+            'fields': 'f12,f13,f14',
+        }
+        
+        def fetch_page(page):
+            text = self._http_get(self.eastmoney_list_url, params=dict(params, pn=page))
+            return StockUniverse.parse_page(json.loads(text))
+        
+        rows, total = fetch_page(1)
+        pages = -(-total // page_size) if total else 1
+        if pages > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, pages - 1)) as executor:
+                for page_rows, _ in executor.map(fetch_page, range(2, pages + 1)):
+                    rows.extend(page_rows)
+        
+        if not rows:
+            raise ValueError("东方财富列表接口未返回股票数据")
+        
+        self.universe.save(rows)
+        print(f"全市场代码表已更新: {len(self.universe)} 只股票")
+        return self.universe
+    
     def get_stock_name(self, stock_code):
         """获取股票名称"""
-        # 首先检查本地字典
+        # 首先检查本地字典和全市场代码表
         if stock_code in self.stock_names:
             return self.stock_names[stock_code]
         
+        universe_name = self.universe.name(stock_code)
+        if universe_name:
+            return universe_name
+        
         try:
             # 从新浪获取股票名称
-            formatted_code = self.get_stock_code_format(stock_code)
-            url = f"{self.sina_base_url}{formatted_code}"
-            
-            response = self.session.get(url, timeout=5)
-            
-            if response.status_code == 200:
-                content = response.text
-                if content and 'var hq_str_' in content:
-                    data_str = content.split('="')[1].split('";')[0]
-                    data_parts = data_str.split(',')
-                    
-                    if len(data_parts) >= 1 and data_parts[0] and data_parts[0] != '':
-                        stock_name = data_parts[0].strip()
-                        if stock_name and stock_name != stock_code:
-                            # 缓存获取到的名称
-                            self.stock_names[stock_code] = stock_name
-                            return stock_name
+            self.get_realtime_quotes([stock_code])
+            if stock_code in self.stock_names:
+                return self.stock_names[stock_code]
             
             # 如果新浪获取失败，返回默认名称
             return f"股票{stock_code}"
@@ -83,66 +201,259 @@ class StockDataCrawler:
             print(f"获取股票名称失败: {str(e)}")
             return f"股票{stock_code}"
     
-    def crawl_eastmoney_data(self, stock_code, days=200):
-        """从东方财富获取股票历史数据"""
-        try:
-            # 计算开始日期
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days)
-            
-            # 格式化股票代码
-            if stock_code.startswith('6'):
-                secid = f"1.{stock_code}"  # 上海
-            else:
-                secid = f"0.{stock_code}"  # 深圳
-            
-            params = {
-                'secid': secid,
-                'ut': 'fa5fd1943c7b386f172d6893dbfba10b',
-                'fields1': 'f1,f2,f3,f4,f5,f6',
-                'fields2': 'f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61',
-                'klt': '101',  # 日K线
-                'fqt': '1',    # 前复权
-                'beg': start_date.strftime('%Y%m%d'),
-                'end': end_date.strftime('%Y%m%d'),
-                '_': str(int(time.time() * 1000))
-            }
-            
-            response = self.session.get(self.eastmoney_base_url, params=params, timeout=10)
+    @staticmethod
+    def parse_sina_quotes(content):
+        """一次性解析新浪行情接口返回的多行 var hq_str_xxx="..."; 文本
+        
+        返回 {股票代码: 字段列表}，没有行情的代码（空字符串）不包含在结果中。
+        """
+        quotes = {}
+        for symbol, data_str in SINA_QUOTE_PATTERN.findall(content or ''):
+            if data_str:
+                code = symbol[2:] if symbol[:2] in ('sh', 'sz', 'bj') else symbol
+                quotes[code] = data_str.split(',')
+        return quotes
+    
+    @staticmethod
+    def _sina_snapshot(data_parts):
+        """新浪行情字段转为快照字典，字段不足时返回 None"""
+        if len(data_parts) < 32:
+            return None
+        return {
+            'name': data_parts[0],
+            'open': float(data_parts[1]) if data_parts[1] else 0,
+            'close_yesterday': float(data_parts[2]) if data_parts[2] else 0,
+            'close': float(data_parts[3]) if data_parts[3] else 0,
+            'high': float(data_parts[4]) if data_parts[4] else 0,
+            'low': float(data_parts[5]) if data_parts[5] else 0,
+            'volume': float(data_parts[8]) if data_parts[8] else 0,
+            'amount': float(data_parts[9]) if data_parts[9] else 0,
+            'date': data_parts[30],
+            'time': data_parts[31]
+        }
+    
+    def get_realtime_quotes(self, codes, batch_size=None, use_cache=True):
+        """批量获取新浪实时行情
+        
+        每次请求最多携带 batch_size 个代码，同时把获取到的名称写入 stock_names。
+        返回以 code 列标识股票的快照 DataFrame，没有行情的代码不出现在结果中。
+        """
+        codes = list(dict.fromkeys(codes))
+        batch_size = batch_size or DATA_CONFIG.get('sina_batch_size', 80)
+        snapshots = []
+        
+        for i in range(0, len(codes), batch_size):
+            batch = codes[i:i + batch_size]
+            url = f"{self.sina_base_url}{','.join(self.get_stock_code_format(code) for code in batch)}"
+            quotes = self.parse_sina_quotes(self._http_get(url, timeout=10, use_cache=use_cache))
             
-            if response.status_code == 200:
-                data = response.json()
+            for code in batch:
+                data_parts = quotes.get(code)
+                if not data_parts:
+                    continue
                 
-                if 'data' in data and data['data'] and 'klines' in data['data']:
-                    klines = data['data']['klines']
-                    df_data = []
-                    
-                    for kline in klines:
-                        parts = kline.split(',')
-                        if len(parts) >= 11:
-                            df_data.append({
-                                'date': parts[0],
-                                'open': float(parts[1]),
-                                'close': float(parts[2]),
-                                'high': float(parts[3]),
-                                'low': float(parts[4]),
-                                'volume': float(parts[5]),
-                                'amount': float(parts[6]),
-                                'amplitude': float(parts[7]),
-                                'change_pct': float(parts[8]),
-                                'change': float(parts[9]),
-                                'turnover': float(parts[10])
-                            })
-                    
-                    df = pd.DataFrame(df_data)
-                    df['date'] = pd.to_datetime(df['date'])
-                    df = df.sort_values('date').reset_index(drop=True)
-                    
-                    print(f"成功从东方财富获取到 {len(df)} 条数据")
-                    return df
+                stock_name = data_parts[0].strip()
+                if stock_name and stock_name != code:
+                    self.stock_names[code] = stock_name
                 
-            print("东方财富API返回数据格式异常")
-            return None
+                snapshot = self._sina_snapshot(data_parts)
+                if snapshot is not None:
+                    snapshot['code'] = code
+                    snapshots.append(snapshot)
+        
+        columns = ['code', 'name', 'open', 'close_yesterday', 'close', 'high', 'low',
+                   'volume', 'amount', 'date', 'time']
+        return pd.DataFrame(snapshots, columns=columns)
+    
+    def _host_slot(self, url):
+        """获取目标主机的并发信号量，限制单个数据源的同时连接数"""
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_semaphores[host]
+    
+    def _source_of(self, url):
+        """根据URL判断数据源名称"""
+        if url.startswith(self.eastmoney_base_url):
+            return 'eastmoney'
+        if url.startswith(self.sina_base_url):
+            return 'sina'
+        return urlparse(url).netloc
+    
+    def _source_guard(self, source):
+        """获取数据源对应的 (限流器, 熔断器)"""
+        with self._host_lock:
+            if source not in self._rate_limiters:
+                rate = DATA_CONFIG.get('rate_limits', {}).get(source, DATA_CONFIG.get('rate_limit', 10))
+                self._rate_limiters[source] = TokenBucket(rate, burst=DATA_CONFIG.get('rate_burst'))
+                self._breakers[source] = CircuitBreaker(
+                    threshold=DATA_CONFIG.get('breaker_threshold', 5),
+                    cooldown=DATA_CONFIG.get('breaker_cooldown', 60)
+                )
+            return self._rate_limiters[source], self._breakers[source]
+    
+    def _http_get(self, url, params=None, timeout=None, use_cache=True):
+        """带缓存、限流、重试和熔断的GET请求，返回响应文本
+        
+        网络异常、HTTP 429 和 5xx 按指数退避（带抖动）重试 max_retries 次；
+        连续失败达到阈值后该数据源熔断一段时间，期间直接抛出 SourceUnavailableError。
+        其他状态码（4xx）直接抛出 ValueError，不重试也不计入熔断。
+        use_cache=False 时跳过缓存（实时轮询）。
+        """
+        use_cache = use_cache and self.cache is not None
+        key = ResponseCache.make_key(url, params)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        source = self._source_of(url)
+        limiter, breaker = self._source_guard(source)
+        if not breaker.allow():
+            raise SourceUnavailableError(f"数据源 {source} 连续失败，熔断冷却中")
+        
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            try:
+                with self._host_slot(url):
+                    response = self.session.get(url, params=params,
+                                                timeout=timeout or DATA_CONFIG.get('timeout', 10))
+                
+                if response.status_code == 429:
+                    limiter.penalize()
+                    raise RetryableHTTPError(response.status_code)
+                if response.status_code >= 500:
+                    raise RetryableHTTPError(response.status_code)
+                if response.status_code != 200:
+                    # 4xx 是请求本身的问题（如代码不存在），数据源正常响应，不计入熔断
+                    breaker.record_success()
+                    raise ValueError(f"请求 {urlparse(url).netloc} 返回状态码 {response.status_code}")
+                
+                text = response.text
+                break
+                
+            except (requests.RequestException, RetryableHTTPError) as e:
+                if attempt >= self.max_retries:
+                    breaker.record_failure()
+                    raise
+                time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+        
+        breaker.record_success()
+        limiter.reward()
+        if use_cache:
+            self.cache.set(key, text)
+        return text
+    
+    def _fetch_eastmoney_klines(self, stock_code, start_date, end_date, period='daily'):
+        """请求东方财富K线接口并解析为DataFrame，失败时抛出异常"""
+        # 格式化股票代码：上海为1，深圳、北京为0
+        if self.get_stock_code_format(stock_code).startswith('sh'):
+            secid = f"1.{stock_code}"
+        else:
+            secid = f"0.{stock_code}"
+        
+        params = {
+            'secid': secid,
+            'ut': 'fa5fd1943c7b386f172d6893dbfba10b',
+            'fields1': 'f1,f2,f3,f4,f5,f6',
+            'fields2': 'f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61',
+            'klt': KLINE_PERIODS[period],  # K线周期
+            'fqt': '1',    # 前复权
+            'beg': start_date.strftime('%Y%m%d'),
+            'end': end_date.strftime('%Y%m%d'),
+            '_': str(int(time.time() * 1000))
+        }
+        
+        data = json.loads(self._http_get(self.eastmoney_base_url, params=params))
+        if not ('data' in data and data['data'] and 'klines' in data['data']):
+            raise ValueError("东方财富API返回数据格式异常")
+        
+        df = self.parse_klines(data['data']['klines'])
+        if len(df) == 0:
+            raise ValueError("东方财富API返回数据格式异常")
+        return df
+    
+    @staticmethod
+    def parse_klines(klines):
+        """批量解析东方财富K线字符串
+        
+        把所有K线拼接成一个CSV缓冲区，交给 pandas 的C解析器一次性转换为
+        float64 列，避免逐行 split 和构造字典。
+        """
+        if not klines:
+            return pd.DataFrame(columns=['date'] + StockDataCrawler.KLINE_COLUMNS)
+        
+        buffer = io.StringIO('\n'.join(klines))
+        df = pd.read_csv(
+            buffer,
+            header=None,
+            names=['date'] + StockDataCrawler.KLINE_COLUMNS,
+            usecols=range(len(StockDataCrawler.KLINE_COLUMNS) + 1),
+            dtype={col: 'float64' for col in StockDataCrawler.KLINE_COLUMNS},
+            na_values=['-'],
+        )
+        # 字段不足的K线视为无效数据；停牌或新股当天换手率等字段为 '-'，按0处理，保留这根K线
+        # 只对换手率缺失的行数一数字段，区分两种情况
+        missing = np.flatnonzero(df['turnover'].isna().to_numpy())
+        if len(missing) > 0:
+            short = [i for i in missing if klines[i].count(',') < len(StockDataCrawler.KLINE_COLUMNS)]
+            df = df.drop(index=short)
+        rate_columns = ['amplitude', 'change_pct', 'change', 'turnover']
+        df[rate_columns] = df[rate_columns].fillna(0.0)
+        if len(df) == 0:
+            return df.reset_index(drop=True)
+        
+        # 显式指定日期格式，走快速解析路径（分钟K线带时间）
+        date_format = '%Y-%m-%d %H:%M' if len(df['date'].iloc[0]) > 10 else '%Y-%m-%d'
+        df['date'] = pd.to_datetime(df['date'], format=date_format)
+        if not df['date'].is_monotonic_increasing:
+            df = df.sort_values('date', kind='stable')
+        return df.reset_index(drop=True)
+    
+    def _get_history(self, stock_code, days=200, period='daily'):
+        """获取最近 days 天的K线，启用本地存储时只请求缺失的区间"""
+        end_date = datetime.now()
+        start_date = pd.Timestamp(end_date - timedelta(days=days)).normalize()
+        store = self.store_for(period)
+        
+        if store is None:
+            return self._fetch_eastmoney_klines(stock_code, start_date, end_date, period)
+        
+        meta = store.get_meta(stock_code)
+        if meta is None or meta['start'] > start_date:
+            # 本地没有数据或覆盖区间不够，整体获取
+            df = self._fetch_eastmoney_klines(stock_code, start_date, end_date, period)
+            store.write(stock_code, df, start_date)
+            return df
+        
+        # 从倒数第二根K线开始请求：最后一根可能是盘中未完成的K线，需要覆盖；
+        # 倒数第二根已收盘，用来校验复权价格是否发生变化
+        tail = store.tail(stock_code, 2)
+        overlap_date = pd.Timestamp(tail['date'][0])
+        delta = self._fetch_eastmoney_klines(stock_code, overlap_date, end_date, period)
+        
+        anchor = delta[delta['date'] == overlap_date]
+        if len(tail) > 1 and (len(anchor) == 0 or abs(anchor['close'].iloc[0] - tail['close'][0]) > 1e-6):
+            # 前复权价格整体变化（分红送股等），本地历史作废，重新获取
+            print(f"股票 {stock_code} 复权价格发生变化，重新获取完整数据")
+            full_start = min(meta['start'], start_date)
+            df = self._fetch_eastmoney_klines(stock_code, full_start, end_date, period)
+            store.write(stock_code, df, full_start)
+        else:
+            store.append(stock_code, delta[delta['date'] >= overlap_date])
+        
+        return store.load(stock_code, start=start_date)
+    
+    def crawl_eastmoney_data(self, stock_code, days=200, period='daily'):
+        """从东方财富获取股票历史数据
+        
+        period 可选 1min/5min/15min/30min/60min/daily/weekly/monthly
+        """
+        try:
+            df = self._get_history(stock_code, days, period)
+            print(f"成功从东方财富获取到 {len(df)} 条数据")
+            return df
             
         except Exception as e:
             print(f"从东方财富获取数据失败: {str(e)}")
@@ -151,34 +462,13 @@ class StockDataCrawler:
     def crawl_sina_data(self, stock_code, days=200):
         """从新浪财经获取股票数据（作为备用）"""
         try:
-            formatted_code = self.get_stock_code_format(stock_code)
-            url = f"{self.sina_base_url}{formatted_code}"
+            quotes = self.get_realtime_quotes([stock_code])
             
-            response = self.session.get(url, timeout=10)
+            if len(quotes) > 0:
+                current_data = quotes.drop(columns=['code'])
+                print(f"成功从新浪财经获取到当前数据: {current_data['name'].iloc[0]}")
+                return current_data
             
-            if response.status_code == 200:
-                content = response.text
-                if content and 'var hq_str_' in content:
-                    data_str = content.split('="')[1].split('";')[0]
-                    data_parts = data_str.split(',')
-                    
-                    if len(data_parts) >= 32:
-                        current_data = {
-                            'name': data_parts[0],
-                            'open': float(data_parts[1]) if data_parts[1] else 0,
-                            'close_yesterday': float(data_parts[2]) if data_parts[2] else 0,
-                            'close': float(data_parts[3]) if data_parts[3] else 0,
-                            'high': float(data_parts[4]) if data_parts[4] else 0,
-                            'low': float(data_parts[5]) if data_parts[5] else 0,
-                            'volume': float(data_parts[8]) if data_parts[8] else 0,
-                            'amount': float(data_parts[9]) if data_parts[9] else 0,
-                            'date': data_parts[30],
-                            'time': data_parts[31]
-                        }
-                        
-                        print(f"成功从新浪财经获取到当前数据: {current_data['name']}")
-                        return pd.DataFrame([current_data])
-                
             print("新浪财经API返回数据格式异常")
             return None
             
@@ -186,12 +476,12 @@ class StockDataCrawler:
             print(f"从新浪财经获取数据失败: {str(e)}")
             return None
     
-    def get_stock_data(self, stock_code, days=200):
+    def get_stock_data(self, stock_code, days=200, period='daily'):
         """获取股票数据的主方法"""
         print(f"正在获取股票 {stock_code} 最近 {days} 天的数据...")
         
         # 首先尝试从东方财富获取数据
-        df = self.crawl_eastmoney_data(stock_code, days)
+        df = self.crawl_eastmoney_data(stock_code, days, period)
         
         if df is not None and len(df) > 0:
             return df
@@ -207,38 +497,105 @@ class StockDataCrawler:
         print("所有数据源都无法获取数据")
         return None
     
-    def add_technical_indicators(self, df):
-        """添加技术指标"""
+    def get_many(self, codes, days=200, max_workers=None, period='daily', compact=False):
+        """并发获取多只股票的历史数据
+        
+        使用有界线程池并发请求，同一主机的并发连接数受 per_host_limit 限制。
+        返回 (results, errors)：results 为 {股票代码: DataFrame}，
+        errors 为 {股票代码: 错误信息}，两者的键互不重叠。
+        compact=True 时结果转换为紧凑类型（见 schema.compact_frame）。
+        """
+        codes = list(dict.fromkeys(codes))  # 去重并保持顺序
+        workers = max_workers or self.max_workers
+        results, errors = {}, {}
+        
+        if not codes:
+            return results, errors
+        
+        print(f"正在并发获取 {len(codes)} 只股票最近 {days} 天的数据 (线程数: {workers})...")
+        start_time = time.time()
+        
+        with ThreadPoolExecutor(max_workers=min(workers, len(codes))) as executor:
+            futures = {executor.submit(self._get_history, code, days, period): code for code in codes}
+            for future in as_completed(futures):
+                code = futures[future]
+                try:
+                    df = future.result()
+                    results[code] = compact_frame(df, copy=False) if compact else df
+                except Exception as e:
+                    errors[code] = str(e)
+        
+        elapsed = time.time() - start_time
+        print(f"批量获取完成: 成功 {len(results)} 只, 失败 {len(errors)} 只, 耗时 {elapsed:.2f}秒")
+        return results, errors
+    
+    def resample_from_store(self, target_period, source_period='1min', codes=None):
+        """用本地存储的低周期K线合成高周期K线，不再重新请求网络
+        
+        所有股票拼接成一张表后一次性分组聚合，返回 {股票代码: DataFrame}，
+        列与 crawl_eastmoney_data 的结果一致，可直接传给 add_technical_indicators。
+        """
+        store = self.store_for(source_period)
+        if store is None:
+            raise ValueError("未启用本地存储，无法重采样")
+        
+        panel = store.load_panel(codes)
+        if panel is None:
+            return {}
+        
+        resampled = resample_klines(panel, target_period)
+        return {code: group.drop(columns=['symbol']).reset_index(drop=True)
+                for code, group in resampled.groupby('symbol', sort=False, observed=True)}
+    
+    def _indicator_plan(self, config, extended):
+        if config is None:
+            return self.extended_indicator_plan if extended else self.indicator_plan
+        return IndicatorPlan(config, extended)
+    
+    def add_technical_indicators(self, df, config=None, extended=False):
+        """添加技术指标
+        
+        计算哪些指标及其参数由 INDICATOR_CONFIG 决定（config 可覆盖其中的部分参数），
+        默认输出 ma5/ma10/ma20/ma60、rsi、macd/macd_signal/macd_hist、bb_middle/bb_upper/bb_lower。
+        extended=True 时再加上 ATR、OBV、KDJ、CCI、威廉指标、VWAP 和 Z 分数等扩展特征。
+        """
         if df is None or len(df) == 0:
             return df
         
-        # 移动平均线
-        df['ma5'] = df['close'].rolling(window=5).mean()
-        df['ma10'] = df['close'].rolling(window=10).mean()
-        df['ma20'] = df['close'].rolling(window=20).mean()
-        df['ma60'] = df['close'].rolling(window=60).mean()
-        
-        # RSI
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        df['rsi'] = 100 - (100 / (1 + rs))
-        
-        # MACD
-        exp1 = df['close'].ewm(span=12).mean()
-        exp2 = df['close'].ewm(span=26).mean()
-        df['macd'] = exp1 - exp2
-        df['macd_signal'] = df['macd'].ewm(span=9).mean()
-        df['macd_hist'] = df['macd'] - df['macd_signal']
-        
-        # 布林带
-        df['bb_middle'] = df['close'].rolling(window=20).mean()
-        bb_std = df['close'].rolling(window=20).std()
-        df['bb_upper'] = df['bb_middle'] + (bb_std * 2)
-        df['bb_lower'] = df['bb_middle'] - (bb_std * 2)
+        plan = self._indicator_plan(config, extended)
+        for name, values in plan.compute(df).items():
+            df[name] = values
         
         return df
+    
+    def add_technical_indicators_panel(self, frames, config=None, extended=False):
+        """批量添加技术指标
+        
+        frames 为 {股票代码: DataFrame}，所需行情列拼成 (时间, 股票) 面板后一次性向量化计算，
+        返回新的 {股票代码: DataFrame}，指标列名与 add_technical_indicators 相同。
+        """
+        frames = {code: df for code, df in frames.items() if df is not None and len(df) > 0}
+        if not frames:
+            return {}
+        
+        plan = self._indicator_plan(config, extended)
+        panels = {}
+        for column in plan.inputs:
+            symbols, lengths, panels[column] = frames_to_panel(frames, column)
+        indicators = plan.compute(panels)
+        names = list(indicators)
+        block = np.stack([indicators[name] for name in names], axis=-1)  # (时间, 股票, 指标)
+        total = block.shape[0]
+        
+        # 每只股票一次性拼接全部指标列，逐列赋值的开销比指标计算本身还大
+        result = {}
+        for j, code in enumerate(symbols):
+            df = frames[code]
+            if df.columns.isin(names).any():
+                df = df.drop(columns=names, errors='ignore')
+            values = pd.DataFrame(block[total - lengths[j]:, j, :], columns=names, index=df.index)
+            result[code] = pd.concat([df, values], axis=1)
+        return result
 
 if __name__ == "__main__":
     # 测试数据爬虫
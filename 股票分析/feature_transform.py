@@ -0,0 +1,83 @@
+"""
+特征归一化变换
+
+训练时拟合一次最小/最大值归一化参数，推理和批量预测复用同一份参数。变换是纯 NumPy 仿射运算
+（values * scale + offset，与 sklearn MinMaxScaler 的计算方式相同），以带版本号的普通字典随模型保存。
+"""
+
+import numpy as np
+
+# 序列化格式版本，字段变化时递增
+FEATURE_TRANSFORM_VERSION = 1
+
+class FeatureTransform:
+    """特征与目标值的最小/最大值归一化"""
+
+    def __init__(self, feature_columns, feature_scale, feature_offset, target_scale=1.0, target_offset=0.0):
+        self.feature_columns = list(feature_columns)
+        self.feature_scale = np.asarray(feature_scale, dtype=np.float64)
+        self.feature_offset = np.asarray(feature_offset, dtype=np.float64)
+        self.target_scale = float(target_scale)
+        self.target_offset = float(target_offset)
+
+    @staticmethod
+    def _affine(values):
+        """按列计算 (scale, offset)，常数列的缩放系数取1"""
+        data_min = np.min(values, axis=0)
+        data_range = np.max(values, axis=0) - data_min
+        scale = 1.0 / np.where(data_range == 0, 1.0, data_range)
+        return scale, -data_min * scale
+
+    @classmethod
+    def fit(cls, features, target, feature_columns=None):
+        """按特征（DataFrame 或二维数组）和目标值拟合归一化参数"""
+        feature_columns = feature_columns if feature_columns is not None else list(getattr(features, 'columns', []))
+        feature_scale, feature_offset = cls._affine(np.asarray(features, dtype=np.float64))
+        target_scale, target_offset = cls._affine(np.asarray(target, dtype=np.float64).ravel())
+        return cls(feature_columns, feature_scale, feature_offset, target_scale, target_offset)
+
+    def transform(self, values):
+        """归一化特征，最后一维为特征，可以是 (序列, 特征) 或 (样本, 序列, 特征)"""
+        return np.asarray(values, dtype=np.float64) * self.feature_scale + self.feature_offset
+
+    def transform_target(self, values):
+        """归一化目标值"""
+        return np.asarray(values, dtype=np.float64) * self.target_scale + self.target_offset
+
+    def inverse_target(self, values):
+        """把归一化的预测值还原为价格"""
+        return (np.asarray(values, dtype=np.float64) - self.target_offset) / self.target_scale
+
+    @staticmethod
+    def stack(transforms):
+        """多只股票的参数按行堆叠，返回可广播到 (样本, 序列, 特征) 和 (样本, 天数) 的
+        (feature_scale, feature_offset, target_scale, target_offset)"""
+        return (np.stack([t.feature_scale for t in transforms])[:, np.newaxis, :],
+                np.stack([t.feature_offset for t in transforms])[:, np.newaxis, :],
+                np.array([t.target_scale for t in transforms])[:, np.newaxis],
+                np.array([t.target_offset for t in transforms])[:, np.newaxis])
+
+    def to_dict(self):
+        """序列化为只含列表和数字的字典，可以直接用 torch.save 保存"""
+        return {
+            'version': FEATURE_TRANSFORM_VERSION,
+            'feature_columns': self.feature_columns,
+            'feature_scale': self.feature_scale.tolist(),
+            'feature_offset': self.feature_offset.tolist(),
+            'target_scale': self.target_scale,
+            'target_offset': self.target_offset,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """从 to_dict 的结果恢复，版本不兼容时抛出 ValueError"""
+        version = state.get('version')
+        if version != FEATURE_TRANSFORM_VERSION:
+            raise ValueError(f"不支持的特征变换版本: {version}（当前版本 {FEATURE_TRANSFORM_VERSION}）")
+        return cls(state['feature_columns'], state['feature_scale'], state['feature_offset'],
+                   state['target_scale'], state['target_offset'])
+
+    @classmethod
+    def from_min_max_scaler(cls, scaler, target_scaler, feature_columns):
+        """由旧版模型文件中的 sklearn MinMaxScaler 转换"""
+        return cls(feature_columns, scaler.scale_, scaler.min_, target_scaler.scale_[0], target_scaler.min_[0])
@@ -0,0 +1,109 @@
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+class ResponseCache:
+    """HTTP响应缓存
+
+    内存中按 LRU 淘汰、按 TTL 过期；指定 sqlite_path 时同时写入 SQLite 文件，
+    进程重启后仍可命中未过期的响应。键由 URL 和排序后的请求参数组成。
+    """
+
+    # 不参与缓存键计算的参数（如防缓存的时间戳）
+    IGNORED_PARAMS = ('_',)
+
+    def __init__(self, max_entries=1024, ttl=600, sqlite_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._db = None
+
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._db.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),))
+            self._db.commit()
+
+    @classmethod
+    def make_key(cls, url, params=None):
+        """根据URL和参数生成缓存键"""
+        if not params:
+            return url
+        items = sorted((k, str(v)) for k, v in params.items() if k not in cls.IGNORED_PARAMS)
+        return url + '?' + '&'.join(f"{k}={v}" for k, v in items)
+
+    def get(self, key):
+        """读取缓存，未命中或已过期返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT value, expires_at FROM response_cache WHERE key = ? AND expires_at > ?',
+                    (key, now)
+                ).fetchone()
+                if row is not None:
+                    self._store(key, row[0], row[1])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        """写入缓存，ttl 为 None 时使用默认过期时间"""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, value, expires_at)
+                )
+                self._db.commit()
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存和计数"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            if self._db is not None:
+                self._db.execute('DELETE FROM response_cache')
+                self._db.commit()
+
+    def stats(self):
+        """缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
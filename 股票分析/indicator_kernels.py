@@ -0,0 +1,402 @@
+"""
+路径依赖技术指标的计算内核
+
+EMA/MACD、Wilder RSI、ATR、KDJ、抛物线 SAR 的每个值都依赖上一个值，无法用累加和向量化；
+滚动最大/最小值用单调双端队列逐个扫描，也放在这里。
+这里的输入统一为 (时间, 股票) 的 C 连续 float64 面板（一维数组视为单只股票），
+外层按时间递推、内层遍历股票，每只股票从自己的第一个有效值开始计算，前面补齐的 NaN 保持 NaN。
+
+安装了 numba 且面板足够大（不少于 NUMBA_MIN_SIZE 个元素）时使用 JIT 编译的逐元素循环，
+编译结果缓存在 __pycache__ 中；否则按时间递推、股票维度用 NumPy 向量化，两者结果一致。除 EMA 外，要求每只股票的有效区间内不含 NaN。
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# use_numba=None 时只有元素数不少于该值的面板才使用 JIT 内核。NumPy 实现的耗时与行数成正比
+# （几百行的单只股票约几十毫秒），而每个新进程第一次调用 JIT 内核要从缓存加载约0.3秒（无缓存时编译约2秒）
+NUMBA_MIN_SIZE = 2000
+
+def _jit(func):
+    """有 numba 时编译循环内核（缓存到磁盘），否则返回 None"""
+    return njit(nogil=True, cache=True)(func) if NUMBA_AVAILABLE else None
+
+def _as_panel(*arrays):
+    """转换为 C 连续的二维 float64 数组，返回 (数组列表, 是否为一维输入)"""
+    squeeze = np.ndim(arrays[0]) == 1
+    panels = []
+    for array in arrays:
+        array = np.asarray(array, dtype=np.float64)
+        panels.append(np.ascontiguousarray(array[:, None] if squeeze else array))
+    return panels, squeeze
+
+def _first_valid(x):
+    """每只股票第一个有效值的行号，全为 NaN 时为行数"""
+    valid = ~np.isnan(x)
+    return np.where(valid.any(axis=0), valid.argmax(axis=0), x.shape[0]).astype(np.int64)
+
+def _use_numba(use_numba, size):
+    if use_numba is None:
+        return NUMBA_AVAILABLE and size >= NUMBA_MIN_SIZE
+    if use_numba and not NUMBA_AVAILABLE:
+        raise RuntimeError("未安装 numba，请运行: pip install numba")
+    return use_numba
+
+def _output(arrays, squeeze):
+    if squeeze:
+        arrays = [array[:, 0] for array in arrays]
+    return arrays[0] if len(arrays) == 1 else tuple(arrays)
+
+
+# ---------------------------------------------------------------- EMA
+
+def _ewm_loop(x, decay, out):
+    n_rows, n_cols = x.shape
+    num = np.zeros(n_cols)
+    den = np.zeros(n_cols)
+    for t in range(n_rows):
+        for j in range(n_cols):
+            value = x[t, j]
+            if value == value:
+                num[j] = num[j] * decay + value
+                den[j] = den[j] * decay + 1.0
+            else:
+                num[j] *= decay
+                den[j] *= decay
+            out[t, j] = num[j] / den[j] if den[j] > 0 else np.nan
+
+_ewm_jit = _jit(_ewm_loop)
+
+def _ewm_numpy(x, decay, out):
+    if x.shape[1] == 1:
+        # 单只股票：标量递推比逐行调用 NumPy 快得多
+        num = den = 0.0
+        for t, value in enumerate(x[:, 0].tolist()):
+            if value == value:  # 非 NaN
+                num = num * decay + value
+                den = den * decay + 1.0
+            else:
+                num *= decay
+                den *= decay
+            out[t, 0] = num / den if den > 0 else np.nan
+        return
+    num = np.zeros(x.shape[1])
+    den = np.zeros(x.shape[1])
+    for t in range(x.shape[0]):
+        valid = ~np.isnan(x[t])
+        num = num * decay + np.where(valid, x[t], 0.0)
+        den = den * decay + valid
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[t] = np.where(den > 0, num / den, np.nan)
+
+def ewm(x, span, use_numba=None):
+    """指数加权均值，等价于 pandas ewm(span=span, adjust=True).mean()"""
+    (x,), squeeze = _as_panel(x)
+    out = np.empty_like(x)
+    decay = 1.0 - 2.0 / (span + 1.0)
+    (_ewm_jit if _use_numba(use_numba, x.size) else _ewm_numpy)(x, decay, out)
+    return _output([out], squeeze)
+
+def macd(close, fast=12, slow=26, signal=9, use_numba=None):
+    """MACD，返回 (macd, signal, hist)"""
+    line = ewm(close, fast, use_numba) - ewm(close, slow, use_numba)
+    signal_line = ewm(line, signal, use_numba)
+    return line, signal_line, line - signal_line
+
+
+# ---------------------------------------------------------------- Wilder RSI
+
+def _wilder_rsi_loop(close, period, first, out):
+    n_rows, n_cols = close.shape
+    avg_gain = np.zeros(n_cols)
+    avg_loss = np.zeros(n_cols)
+    for t in range(n_rows):
+        for j in range(n_cols):
+            n = t - first[j]  # 第几个涨跌幅
+            if n < period:
+                out[t, j] = np.nan
+                if n >= 1:
+                    delta = close[t, j] - close[t - 1, j]
+                    avg_gain[j] += max(delta, 0.0)
+                    avg_loss[j] += max(-delta, 0.0)
+                continue
+            delta = close[t, j] - close[t - 1, j]
+            if n == period:
+                avg_gain[j] = (avg_gain[j] + max(delta, 0.0)) / period
+                avg_loss[j] = (avg_loss[j] + max(-delta, 0.0)) / period
+            else:
+                avg_gain[j] = (avg_gain[j] * (period - 1) + max(delta, 0.0)) / period
+                avg_loss[j] = (avg_loss[j] * (period - 1) + max(-delta, 0.0)) / period
+            if avg_loss[j] == 0:
+                out[t, j] = 100.0 if avg_gain[j] > 0 else 50.0
+            else:
+                out[t, j] = 100.0 - 100.0 / (1.0 + avg_gain[j] / avg_loss[j])
+
+_wilder_rsi_jit = _jit(_wilder_rsi_loop)
+
+def _wilder_rsi_numpy(close, period, first, out):
+    n_cols = close.shape[1]
+    avg_gain = np.zeros(n_cols)
+    avg_loss = np.zeros(n_cols)
+    out[0] = np.nan
+    for t in range(1, close.shape[0]):
+        n = t - first
+        delta = np.nan_to_num(close[t] - close[t - 1])
+        gain, loss = np.maximum(delta, 0.0), np.maximum(-delta, 0.0)
+
+        warmup = (n >= 1) & (n < period)
+        avg_gain = np.where(warmup, avg_gain + gain, avg_gain)
+        avg_loss = np.where(warmup, avg_loss + loss, avg_loss)
+        seed = n == period
+        avg_gain = np.where(seed, (avg_gain + gain) / period, avg_gain)
+        avg_loss = np.where(seed, (avg_loss + loss) / period, avg_loss)
+        smooth = n > period
+        avg_gain = np.where(smooth, (avg_gain * (period - 1) + gain) / period, avg_gain)
+        avg_loss = np.where(smooth, (avg_loss * (period - 1) + loss) / period, avg_loss)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rsi = np.where(avg_loss == 0, np.where(avg_gain > 0, 100.0, 50.0),
+                           100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+        out[t] = np.where(n >= period, rsi, np.nan)
+
+def wilder_rsi(close, period=14, use_numba=None):
+    """Wilder 平滑的 RSI：前 period 个涨跌幅取简单均值，之后按 (前值*(n-1)+当前)/n 递推"""
+    (close,), squeeze = _as_panel(close)
+    out = np.empty_like(close)
+    (_wilder_rsi_jit if _use_numba(use_numba, close.size) else _wilder_rsi_numpy)(close, period, _first_valid(close), out)
+    return _output([out], squeeze)
+
+
+# ---------------------------------------------------------------- ATR
+
+def _atr_loop(high, low, close, period, first, out):
+    n_rows, n_cols = close.shape
+    atr = np.zeros(n_cols)
+    for t in range(n_rows):
+        for j in range(n_cols):
+            n = t - first[j] + 1  # 第几根真实波幅
+            if n < 1:
+                out[t, j] = np.nan
+                continue
+            tr = high[t, j] - low[t, j]
+            if n > 1:
+                tr = max(tr, abs(high[t, j] - close[t - 1, j]), abs(low[t, j] - close[t - 1, j]))
+            if n < period:
+                atr[j] += tr
+                out[t, j] = np.nan
+            elif n == period:
+                atr[j] = (atr[j] + tr) / period
+                out[t, j] = atr[j]
+            else:
+                atr[j] = (atr[j] * (period - 1) + tr) / period
+                out[t, j] = atr[j]
+
+_atr_jit = _jit(_atr_loop)
+
+def _atr_numpy(high, low, close, period, first, out):
+    prev_close = np.vstack([np.full((1, close.shape[1]), np.nan), close[:-1]])
+    with np.errstate(invalid='ignore'):
+        tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    atr = np.zeros(close.shape[1])
+    for t in range(close.shape[0]):
+        n = t - first + 1
+        row = np.nan_to_num(tr[t])
+        atr = np.where((n >= 1) & (n < period), atr + row, atr)
+        atr = np.where(n == period, (atr + row) / period, atr)
+        atr = np.where(n > period, (atr * (period - 1) + row) / period, atr)
+        out[t] = np.where(n >= period, atr, np.nan)
+
+def atr(high, low, close, period=14, use_numba=None):
+    """平均真实波幅（Wilder 平滑），第一根K线的真实波幅为 high - low"""
+    (high, low, close), squeeze = _as_panel(high, low, close)
+    out = np.empty_like(close)
+    (_atr_jit if _use_numba(use_numba, close.size) else _atr_numpy)(high, low, close, period, _first_valid(close), out)
+    return _output([out], squeeze)
+
+
+# ---------------------------------------------------------------- 滚动最大/最小值
+
+def _rolling_extreme_loop(x, window, min_periods, is_max, out):
+    """单调双端队列：队列中保存下标，对应的值单调递减（最大值）或递增（最小值），队首即窗口极值"""
+    n_rows, n_cols = x.shape
+    queue = np.empty(n_rows, dtype=np.int64)
+    for j in range(n_cols):
+        head = tail = 0
+        count = 0  # 窗口内的有效值个数
+        for t in range(n_rows):
+            value = x[t, j]
+            if value == value:
+                count += 1
+                while tail > head and ((x[queue[tail - 1], j] <= value) if is_max else (x[queue[tail - 1], j] >= value)):
+                    tail -= 1
+                queue[tail] = t
+                tail += 1
+            if t >= window:
+                dropped = x[t - window, j]
+                if dropped == dropped:
+                    count -= 1
+            while tail > head and queue[head] <= t - window:
+                head += 1
+            out[t, j] = x[queue[head], j] if count >= min_periods and tail > head else np.nan
+
+_rolling_extreme_jit = _jit(_rolling_extreme_loop)
+
+def _rolling_extreme_numpy(x, window, min_periods, is_max, out):
+    """van Herk/Gil-Werman 分块算法：块内前缀极值与后缀极值各扫描一遍，与窗口长度无关"""
+    n_rows, n_cols = x.shape
+    fill = -np.inf if is_max else np.inf
+    accumulate = np.maximum.accumulate if is_max else np.minimum.accumulate
+    combine = np.maximum if is_max else np.minimum
+
+    blocks = -(-n_rows // window)
+    padded = np.full((blocks * window, n_cols), fill)
+    padded[:n_rows] = np.where(np.isnan(x), fill, x)
+    padded = padded.reshape(blocks, window, n_cols)
+    prefix = accumulate(padded, axis=1).reshape(-1, n_cols)[:n_rows]
+    suffix = accumulate(padded[:, ::-1], axis=1)[:, ::-1].reshape(-1, n_cols)[:n_rows]
+
+    result = prefix.copy()  # 前 window-1 行的窗口都在第一块内，即前缀极值
+    if n_rows >= window:
+        result[window - 1:] = combine(suffix[:n_rows - window + 1], prefix[window - 1:])
+
+    valid = np.cumsum(~np.isnan(x), axis=0)
+    count = valid.copy()
+    count[window:] -= valid[:-window]
+    out[:] = np.where(count >= min_periods, result, np.nan)
+
+def rolling_extreme(x, window, is_max=True, min_periods=None, use_numba=None):
+    """滚动最大值（is_max=True）或最小值，窗口内有效值少于 min_periods（默认等于窗口）时为 NaN"""
+    (x,), squeeze = _as_panel(x)
+    out = np.empty_like(x)
+    min_periods = window if min_periods is None else min_periods
+    kernel = _rolling_extreme_jit if _use_numba(use_numba, x.size) else _rolling_extreme_numpy
+    kernel(x, window, min_periods, is_max, out)
+    return _output([out], squeeze)
+
+
+# ---------------------------------------------------------------- KDJ
+
+def _kdj_loop(rsv, m1, m2, first, k_out, d_out, j_out):
+    n_rows, n_cols = rsv.shape
+    k = np.full(n_cols, 50.0)
+    d = np.full(n_cols, 50.0)
+    for t in range(n_rows):
+        for j in range(n_cols):
+            if t < first[j]:
+                k_out[t, j] = d_out[t, j] = j_out[t, j] = np.nan
+                continue
+            k[j] = ((m1 - 1) * k[j] + rsv[t, j]) / m1
+            d[j] = ((m2 - 1) * d[j] + k[j]) / m2
+            k_out[t, j] = k[j]
+            d_out[t, j] = d[j]
+            j_out[t, j] = 3 * k[j] - 2 * d[j]
+
+_kdj_jit = _jit(_kdj_loop)
+
+def _kdj_numpy(rsv, m1, m2, first, k_out, d_out, j_out):
+    k = np.full(rsv.shape[1], 50.0)
+    d = np.full(rsv.shape[1], 50.0)
+    for t in range(rsv.shape[0]):
+        active = t >= first
+        k = np.where(active, ((m1 - 1) * k + rsv[t]) / m1, k)
+        d = np.where(active, ((m2 - 1) * d + k) / m2, d)
+        k_out[t] = np.where(active, k, np.nan)
+        d_out[t] = np.where(active, d, np.nan)
+        j_out[t] = np.where(active, 3 * k - 2 * d, np.nan)
+
+def kdj_from_extremes(highest, lowest, close, m1=3, m2=3, use_numba=None):
+    """由 N 日最高价、最低价计算 KDJ，返回 (K, D, J)；最高价等于最低价时 RSV 取50"""
+    (highest, lowest, close), squeeze = _as_panel(highest, lowest, close)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsv = np.where(highest == lowest, 50.0, (close - lowest) / (highest - lowest) * 100.0)
+    outs = [np.empty_like(close) for _ in range(3)]
+    (_kdj_jit if _use_numba(use_numba, close.size) else _kdj_numpy)(rsv, m1, m2, _first_valid(close), *outs)
+    return _output(outs, squeeze)
+
+def kdj(high, low, close, n=9, m1=3, m2=3, use_numba=None):
+    """KDJ 随机指标，返回 (K, D, J)；K、D 初始值为50，不足 n 根时用已有K线的最高/最低价"""
+    highest = rolling_extreme(high, n, True, min_periods=1, use_numba=use_numba)
+    lowest = rolling_extreme(low, n, False, min_periods=1, use_numba=use_numba)
+    return kdj_from_extremes(highest, lowest, close, m1, m2, use_numba)
+
+
+# ---------------------------------------------------------------- 抛物线 SAR
+
+def _sar_loop(high, low, step, max_af, first, out):
+    n_rows, n_cols = high.shape
+    sar = np.zeros(n_cols)
+    ep = np.zeros(n_cols)
+    af = np.zeros(n_cols)
+    up = np.ones(n_cols, dtype=np.bool_)
+    for t in range(n_rows):
+        for j in range(n_cols):
+            if t <= first[j]:
+                out[t, j] = np.nan
+                if t == first[j]:
+                    sar[j], ep[j], af[j], up[j] = low[t, j], high[t, j], step, True
+                continue
+            value = sar[j] + af[j] * (ep[j] - sar[j])
+            if up[j]:
+                value = min(value, low[t - 1, j])
+                if t - 2 >= first[j]:
+                    value = min(value, low[t - 2, j])
+                if low[t, j] < value:
+                    up[j], value, ep[j], af[j] = False, ep[j], low[t, j], step
+                elif high[t, j] > ep[j]:
+                    ep[j], af[j] = high[t, j], min(af[j] + step, max_af)
+            else:
+                value = max(value, high[t - 1, j])
+                if t - 2 >= first[j]:
+                    value = max(value, high[t - 2, j])
+                if high[t, j] > value:
+                    up[j], value, ep[j], af[j] = True, ep[j], high[t, j], step
+                elif low[t, j] < ep[j]:
+                    ep[j], af[j] = low[t, j], min(af[j] + step, max_af)
+            sar[j] = value
+            out[t, j] = value
+
+_sar_jit = _jit(_sar_loop)
+
+def _sar_numpy(high, low, step, max_af, first, out):
+    n_cols = high.shape[1]
+    sar, ep, af = np.zeros(n_cols), np.zeros(n_cols), np.zeros(n_cols)
+    up = np.ones(n_cols, dtype=bool)
+    for t in range(high.shape[0]):
+        start = t == first
+        sar = np.where(start, low[t], sar)
+        ep = np.where(start, high[t], ep)
+        af = np.where(start, step, af)
+        up = up | start
+        active = t > first
+        if not active.any():
+            out[t] = np.nan
+            continue
+
+        value = sar + af * (ep - sar)
+        two_back = t - 2 >= first
+        low_prev = np.where(two_back, np.fmin(low[t - 1], low[t - 2]), low[t - 1])
+        high_prev = np.where(two_back, np.fmax(high[t - 1], high[t - 2]), high[t - 1])
+        value = np.where(up, np.fmin(value, low_prev), np.fmax(value, high_prev))
+
+        flip = active & np.where(up, low[t] < value, high[t] > value)
+        extend = active & ~flip & np.where(up, high[t] > ep, low[t] < ep)
+        new_value = np.where(flip, ep, value)
+        ep = np.where(flip, np.where(up, low[t], high[t]),
+                      np.where(extend, np.where(up, high[t], low[t]), ep))
+        af = np.where(flip, step, np.where(extend, np.minimum(af + step, max_af), af))
+        up = np.where(flip, ~up, up)
+
+        sar = np.where(active, new_value, sar)
+        out[t] = np.where(active, sar, np.nan)
+
+def parabolic_sar(high, low, step=0.02, max_af=0.2, use_numba=None):
+    """抛物线转向指标 SAR，每只股票从上涨趋势开始，第一根K线为 NaN"""
+    (high, low), squeeze = _as_panel(high, low)
+    out = np.empty_like(high)
+    (_sar_jit if _use_numba(use_numba, high.size) else _sar_numpy)(high, low, step, max_af, _first_valid(high), out)
+    return _output([out], squeeze)
@@ -0,0 +1,540 @@
+"""
+技术指标计算
+
+所有函数既可以处理单只股票的一维数组，也可以在 (时间 x 股票) 二维面板上一次性计算全部股票：
+滚动窗口用累加和差分得到，EMA 在时间维度递推、股票维度向量化。各股票按自身K线序号
+右对齐放入面板，上市较晚的股票在前面补 NaN，因此结果与逐只股票计算一致。
+
+要计算哪些指标、参数是多少由 INDICATOR_CONFIG 决定：每个指标在 INDICATOR_REGISTRY 中
+注册一个构建函数，展开成带依赖关系的计算节点，IndicatorPlan 合并相同的中间结果后按依赖顺序计算。
+
+IndicatorState 用于实时行情：保存滑动窗口状态，每根新K线 O(1) 更新全部指标。
+"""
+
+import numpy as np
+
+from config import INDICATOR_CONFIG
+import indicator_kernels
+
+def rolling_sum(x, window):
+    """滚动求和，窗口内存在 NaN 时结果为 NaN（与 pandas rolling 默认行为一致）"""
+    x = np.asarray(x, dtype=np.float64)
+    valid = ~np.isnan(x)
+    csum = np.cumsum(np.where(valid, x, 0.0), axis=0)
+    ccount = np.cumsum(valid, axis=0)
+
+    out = np.full(x.shape, np.nan)
+    if window > x.shape[0]:
+        return out
+    window_sum = csum[window - 1:].copy()
+    window_sum[1:] -= csum[:-window]
+    window_count = ccount[window - 1:].copy()
+    window_count[1:] -= ccount[:-window]
+    out[window - 1:] = np.where(window_count == window, window_sum, np.nan)
+    return out
+
+def rolling_mean(x, window):
+    """滚动均值"""
+    return rolling_sum(x, window) / window
+
+def rolling_std(x, window, ddof=1):
+    """滚动标准差
+
+    先减去每列第一个有效值再累加平方和，避免价格量级较大时相减产生的精度损失。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    first_valid = np.argmax(~np.isnan(x), axis=0)
+    offset = x[first_valid, np.arange(x.shape[1])] if x.ndim == 2 else x[first_valid]
+    shifted = x - np.nan_to_num(offset)
+
+    s1 = rolling_sum(shifted, window)
+    s2 = rolling_sum(shifted * shifted, window)
+    var = (s2 - s1 * s1 / window) / (window - ddof)
+    return np.sqrt(np.maximum(var, 0.0))
+
+def ewm_mean(x, span):
+    """指数加权均值，等价于 pandas ewm(span=span, adjust=True).mean()
+
+    NaN 位置的权重照常衰减（ignore_na=False），输出沿用之前的均值；
+    开头的 NaN 输出 NaN。
+    """
+    return indicator_kernels.ewm(x, span)
+
+def diff(x):
+    """一阶差分，第一行为 NaN"""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.empty(x.shape)
+    out[0] = np.nan
+    out[1:] = x[1:] - x[:-1]
+    return out
+
+def rolling_max(x, window, min_periods=None):
+    """滚动最大值（单调队列），窗口内有效值少于 min_periods（默认等于窗口）时为 NaN"""
+    return indicator_kernels.rolling_extreme(x, window, True, min_periods)
+
+def rolling_min(x, window, min_periods=None):
+    """滚动最小值（单调队列）"""
+    return indicator_kernels.rolling_extreme(x, window, False, min_periods)
+
+def rolling_mad(x, window, mean=None):
+    """滚动平均绝对偏差 mean(|x - 窗口均值|)，可传入已算好的 rolling_mean 避免重复计算"""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if window > x.shape[0]:
+        return out
+    if mean is None:
+        mean = rolling_mean(x, window)
+    windows = np.lib.stride_tricks.sliding_window_view(x, window, axis=0)  # (时间-窗口+1, ..., 窗口)
+    out[window - 1:] = np.abs(windows - mean[window - 1:, ..., None]).mean(axis=-1)
+    return out
+
+def on_balance_volume(close, volume):
+    """能量潮 OBV：上涨日累加成交量、下跌日减去成交量，每只股票从0开始"""
+    direction = np.sign(np.nan_to_num(diff(close)))
+    obv = np.cumsum(direction * np.nan_to_num(np.asarray(volume, dtype=np.float64)), axis=0)
+    return _padded(obv, close)
+
+def rsi(close, period=14):
+    """RSI（涨跌幅的简单滚动均值，与 add_technical_indicators 一致）"""
+    # 每只股票第一根K线的涨跌记为0（与 pandas 的 where 一致）
+    delta = diff(close)
+    gain = _padded(np.where(delta > 0, delta, 0.0), close)
+    loss = _padded(np.where(delta < 0, -delta, 0.0), close)
+    return _rsi_from_means(rolling_mean(gain, period), rolling_mean(loss, period))
+
+class IndicatorNode:
+    """指标计算图中的一个节点
+
+    key 为节点唯一标识，参数相同的中间结果（如20日均值）key 相同，只计算一次；
+    inputs 为依赖节点的 key 或原始行情列名（RAW_COLUMNS），func 接收依赖的数组并返回结果数组；
+    lookback 为本节点在输入上需要的K线数。
+    """
+
+    def __init__(self, key, func, inputs=('close',), lookback=1):
+        self.key = key
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.lookback = lookback
+
+
+# 可以直接作为节点输入的行情列
+RAW_COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'amount')
+
+# 指标名 -> 构建函数：接收 INDICATOR_CONFIG，返回 (节点列表, [(输出列名, 节点key)])
+INDICATOR_REGISTRY = {}
+
+def register_indicator(name):
+    """注册指标构建函数的装饰器"""
+    def decorator(builder):
+        INDICATOR_REGISTRY[name] = builder
+        return builder
+    return decorator
+
+def _mean_node(window, source='close'):
+    return IndicatorNode(f'mean_{window}({source})', lambda x: rolling_mean(x, window), (source,), window)
+
+def _ewm_node(span, source='close'):
+    return IndicatorNode(f'ewm_{span}({source})', lambda x: ewm_mean(x, span), (source,), span)
+
+def _sum_node(window, source):
+    return IndicatorNode(f'sum_{window}({source})', lambda x: rolling_sum(x, window), (source,), window)
+
+def _std_node(window, source='close'):
+    return IndicatorNode(f'std_{window}({source})', lambda x: rolling_std(x, window), (source,), window)
+
+def _extreme_node(window, source, is_max, min_periods=None):
+    name = 'max' if is_max else 'min'
+    suffix = '' if min_periods is None else f'_p{min_periods}'
+    return IndicatorNode(f'{name}_{window}{suffix}({source})',
+                         lambda x: indicator_kernels.rolling_extreme(x, window, is_max, min_periods),
+                         (source,), window if min_periods is None else min_periods)
+
+def _typical_price_node():
+    return IndicatorNode('typical_price', lambda high, low, close: (high + low + close) / 3, ('high', 'low', 'close'))
+
+@register_indicator('ma')
+def _build_ma(config):
+    nodes = [_mean_node(period) for period in config['ma_periods']]
+    return nodes, [(f'ma{period}', node.key) for period, node in zip(config['ma_periods'], nodes)]
+
+@register_indicator('rsi')
+def _build_rsi(config):
+    period = config['rsi_period']
+    delta = IndicatorNode('delta', diff)
+    gain = IndicatorNode('gain', lambda d, close: _padded(np.where(d > 0, d, 0.0), close), ('delta', 'close'))
+    loss = IndicatorNode('loss', lambda d, close: _padded(np.where(d < 0, -d, 0.0), close), ('delta', 'close'))
+    gain_mean, loss_mean = _mean_node(period, 'gain'), _mean_node(period, 'loss')
+    rsi_node = IndicatorNode(f'rsi_{period}', _rsi_from_means, (gain_mean.key, loss_mean.key))
+    return [delta, gain, loss, gain_mean, loss_mean, rsi_node], [('rsi', rsi_node.key)]
+
+@register_indicator('macd')
+def _build_macd(config):
+    fast, slow = _ewm_node(config['macd_fast']), _ewm_node(config['macd_slow'])
+    macd = IndicatorNode(f"macd_{config['macd_fast']}_{config['macd_slow']}",
+                         lambda a, b: a - b, (fast.key, slow.key))
+    signal = _ewm_node(config['macd_signal'], macd.key)
+    hist = IndicatorNode(f"{macd.key}_hist", lambda a, b: a - b, (macd.key, signal.key))
+    return [fast, slow, macd, signal, hist], [
+        ('macd', macd.key), ('macd_signal', signal.key), ('macd_hist', hist.key)]
+
+@register_indicator('bollinger')
+def _build_bollinger(config):
+    period, width = config['bb_period'], config['bb_std']
+    middle = _mean_node(period)
+    std = _std_node(period)
+    upper = IndicatorNode(f'bb_upper_{period}_{width}', lambda m, s: m + s * width, (middle.key, std.key))
+    lower = IndicatorNode(f'bb_lower_{period}_{width}', lambda m, s: m - s * width, (middle.key, std.key))
+    return [middle, std, upper, lower], [
+        ('bb_middle', middle.key), ('bb_upper', upper.key), ('bb_lower', lower.key)]
+
+@register_indicator('atr')
+def _build_atr(config):
+    period = config['atr_period']
+    node = IndicatorNode(f'atr_{period}', lambda high, low, close: indicator_kernels.atr(high, low, close, period),
+                         ('high', 'low', 'close'), period)
+    return [node], [('atr', node.key)]
+
+@register_indicator('wilder_rsi')
+def _build_wilder_rsi(config):
+    # Wilder 平滑的 RSI（逐根递推），第 period 个涨跌幅起有值
+    period = config['rsi_period']
+    node = IndicatorNode(f'wilder_rsi_{period}', lambda close: indicator_kernels.wilder_rsi(close, period),
+                         ('close',), period + 1)
+    return [node], [('rsi_wilder', node.key)]
+
+@register_indicator('sar')
+def _build_sar(config):
+    step, max_af = config['sar_step'], config['sar_max']
+    node = IndicatorNode(f'sar_{step}_{max_af}', lambda high, low: indicator_kernels.parabolic_sar(high, low, step, max_af),
+                         ('high', 'low'), 2)
+    return [node], [('sar', node.key)]
+
+@register_indicator('obv')
+def _build_obv(config):
+    node = IndicatorNode('obv', on_balance_volume, ('close', 'volume'))
+    return [node], [('obv', node.key)]
+
+@register_indicator('kdj')
+def _build_kdj(config):
+    n, m1, m2 = config['kdj_n'], config['kdj_m1'], config['kdj_m2']
+    # 不足 n 根时用已有K线的最高/最低价
+    highest, lowest = _extreme_node(n, 'high', True, 1), _extreme_node(n, 'low', False, 1)
+    kdj = IndicatorNode(f'kdj_{n}_{m1}_{m2}',
+                        lambda h, l, close: np.stack(indicator_kernels.kdj_from_extremes(h, l, close, m1, m2)),
+                        (highest.key, lowest.key, 'close'))
+    nodes = [highest, lowest, kdj]
+    for i, column in enumerate('kdj'):
+        nodes.append(IndicatorNode(f'{kdj.key}_{column}', lambda stacked, i=i: stacked[i], (kdj.key,)))
+    return nodes, [(f'kdj_{column}', node.key) for column, node in zip('kdj', nodes[3:])]
+
+@register_indicator('cci')
+def _build_cci(config):
+    period = config['cci_period']
+    tp = _typical_price_node()
+    mean = _mean_node(period, tp.key)
+    # 与均值节点使用同一个窗口，lookback 已计入均值节点
+    mad = IndicatorNode(f'mad_{period}({tp.key})', lambda x, m: rolling_mad(x, period, m), (tp.key, mean.key))
+    cci = IndicatorNode(f'cci_{period}', _cci, (tp.key, mean.key, mad.key))
+    return [tp, mean, mad, cci], [('cci', cci.key)]
+
+@register_indicator('williams_r')
+def _build_williams_r(config):
+    period = config['wr_period']
+    highest, lowest = _extreme_node(period, 'high', True), _extreme_node(period, 'low', False)
+    wr = IndicatorNode(f'wr_{period}', _williams_r, (highest.key, lowest.key, 'close'))
+    return [highest, lowest, wr], [('wr', wr.key)]
+
+@register_indicator('vwap')
+def _build_vwap(config):
+    # 用典型价格加权，与成交量单位（股/手）无关
+    period = config['vwap_period']
+    tp = _typical_price_node()
+    tp_volume = IndicatorNode(f'{tp.key}*volume', lambda x, volume: x * volume, (tp.key, 'volume'))
+    numerator, denominator = _sum_node(period, tp_volume.key), _sum_node(period, 'volume')
+    vwap = IndicatorNode(f'vwap_{period}', _safe_divide, (numerator.key, denominator.key))
+    return [tp, tp_volume, numerator, denominator, vwap], [('vwap', vwap.key)]
+
+@register_indicator('zscore')
+def _build_zscore(config):
+    period = config['zscore_period']
+    nodes, outputs = [], []
+    for column in config['zscore_columns']:
+        mean, std = _mean_node(period, column), _std_node(period, column)
+        zscore = IndicatorNode(f'zscore_{period}({column})', lambda x, m, sd: _safe_divide(x - m, sd),
+                               (column, mean.key, std.key))
+        nodes.extend([mean, std, zscore])
+        outputs.append((f'{column}_zscore', zscore.key))
+    return nodes, outputs
+
+def _safe_divide(a, b):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(b != 0, a / b, np.nan)
+
+def _cci(tp, mean, mad):
+    return _safe_divide(tp - mean, 0.015 * mad)
+
+def _williams_r(highest, lowest, close):
+    return _safe_divide(highest - close, highest - lowest) * -100
+
+def _padded(values, close):
+    """面板开头补齐的 NaN 位置置为 NaN，避免参与滚动窗口"""
+    values[np.cumsum(~np.isnan(close), axis=0) == 0] = np.nan
+    return values
+
+def _rsi_from_means(gain_mean, loss_mean):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 100 - 100 / (1 + gain_mean / loss_mean)
+
+class IndicatorPlan:
+    """按配置展开后的指标计算图
+
+    各指标的节点合并去重后按依赖顺序排列，compute 时每个节点只计算一次，
+    输入既可以是单只股票的一维数组，也可以是 (时间, 股票) 面板。
+    extended=True 时在 indicators 之外再计算 extended_indicators（模型扩展特征）。
+    """
+
+    def __init__(self, config=None, extended=False):
+        self.config = dict(INDICATOR_CONFIG, **(config or {}))
+        names = list(self.config['indicators'])
+        if extended:
+            names += [name for name in self.config['extended_indicators'] if name not in names]
+
+        nodes, self.outputs = {}, []
+        for name in names:
+            if name not in INDICATOR_REGISTRY:
+                raise ValueError(f"未注册的技术指标: {name}")
+            built, outputs = INDICATOR_REGISTRY[name](self.config)
+            for node in built:
+                nodes.setdefault(node.key, node)
+            self.outputs.extend(outputs)
+        self.nodes = self._sort(nodes)
+        self.inputs = [column for column in RAW_COLUMNS
+                       if any(column in node.inputs for node in self.nodes)]
+
+    @staticmethod
+    def _sort(nodes):
+        """依赖优先的拓扑排序"""
+        ordered, visiting, done = [], set(), set()
+
+        def visit(key):
+            if key in RAW_COLUMNS or key in done:
+                return
+            if key in visiting:
+                raise ValueError(f"技术指标存在循环依赖: {key}")
+            if key not in nodes:
+                raise ValueError(f"技术指标依赖的节点不存在: {key}")
+            visiting.add(key)
+            for dep in nodes[key].inputs:
+                visit(dep)
+            visiting.discard(key)
+            done.add(key)
+            ordered.append(nodes[key])
+
+        for key in nodes:
+            visit(key)
+        return ordered
+
+    @property
+    def columns(self):
+        return [column for column, _ in self.outputs]
+
+    def lookback(self):
+        """{输出列名: 第一个有效值需要的K线数}"""
+        total = dict.fromkeys(RAW_COLUMNS, 1)
+        for node in self.nodes:
+            total[node.key] = node.lookback - 1 + max(total[dep] for dep in node.inputs)
+        return {column: total[key] for column, key in self.outputs}
+
+    def compute(self, data):
+        """计算全部输出列，返回 {列名: 数组}
+
+        data 为 DataFrame 或 {列名: 数组}；只用到收盘价时也可以直接传收盘价数组。
+        """
+        if not isinstance(data, dict) and not hasattr(data, 'columns'):
+            data = {'close': data}
+        missing = [column for column in self.inputs if column not in data]
+        if missing:
+            raise ValueError(f"计算技术指标缺少行情列: {missing}")
+
+        values = {column: np.asarray(data[column], dtype=np.float64) for column in self.inputs}
+        for node in self.nodes:
+            values[node.key] = node.func(*(values[dep] for dep in node.inputs))
+        return {column: values[key] for column, key in self.outputs}
+
+def compute_indicators(data, config=None, extended=False):
+    """按 INDICATOR_CONFIG 计算技术指标，data 为行情列（一维或 (时间, 股票) 面板）或收盘价，返回 {列名: 数组}"""
+    return IndicatorPlan(config, extended).compute(data)
+
+def extended_feature_columns(config=None):
+    """扩展指标输出的列名（StockPredictor 的扩展特征）"""
+    config = dict(INDICATOR_CONFIG, **(config or {}))
+    return IndicatorPlan(dict(config, indicators=config['extended_indicators'])).columns
+
+def frames_to_panel(frames, column='close'):
+    """把 {股票代码: DataFrame} 的某一列按K线序号右对齐拼成 (时间, 股票) 数组
+
+    返回 (股票代码列表, 各股票长度, 二维数组)
+    """
+    symbols = list(frames)
+    lengths = [len(frames[symbol]) for symbol in symbols]
+    length = max(lengths) if lengths else 0
+    panel = np.full((length, len(symbols)), np.nan)
+    for j, symbol in enumerate(symbols):
+        if lengths[j]:
+            panel[length - lengths[j]:, j] = frames[symbol][column].to_numpy(dtype=np.float64)
+    return symbols, lengths, panel
+
+
+class _RollingWindow:
+    """定长滑动窗口：维护窗口内的和与 Welford 均值/平方差和，每次更新 O(1)
+
+    浮点累加误差会随更新次数增长，因此窗口每滚动一整圈就从缓冲区重新求和一次，
+    摊还后仍是 O(1)。
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = np.zeros(window)
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    @property
+    def full(self):
+        return self.count >= self.window
+
+    def push(self, x):
+        i = self.count % self.window
+        if self.full:
+            old = self.values[i]
+            old_mean = self.mean
+            self.total += x - old
+            self.mean += (x - old) / self.window
+            self.m2 += (x - old) * (x - self.mean + old - old_mean)
+        else:
+            n = self.count + 1
+            self.total += x
+            delta = x - self.mean
+            self.mean += delta / n
+            self.m2 += delta * (x - self.mean)
+        self.values[i] = x
+        self.count += 1
+
+        if self.count % self.window == 0:
+            self._refresh()
+
+    def _refresh(self):
+        values = self.values[:min(self.count, self.window)]
+        self.total = values.sum()
+        self.mean = values.mean()
+        self.m2 = ((values - self.mean) ** 2).sum()
+
+    def sum(self):
+        return self.total if self.full else np.nan
+
+    def std(self, ddof=1):
+        if not self.full:
+            return np.nan
+        return np.sqrt(max(self.m2, 0.0) / (self.window - ddof))
+
+
+class _EWMState:
+    """adjust=True 的指数加权均值状态（加权和与权重和）"""
+
+    def __init__(self, span):
+        self.decay = 1.0 - 2.0 / (span + 1.0)
+        self.num = 0.0
+        self.den = 0.0
+
+    def push(self, x):
+        self.num = self.num * self.decay + x
+        self.den = self.den * self.decay + 1.0
+        return self.num / self.den
+
+
+class IndicatorState:
+    """逐根K线增量更新的技术指标
+
+    按 INDICATOR_CONFIG 的参数计算 ma/rsi/macd/bollinger 四类指标，列名与 add_technical_indicators 相同，
+    但只保存各窗口的滑动状态：
+    MA 用滑动窗口和，RSI 用涨跌幅的滑动窗口和（与批量计算一样是简单均值），
+    MACD 用 EMA 递推状态，布林带用滑动 Welford 方差。每根新K线的更新为 O(1)。
+
+        state = IndicatorState.from_history(df)
+        values = state.update(new_close)   # {'ma5': ..., 'rsi': ..., ...}
+    """
+
+    def __init__(self, config=None):
+        config = dict(INDICATOR_CONFIG, **(config or {}))
+        self.ma_periods = list(config['ma_periods'])
+        self.bb_std = config['bb_std']
+        rsi_period, bb_period = config['rsi_period'], config['bb_period']
+        macd_fast, macd_slow, macd_signal = config['macd_fast'], config['macd_slow'], config['macd_signal']
+
+        self._windows = {period: _RollingWindow(period) for period in set(self.ma_periods) | {bb_period}}
+        self._bb_window = self._windows[bb_period]
+        self._gain = _RollingWindow(rsi_period)
+        self._loss = _RollingWindow(rsi_period)
+        self._fast = _EWMState(macd_fast)
+        self._slow = _EWMState(macd_slow)
+        self._signal = _EWMState(macd_signal)
+
+        self.last_close = None
+        self.count = 0
+        self.values = None
+
+    @classmethod
+    def from_history(cls, df, config=None):
+        """用历史K线（需包含 close 列）初始化状态"""
+        state = cls(config)
+        state.seed(df['close'].to_numpy(dtype=np.float64))
+        return state
+
+    def seed(self, closes):
+        """按顺序写入一段历史收盘价，返回最后一根K线的指标"""
+        for close in closes:
+            self.update(close)
+        return self.values
+
+    def update(self, close):
+        """写入一根新K线的收盘价，返回该K线的全部指标 {列名: 数值}，窗口未满时为 NaN"""
+        close = float(close)
+        if np.isnan(close):
+            raise ValueError("收盘价不能为 NaN")
+
+        for window in self._windows.values():
+            window.push(close)
+
+        # 与批量计算一致：第一根K线的涨跌记为0
+        delta = 0.0 if self.last_close is None else close - self.last_close
+        self._gain.push(delta if delta > 0 else 0.0)
+        self._loss.push(-delta if delta < 0 else 0.0)
+
+        macd = self._fast.push(close) - self._slow.push(close)
+        signal = self._signal.push(macd)
+
+        values = {f'ma{period}': self._windows[period].sum() / period for period in self.ma_periods}
+
+        gain, loss = self._gain.sum(), self._loss.sum()
+        if np.isnan(gain):
+            values['rsi'] = np.nan
+        elif loss == 0:
+            values['rsi'] = 100.0 if gain > 0 else np.nan
+        else:
+            values['rsi'] = 100 - 100 / (1 + gain / loss)
+
+        values['macd'] = macd
+        values['macd_signal'] = signal
+        values['macd_hist'] = macd - signal
+
+        middle = self._bb_window.sum() / self._bb_window.window
+        std = self._bb_window.std()
+        values['bb_middle'] = middle
+        values['bb_upper'] = middle + std * self.bb_std
+        values['bb_lower'] = middle - std * self.bb_std
+
+        self.last_close = close
+        self.count += 1
+        self.values = values
+        return values
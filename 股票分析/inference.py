@@ -0,0 +1,113 @@
+"""
+批量预测的公共流程
+
+窗口堆叠、归一化和反归一化只依赖 NumPy/pandas，不导入 PyTorch；
+StockPredictor（PyTorch）和 OnnxPredictor（ONNX Runtime）共用，只有前向计算 _infer 不同。
+"""
+
+import numpy as np
+
+from feature_transform import FeatureTransform
+
+class BatchInference:
+    """批量预测接口
+
+    子类需要提供 sequence_length、prediction_days、feature_columns、feature_transform、
+    symbol_index、symbol_transforms 属性，并实现 _infer。
+    """
+
+    def _infer(self, inputs, symbol_ids, batch_size):
+        """前向计算：inputs 为 (样本, 序列, 特征) float32 数组，symbol_ids 为 int64 数组或 None，
+        返回 (样本, prediction_days) 的归一化预测值"""
+        raise NotImplementedError
+
+    def predict(self, input_data):
+        """预测未来股价（输入为已归一化的 (序列, 特征) 或 (样本, 序列, 特征) 数据）"""
+        if self.feature_transform is None:
+            raise ValueError("模型没有单只股票的归一化参数，联合训练的模型请使用 predict_batch 或 predict_symbol")
+        inputs = np.asarray(input_data.cpu() if hasattr(input_data, 'cpu') else input_data, dtype=np.float32)
+        if inputs.ndim == 2:
+            inputs = inputs[np.newaxis]
+        return self.feature_transform.inverse_target(self._infer(inputs, None, len(inputs)))
+
+    def predict_symbol(self, data, symbol):
+        """联合训练的模型预测某只股票：用该股票自己的归一化参数处理最近 sequence_length 天数据"""
+        return self.predict_batch({symbol: data})[symbol][np.newaxis]
+
+    def predict_batch(self, windows, batch_size=1024):
+        """批量预测多个窗口
+
+        windows 为 {股票代码: DataFrame}（返回 {股票代码: 预测价格}）、DataFrame 列表或
+        (样本, 序列, 特征) 的原始特征数组（返回 (样本, prediction_days) 数组）。DataFrame 取最后
+        sequence_length 行。所有窗口用训练时的 FeatureTransform 一次性归一化后堆叠，
+        分批前向，反归一化也按数组整体计算。联合训练的模型需要传入字典，
+        按股票使用各自的归一化参数。
+        """
+        symbols = list(windows) if isinstance(windows, dict) else None
+        if self.symbol_index:
+            feature_columns = self.feature_columns
+        else:
+            if self.feature_transform is None:
+                raise ValueError("模型尚未拟合特征归一化参数，请先训练或加载模型")
+            feature_columns = self.feature_transform.feature_columns
+        if isinstance(windows, np.ndarray):
+            raw = windows.astype(np.float64, copy=False)
+        else:
+            frames = windows.values() if symbols is not None else windows
+            raw = np.stack([
+                df[feature_columns].tail(self.sequence_length)
+                .fillna(method='bfill').fillna(method='ffill').to_numpy(dtype=np.float64)
+                for df in frames
+            ])
+        if raw.ndim != 3 or raw.shape[1] != self.sequence_length:
+            raise ValueError(f"窗口形状应为 (样本, {self.sequence_length}, 特征)，实际为 {raw.shape}")
+
+        symbol_ids = None
+        if self.symbol_index:
+            if symbols is None:
+                raise ValueError("联合训练的模型需要以 {股票代码: 数据} 的形式传入窗口")
+            unknown = [symbol for symbol in symbols if symbol not in self.symbol_index]
+            if unknown:
+                raise ValueError(f"股票 {unknown} 不在联合训练的股票列表中")
+            feature_scale, feature_offset, target_scale, target_offset = FeatureTransform.stack(
+                [self.symbol_transforms[symbol] for symbol in symbols])
+            symbol_ids = np.array([self.symbol_index[symbol] for symbol in symbols], dtype=np.int64)
+        else:
+            transform = self.feature_transform
+            feature_scale, feature_offset = transform.feature_scale, transform.feature_offset
+            target_scale, target_offset = transform.target_scale, transform.target_offset
+        scaled = (raw * feature_scale + feature_offset).astype(np.float32)
+
+        if len(scaled) == 0:
+            predictions = np.empty((0, self.prediction_days), dtype=np.float32)
+        else:
+            predictions = self._infer(scaled, symbol_ids, batch_size)
+
+        predictions = (predictions - target_offset) / target_scale
+        if symbols is not None:
+            return dict(zip(symbols, predictions))
+        return predictions
+
+    def metadata(self):
+        """推理所需的元数据（只含普通类型，可保存为 JSON）"""
+        return {
+            'sequence_length': self.sequence_length,
+            'prediction_days': self.prediction_days,
+            'feature_columns': list(self.feature_columns),
+            'feature_transform': self.feature_transform.to_dict() if self.feature_transform else None,
+            'symbol_index': self.symbol_index,
+            'symbol_transforms': ({symbol: transform.to_dict() for symbol, transform in self.symbol_transforms.items()}
+                                  if self.symbol_transforms else None),
+        }
+
+    def load_metadata(self, metadata):
+        """从 metadata() 的结果恢复推理所需的属性"""
+        self.sequence_length = metadata['sequence_length']
+        self.prediction_days = metadata['prediction_days']
+        self.feature_columns = metadata['feature_columns']
+        self.symbol_index = metadata.get('symbol_index')
+        state = metadata.get('feature_transform')
+        self.feature_transform = FeatureTransform.from_dict(state) if state else None
+        symbol_transforms = metadata.get('symbol_transforms')
+        self.symbol_transforms = ({symbol: FeatureTransform.from_dict(state) for symbol, state in symbol_transforms.items()}
+                                  if symbol_transforms else None)
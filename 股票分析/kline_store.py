@@ -0,0 +1,238 @@
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+
+from schema import compact_frame
+
+class KlineStore:
+    """本地K线存储
+
+    每只股票对应一个定长记录的二进制文件（{代码}.bin），按列类型打包后顺序追加，
+    读取时通过 np.memmap 内存映射，只把需要的日期区间复制成 DataFrame。
+    同名的 {代码}.json 记录已覆盖的起始日期和最后一条K线的日期，
+    用于增量更新时计算需要补齐的区间。
+    """
+
+    COLUMNS = ['open', 'close', 'high', 'low', 'volume', 'amount',
+               'amplitude', 'change_pct', 'change', 'turnover']
+    DTYPE = np.dtype([('date', '<M8[s]')] + [(col, '<f8') for col in COLUMNS])
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, symbol):
+        """同一只股票的读写互斥"""
+        with self._locks_guard:
+            if symbol not in self._locks:
+                self._locks[symbol] = threading.RLock()
+            return self._locks[symbol]
+
+    def _data_path(self, symbol):
+        return os.path.join(self.root_dir, f"{symbol}.bin")
+
+    def _meta_path(self, symbol):
+        return os.path.join(self.root_dir, f"{symbol}.json")
+
+    def _to_records(self, df):
+        """DataFrame 转为定长记录数组"""
+        records = np.zeros(len(df), dtype=self.DTYPE)
+        records['date'] = pd.to_datetime(df['date']).values.astype('M8[s]')
+        for col in self.COLUMNS:
+            if col in df.columns:
+                records[col] = df[col].values
+            else:
+                records[col] = np.nan
+        return records
+
+    def _read_records(self, symbol):
+        """内存映射读取全部记录，文件不存在或为空时返回空数组"""
+        path = self._data_path(symbol)
+        if not os.path.exists(path) or os.path.getsize(path) < self.DTYPE.itemsize:
+            return np.zeros(0, dtype=self.DTYPE)
+        count = os.path.getsize(path) // self.DTYPE.itemsize
+        return np.memmap(path, dtype=self.DTYPE, mode='r', shape=(count,))
+
+    def _write_meta(self, symbol, meta):
+        tmp_path = self._meta_path(symbol) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path(symbol))
+
+    def get_meta(self, symbol):
+        """获取股票的存储元信息 {'start': 覆盖起始日期, 'last': 最后K线日期, 'rows': 条数}"""
+        path = self._meta_path(symbol)
+        if not os.path.exists(path) or not os.path.exists(self._data_path(symbol)):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        meta['start'] = pd.Timestamp(meta['start'])
+        meta['last'] = pd.Timestamp(meta['last']) if meta.get('last') else None
+        return meta
+
+    def last_date(self, symbol):
+        """最后存储的K线日期，无数据时返回 None"""
+        meta = self.get_meta(symbol)
+        return meta['last'] if meta else None
+
+    def symbols(self):
+        """已存储的股票代码列表"""
+        if not os.path.isdir(self.root_dir):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.root_dir) if name.endswith('.bin'))
+
+    def load(self, symbol, start=None, end=None):
+        """读取股票数据，可按日期区间过滤，无数据时返回 None"""
+        with self._lock(symbol):
+            records = self._read_records(symbol)
+            if len(records) == 0:
+                return None
+
+            dates = records['date']
+            lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start), 's'), side='left')
+            hi = len(records) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end), 's'), side='right')
+            chunk = np.array(records[lo:hi])
+
+        df = pd.DataFrame({'date': chunk['date'].astype('M8[ns]')})
+        for col in self.COLUMNS:
+            df[col] = chunk[col]
+        return df
+
+    def write(self, symbol, df, start):
+        """整体写入（覆盖）股票数据，start 为本次数据覆盖的起始日期"""
+        records = self._to_records(df)
+        records = records[np.argsort(records['date'], kind='stable')]
+
+        with self._lock(symbol):
+            os.makedirs(self.root_dir, exist_ok=True)
+            tmp_path = self._data_path(symbol) + '.tmp'
+            records.tofile(tmp_path)
+            os.replace(tmp_path, self._data_path(symbol))
+            self._write_meta(symbol, {
+                'start': pd.Timestamp(start).strftime('%Y-%m-%d'),
+                'last': str(pd.Timestamp(records['date'][-1])) if len(records) else None,
+                'rows': int(len(records)),
+            })
+
+    def append(self, symbol, df):
+        """追加增量数据：先截掉与新数据日期重叠的尾部记录，再顺序写入文件末尾"""
+        records = self._to_records(df)
+        if len(records) == 0:
+            return
+        records = records[np.argsort(records['date'], kind='stable')]
+
+        with self._lock(symbol):
+            meta = self.get_meta(symbol)
+            if meta is None:
+                self.write(symbol, df, records['date'][0])
+                return
+
+            existing = self._read_records(symbol)
+            keep = int(np.searchsorted(existing['date'], records['date'][0], side='left'))
+            del existing
+
+            path = self._data_path(symbol)
+            with open(path, 'r+b') as f:
+                f.truncate(keep * self.DTYPE.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(records.tobytes())
+
+            meta['start'] = meta['start'].strftime('%Y-%m-%d')
+            meta['last'] = str(pd.Timestamp(records['date'][-1]))
+            meta['rows'] = keep + int(len(records))
+            self._write_meta(symbol, meta)
+
+    def load_panel(self, symbols=None, start=None, compact=False):
+        """把多只股票的数据拼接成一张带 symbol 列的长表，无数据时返回 None
+
+        compact=True 时价格等字段转换为 float32（见 schema.compact_frame）。
+        """
+        frames = []
+        for symbol in (symbols if symbols is not None else self.symbols()):
+            df = self.load(symbol, start=start)
+            if df is not None and len(df) > 0:
+                df.insert(0, 'symbol', symbol)
+                frames.append(df)
+        if not frames:
+            return None
+        panel = pd.concat(frames, ignore_index=True)
+        panel['symbol'] = panel['symbol'].astype('category')
+        return compact_frame(panel, copy=False) if compact else panel
+
+    def tail(self, symbol, n=2):
+        """最后 n 条记录（数组形式），用于增量更新时校验重叠K线"""
+        with self._lock(symbol):
+            return np.array(self._read_records(symbol)[-n:])
+
+
+# A股交易时段：上午 9:30-11:30，下午 13:00-15:00，共240分钟
+_MORNING_OPEN = 9 * 60 + 30
+_MORNING_MINUTES = 120
+_AFTERNOON_OPEN = 13 * 60
+
+_MINUTE_RULES = {'5min': 5, '15min': 15, '30min': 30, '60min': 60}
+_CALENDAR_RULES = {'weekly': 'W', 'monthly': 'M'}
+
+def _session_bucket_end(dates, minutes):
+    """分钟K线所属 N 分钟K线的结束时间（按交易分钟计，跳过午间休市）"""
+    clock = dates.dt.hour.values * 60 + dates.dt.minute.values
+    # 当日第几个交易分钟（09:31 为 1，13:01 为 121），09:30 集合竞价并入第一根
+    trade_minute = np.where(clock <= _MORNING_OPEN + _MORNING_MINUTES,
+                            clock - _MORNING_OPEN,
+                            clock - _AFTERNOON_OPEN + _MORNING_MINUTES)
+    trade_minute = np.maximum(trade_minute, 1)
+    end_minute = ((trade_minute - 1) // minutes + 1) * minutes
+    end_clock = np.where(end_minute <= _MORNING_MINUTES,
+                         _MORNING_OPEN + end_minute,
+                         _AFTERNOON_OPEN + end_minute - _MORNING_MINUTES)
+    return dates.dt.normalize() + pd.to_timedelta(end_clock, unit='m')
+
+def resample_klines(df, period):
+    """把低周期K线合成为高周期K线
+
+    df 为 crawl_eastmoney_data 格式的数据，可以带 symbol 列（多只股票的长表），
+    整张表一次分组聚合完成。period 可选 5min/15min/30min/60min（由1分钟K线合成）、
+    daily（由分钟K线合成）、weekly/monthly（由日K线合成）。
+    成交量、成交额、换手率求和，振幅和涨跌幅按前一根合成K线的收盘价重新计算。
+    """
+    has_symbol = 'symbol' in df.columns
+    data = df if has_symbol else df.assign(symbol='_')
+    dates = pd.to_datetime(data['date'])
+
+    if period in _MINUTE_RULES:
+        label = _session_bucket_end(dates, _MINUTE_RULES[period])
+    elif period == 'daily':
+        label = dates.dt.normalize()
+    elif period in _CALENDAR_RULES:
+        label = dates.dt.to_period(_CALENDAR_RULES[period])
+    else:
+        raise ValueError(f"不支持的重采样周期: {period}")
+
+    keys = [data['symbol'], label.rename('bucket')]
+    agg = data.groupby(keys, sort=True, observed=True).agg(
+        date=('date', 'last'),
+        open=('open', 'first'),
+        close=('close', 'last'),
+        high=('high', 'max'),
+        low=('low', 'min'),
+        volume=('volume', 'sum'),
+        amount=('amount', 'sum'),
+        turnover=('turnover', 'sum'),
+    ).reset_index()
+
+    # 分钟级合成K线以周期结束时间为时间戳，日/周/月K线以最后一个交易日为时间戳
+    if period in _MINUTE_RULES or period == 'daily':
+        agg['date'] = agg['bucket']
+
+    prev_close = agg.groupby('symbol', sort=False, observed=True)['close'].shift(1)
+    agg['change'] = agg['close'] - prev_close
+    agg['change_pct'] = agg['change'] / prev_close * 100
+    agg['amplitude'] = (agg['high'] - agg['low']) / prev_close * 100
+
+    columns = ['date'] + KlineStore.COLUMNS
+    if has_symbol:
+        columns = ['symbol'] + columns
+    return agg[columns].reset_index(drop=True)
@@ -8,14 +8,16 @@ import os
 import sys
 import pandas as pd
 import numpy as np
-import torch
 from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
 # 导入自定义模块
 from data_crawler import StockDataCrawler
-from rcsan_model import StockPredictor
+from rcsan_model import StockPredictor, get_feature_columns
+from pooled_dataset import PooledWindowDataset
+from sweep import run_sweep
+from config import MODEL_CONFIG, PATH_CONFIG
 from visualizer import StockVisualizer
 
 class StockAnalysisSystem:
@@ -53,7 +55,8 @@ class StockAnalysisSystem:
         
         # 添加技术指标
         print("🔧 正在计算技术指标...")
-        self.current_data = self.crawler.add_technical_indicators(raw_data)
+        self.current_data = self.crawler.add_technical_indicators(
+            raw_data, extended=MODEL_CONFIG.get('extended_features', False))
         self.current_stock_code = stock_code
         
         print(f"✅ 成功获取 {len(self.current_data)} 条数据")
@@ -70,15 +73,15 @@ class StockAnalysisSystem:
         print(f"\n🧠 开始训练R-CSAN模型...")
         
         # 创建预测器
-        available_features = [col for col in [
-            'open', 'high', 'low', 'close', 'volume', 'amount',
-            'ma5', 'ma10', 'ma20', 'ma60', 'rsi', 'macd', 'macd_signal', 'macd_hist'
-        ] if col in self.current_data.columns]
+        extended_features = MODEL_CONFIG.get('extended_features', False)
+        available_features = [col for col in get_feature_columns(extended_features)
+                              if col in self.current_data.columns]
         
         self.predictor = StockPredictor(
             input_features=len(available_features),
             sequence_length=60,
-            prediction_days=7
+            prediction_days=7,
+            extended_features=extended_features
         )
         
         # 准备训练数据
@@ -93,49 +96,82 @@ class StockAnalysisSystem:
         print(f"🎯 开始训练，数据量: {train_data[0].shape[0]} 样本")
         self.predictor.train(train_data, epochs=epochs, batch_size=batch_size)
         
+        # 量化推理：在验证窗口上检查精度损失
+        if self.predictor.quantized:
+            report = self.predictor.quantization_report(train_data)
+            print(f"🗜️ int8 量化: 验证损失 {report['fp32_val_loss']:.6f} -> {report['int8_val_loss']:.6f}, "
+                  f"预测价格平均偏差 ¥{report['mean_price_diff']:.4f}, "
+                  f"模型大小 {report['fp32_size'] / 1024 ** 2:.1f}MB -> {report['int8_size'] / 1024 ** 2:.1f}MB")
+        
         # 保存模型
-        model_path = f"d:/股票分析/model_{self.current_stock_code}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pth"
+        model_path = os.path.join(PATH_CONFIG['model_dir'],
+                                  f"model_{self.current_stock_code}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pth")
         self.predictor.save_model(model_path)
         
         print("✅ 模型训练完成并已保存！")
         return True
     
+    def train_pooled_model(self, symbols=None, epochs=100, batch_size=None):
+        """用本地K线存储中的多只股票联合训练一个模型"""
+        print(f"\n🧠 开始多只股票联合训练R-CSAN模型...")
+        
+        extended_features = MODEL_CONFIG.get('extended_features', False)
+        batch_size = batch_size or MODEL_CONFIG.get('pooled_batch_size', 256)
+        
+        try:
+            dataset = PooledWindowDataset.from_store(
+                self.crawler, get_feature_columns(extended_features), symbols=symbols,
+                sequence_length=60, prediction_days=7, extended=extended_features
+            )
+        except ValueError as e:
+            print(f"❌ {str(e)}")
+            return False
+        
+        self.predictor = StockPredictor(
+            input_features=len(dataset.feature_columns),
+            sequence_length=60,
+            prediction_days=7,
+            extended_features=extended_features,
+            num_symbols=len(dataset.symbols)
+        )
+        
+        print(f"🎯 开始训练，股票数: {len(dataset.symbols)}，数据量: {len(dataset)} 样本")
+        self.predictor.train_pooled(dataset, epochs=epochs, batch_size=batch_size)
+        
+        model_path = os.path.join(PATH_CONFIG['model_dir'], f"model_pooled_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pth")
+        self.predictor.save_model(model_path)
+        
+        print("✅ 联合模型训练完成并已保存！")
+        return True
+    
     def predict_future(self, days=7):
         """预测未来股价"""
         if self.predictor is None:
             print("❌ 请先训练模型！")
-            return None
+            return None, None
         
         if self.current_data is None or len(self.current_data) < 60:
             print("❌ 数据不足，无法进行预测！")
-            return None
+            return None, None
         
         print(f"\n🔮 正在预测未来 {days} 天的股价...")
         
-        # 准备输入数据（最近60天的数据）
-        feature_columns = [col for col in [
-            'open', 'high', 'low', 'close', 'volume', 'amount',
-            'ma5', 'ma10', 'ma20', 'ma60', 'rsi', 'macd', 'macd_signal', 'macd_hist'
-        ] if col in self.current_data.columns]
-        
-        recent_data = self.current_data[feature_columns].tail(60).fillna(method='bfill').fillna(method='ffill')
-        
-        # 数据标准化
-        from sklearn.preprocessing import MinMaxScaler
-        scaler = MinMaxScaler()
-        scaled_data = scaler.fit_transform(recent_data)
-        
-        # 进行预测
-        input_tensor = torch.FloatTensor(scaled_data).unsqueeze(0)  # 添加batch维度
-        predictions = self.predictor.predict(input_tensor)
+        # 使用训练时拟合的归一化参数；联合训练的模型按该股票自己的参数处理
+        if self.predictor.symbol_index:
+            if self.current_stock_code not in self.predictor.symbol_index:
+                print(f"❌ 股票 {self.current_stock_code} 不在联合训练的股票列表中！")
+                return None, None
+            predictions = self.predictor.predict_batch({self.current_stock_code: self.current_data})[self.current_stock_code]
+        else:
+            predictions = self.predictor.predict_batch([self.current_data])[0]
         
         # 生成预测日期
         last_date = pd.to_datetime(self.current_data['date'].iloc[-1])
-        prediction_dates = [last_date + timedelta(days=i+1) for i in range(len(predictions[0]))]
+        prediction_dates = [last_date + timedelta(days=i+1) for i in range(len(predictions))]
         
         print("✅ 预测完成！")
         
-        return predictions[0], prediction_dates
+        return predictions, prediction_dates
     
     def generate_report(self):
         """生成分析报告"""
@@ -193,10 +229,13 @@ class StockAnalysisSystem:
             print("3. 预测未来股价")
             print("4. 生成完整报告")
             print("5. 查看当前数据")
+            print("6. 更新全市场股票列表")
+            print("7. 多只股票联合训练")
+            print("8. 超参数搜索")
             print("0. 退出系统")
             print("=" * 50)
             
-            choice = input("请选择操作 (0-5): ").strip()
+            choice = input("请选择操作 (0-8): ").strip()
             
             if choice == '1':
                 stock_code = input("请输入股票代码 (如: 000001): ").strip()
@@ -243,9 +282,39 @@ class StockAnalysisSystem:
                     print(f"💰 最新价格: ¥{self.current_data['close'].iloc[-1]:.2f}")
                     print("\n最近5天数据:")
                     print(self.current_data[['date', 'open', 'high', 'low', 'close', 'volume']].tail())
+                    
+                    if self.crawler.cache is not None:
+                        stats = self.crawler.cache.stats()
+                        print(f"\n🗄️ 请求缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+                              f"命中率 {stats['hit_rate']:.0%}")
                 else:
                     print("❌ 暂无数据")
                 
+            elif choice == '6':
+                try:
+                    universe = self.crawler.refresh_universe()
+                    print(f"✅ 全市场股票列表共 {len(universe)} 只")
+                except Exception as e:
+                    print(f"❌ 更新股票列表失败: {str(e)}")
+                
+            elif choice == '7':
+                codes = input("请输入股票代码，逗号分隔 (默认使用本地存储中的全部股票): ").strip()
+                symbols = [code.strip() for code in codes.split(',') if code.strip()] or None
+                
+                epochs = input("请输入训练轮数 (默认100): ").strip()
+                epochs = int(epochs) if epochs.isdigit() else 100
+                
+                self.train_pooled_model(symbols, epochs)
+                
+            elif choice == '8':
+                if self.current_data is None:
+                    print("❌ 请先获取股票数据！")
+                    continue
+                
+                table = run_sweep(self.current_data)
+                print("\n🏆 超参数搜索结果（按验证损失排序）:")
+                print(table.head(10).to_string(index=False))
+                
             elif choice == '0':
                 print("👋 感谢使用股票分析系统，再见！")
                 break
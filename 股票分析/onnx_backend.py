@@ -0,0 +1,50 @@
+"""
+ONNX Runtime 推理后端
+
+加载 StockPredictor.export_onnx 导出的模型和元数据，提供与 StockPredictor 相同的
+predict / predict_batch / predict_symbol 接口。只依赖 NumPy、pandas 和 onnxruntime，
+评分主机不需要导入 PyTorch。onnxruntime 是可选依赖，未安装时 ONNX_AVAILABLE 为 False。
+"""
+
+import json
+
+import numpy as np
+
+from inference import BatchInference
+
+try:
+    import onnxruntime
+    ONNX_AVAILABLE = True
+except ImportError:
+    onnxruntime = None
+    ONNX_AVAILABLE = False
+
+class OnnxPredictor(BatchInference):
+    """基于 ONNX Runtime 的股票预测器"""
+
+    def __init__(self, filepath, metadata_path=None, num_threads=None):
+        if not ONNX_AVAILABLE:
+            raise ImportError("未安装 onnxruntime，请运行: pip install onnxruntime")
+
+        with open(metadata_path or filepath + '.json', 'r', encoding='utf-8') as f:
+            self.load_metadata(json.load(f))
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(filepath, options, providers=['CPUExecutionProvider'])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        print(f"ONNX 模型已从 {filepath} 加载")
+
+    def _infer(self, inputs, symbol_ids, batch_size):
+        """分批调用 ONNX Runtime"""
+        outputs = []
+        for start in range(0, len(inputs), batch_size):
+            feed = {'x': inputs[start:start + batch_size]}
+            if 'symbol_ids' in self.input_names:
+                # 带股票嵌入导出的模型，股票编号是必需的输入
+                if symbol_ids is None:
+                    raise ValueError("联合训练的 ONNX 模型需要股票编号，请使用 predict_batch 传入 {股票代码: 数据}")
+                feed['symbol_ids'] = symbol_ids[start:start + batch_size]
+            outputs.append(self.session.run(None, feed)[0])
+        return np.concatenate(outputs)
@@ -0,0 +1,131 @@
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler
+
+from feature_transform import FeatureTransform
+
+class PooledWindowDataset(Dataset):
+    """多只股票的滑动窗口训练集
+
+    每只股票的特征和目标按自身的最小/最大值分别归一化，拼接成一整块 float32 数组，
+    样本只记录 (起始行, 股票编号)，取批次时用下标广播一次性取出 (批次, 序列, 特征)，
+    不预先展开窗口。配合 make_loader 使用时 __getitem__ 接收一批下标，返回
+    (X, y, symbol_ids) 三个张量。
+    """
+
+    def __init__(self, frames, feature_columns, sequence_length=60, prediction_days=7, target_column='close'):
+        self.feature_columns = list(feature_columns)
+        self.sequence_length = sequence_length
+        self.prediction_days = prediction_days
+        self.target_column = target_column
+
+        self.symbols = []
+        self.transforms = {}  # 股票代码 -> FeatureTransform
+        features, targets, starts, sample_symbols = [], [], [], []
+        offset = 0
+
+        for symbol, df in frames.items():
+            if df is None or len(df) < sequence_length + prediction_days:
+                continue
+            num_samples = len(df) - sequence_length - prediction_days + 1
+            missing = [col for col in self.feature_columns if col not in df.columns]
+            if missing:
+                print(f"⚠️ {symbol} 缺少特征列 {missing}，已跳过")
+                continue
+
+            values = df[self.feature_columns].fillna(method='bfill').fillna(method='ffill').to_numpy(dtype=np.float64)
+            target = df[target_column].to_numpy(dtype=np.float64)
+            if np.isnan(values).any() or np.isnan(target).any():
+                print(f"⚠️ {symbol} 存在全为空的特征列，已跳过")
+                continue
+
+            transform = FeatureTransform.fit(values, target[sequence_length:], self.feature_columns)
+            features.append(transform.transform(values))
+            targets.append(transform.transform_target(target))
+
+            symbol_id = len(self.symbols)
+            self.symbols.append(symbol)
+            self.transforms[symbol] = transform
+            starts.append(offset + np.arange(num_samples))
+            sample_symbols.append(np.full(num_samples, symbol_id))
+            offset += len(df)
+
+        if not self.symbols:
+            raise ValueError("没有可用于训练的股票数据")
+
+        self.features = torch.from_numpy(np.concatenate(features).astype(np.float32))
+        self.targets = torch.from_numpy(np.concatenate(targets).astype(np.float32))
+        self.starts = torch.from_numpy(np.concatenate(starts))
+        self.symbol_ids = torch.from_numpy(np.concatenate(sample_symbols))
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        self._window_offsets = torch.arange(sequence_length)
+        self._target_offsets = torch.arange(sequence_length, sequence_length + prediction_days)
+
+    @classmethod
+    def from_store(cls, crawler, feature_columns, symbols=None, sequence_length=60, prediction_days=7,
+                   extended=False):
+        """从本地K线存储读取多只股票，计算技术指标后构造训练集（爬虫需要启用本地存储）"""
+        store = crawler.store_for('daily')
+        if store is None:
+            raise ValueError("联合训练集需要本地K线存储，请使用 use_store=True 创建 StockDataCrawler")
+        symbols = symbols if symbols is not None else store.symbols()
+        frames = {}
+        for symbol in symbols:
+            df = store.load(symbol)
+            if df is not None and len(df) > 0:
+                frames[symbol] = df
+        frames = crawler.add_technical_indicators_panel(frames, extended=extended)
+        print(f"📦 从本地存储加载 {len(frames)} 只股票用于联合训练")
+        return cls(frames, feature_columns, sequence_length, prediction_days)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        """index 可以是单个下标或一批下标，返回 (X, y, symbol_ids)"""
+        index = torch.as_tensor(index)
+        starts = self.starts[index]
+        X = self.features[starts.unsqueeze(-1) + self._window_offsets]
+        y = self.targets[starts.unsqueeze(-1) + self._target_offsets]
+        return X, y, self.symbol_ids[index]
+
+    def split(self, validation_split=0.2):
+        """按时间切分训练/验证集：每只股票最后 validation_split 比例的样本作为验证集，返回两组下标"""
+        train_idx, val_idx = [], []
+        ids = self.symbol_ids.numpy()
+        boundaries = np.flatnonzero(np.diff(ids)) + 1
+        for group in np.split(np.arange(len(ids)), boundaries):
+            cut = int(len(group) * (1 - validation_split))
+            train_idx.append(group[:cut])
+            val_idx.append(group[cut:])
+        return np.concatenate(train_idx), np.concatenate(val_idx)
+
+    def make_loader(self, indices, batch_size=256, shuffle=True):
+        """按批次取数的 DataLoader：每个批次只调用一次 __getitem__"""
+        indices = np.asarray(indices)
+        sampler = RandomSampler(indices) if shuffle else SequentialSampler(indices)
+        batches = BatchSampler(sampler, batch_size=batch_size, drop_last=False)
+        return DataLoader(self, batch_size=None, sampler=_IndexedBatches(batches, indices))
+
+    def normalize(self, symbol, values):
+        """用某只股票的缩放参数归一化特征"""
+        return self.transforms[symbol].transform(values)
+
+    def inverse_target(self, symbol, values):
+        """把归一化的预测值还原为价格"""
+        return self.transforms[symbol].inverse_target(values)
+
+class _IndexedBatches:
+    """把 BatchSampler 产生的位置映射为数据集下标"""
+
+    def __init__(self, batches, indices):
+        self.batches = batches
+        self.indices = indices
+
+    def __iter__(self):
+        for batch in self.batches:
+            yield self.indices[batch]
+
+    def __len__(self):
+        return len(self.batches)
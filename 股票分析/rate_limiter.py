@@ -0,0 +1,103 @@
+import time
+import random
+import threading
+
+class SourceUnavailableError(Exception):
+    """数据源处于熔断状态，暂时跳过"""
+
+class RetryableHTTPError(Exception):
+    """可重试的HTTP错误（限流或服务端错误）"""
+
+    def __init__(self, status_code, message=None):
+        super().__init__(message or f"HTTP状态码 {status_code}")
+        self.status_code = status_code
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """指数退避 + 全抖动：在 [0, min(cap, base * 2^attempt)] 内均匀取值"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class TokenBucket:
+    """令牌桶限流器
+
+    以 rate 个/秒的速度补充令牌，最多积累 burst 个。被限流（HTTP 429）时
+    penalize() 将速率减半，之后每次成功请求 reward() 线性恢复到配置速率。
+    """
+
+    def __init__(self, rate, burst=None, min_rate=0.5):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """取一个令牌，令牌不足时阻塞等待，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self):
+        """被限流后速率减半"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def reward(self):
+        """请求成功后逐步恢复速率"""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+class CircuitBreaker:
+    """熔断器
+
+    连续失败 threshold 次后打开，cooldown 秒内直接拒绝请求；冷却结束后放行
+    一次试探请求（半开），成功则关闭，失败则重新计时。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold=5, cooldown=60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """当前是否允许发起请求"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
@@ -2,7 +2,64 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import math
+import os
+import pickle
+import threading
+import warnings
+
+from config import MODEL_CONFIG, PATH_CONFIG, ARCHITECTURE_CONFIG
+from feature_transform import FeatureTransform
+from inference import BatchInference
+from indicators import extended_feature_columns
+
+# 模型的基础输入特征
+FEATURE_COLUMNS = [
+    'open', 'high', 'low', 'close', 'volume', 'amount',
+    'ma5', 'ma10', 'ma20', 'ma60', 'rsi', 'macd', 'macd_signal', 'macd_hist'
+]
+
+def get_feature_columns(extended_features=False):
+    """模型输入特征列，extended_features=True 时追加扩展指标（见 INDICATOR_CONFIG['extended_indicators']）"""
+    return FEATURE_COLUMNS + (extended_feature_columns() if extended_features else [])
+
+# RCSAN 各分支的默认设置（即原始完整结构），conv_layers/transformer_layers 为 None 时取 num_layers
+ARCHITECTURE_DEFAULTS = {
+    'conv_layers': None,                 # 残差卷积块数量，0 表示去掉卷积分支
+    'channel_spatial_attention': True,   # 是否使用通道+空间注意力
+    'transformer_layers': None,          # Transformer 编码器层数，0 表示去掉
+    'lstm_layers': 2,                    # LSTM 层数，0 表示去掉
+    'bidirectional': True,               # LSTM 是否双向
+    'attention_fusion': True,            # 是否在序列输出上再做一次多头注意力融合
+}
+
+def resolve_architecture(architecture=None, num_layers=4):
+    """把结构名称（ARCHITECTURE_CONFIG 的键）或分支参数字典展开为完整的分支设置
+    
+    architecture 为 None 时使用 MODEL_CONFIG['architecture']。字典中未给出的分支取 ARCHITECTURE_DEFAULTS，
+    也可以用 {'base': 结构名称, ...} 在某个预设结构上修改。
+    """
+    if architecture is None:
+        architecture = MODEL_CONFIG.get('architecture', 'full')
+    if isinstance(architecture, str):
+        architecture = {'base': architecture}
+    architecture = dict(architecture)
+    base = architecture.pop('base', None)
+    if base is not None and base not in ARCHITECTURE_CONFIG:
+        raise ValueError(f"未知的模型结构: {base}（可选: {', '.join(ARCHITECTURE_CONFIG)}）")
+    unknown = [name for name in architecture if name not in ARCHITECTURE_DEFAULTS]
+    if unknown:
+        raise ValueError(f"未知的结构参数: {unknown}")
+    
+    resolved = dict(ARCHITECTURE_DEFAULTS)
+    if base is not None:
+        resolved.update(ARCHITECTURE_CONFIG[base])
+    resolved.update(architecture)
+    for name in ('conv_layers', 'transformer_layers'):
+        if resolved[name] is None:
+            resolved[name] = num_layers
+    return resolved
 
 class ChannelAttention(nn.Module):
     """通道注意力模块"""
@@ -65,58 +122,80 @@ class RCSAN(nn.Module):
     """残差通道-空间注意力网络 (Residual Channel-Spatial Attention Network)"""
     
     def __init__(self, input_features=15, sequence_length=60, hidden_dim=128, num_layers=4, 
-                 num_heads=8, dropout=0.1, prediction_days=7):
+                 num_heads=8, dropout=0.1, prediction_days=7, num_symbols=0, architecture=None):
+        """architecture 为 ARCHITECTURE_CONFIG 中的结构名称或 {分支参数: 值} 字典，见 resolve_architecture"""
         super(RCSAN, self).__init__()
         
         self.input_features = input_features
         self.sequence_length = sequence_length
         self.hidden_dim = hidden_dim
+        self.num_heads = num_heads
         self.prediction_days = prediction_days
+        self.num_symbols = num_symbols
+        self.architecture = resolve_architecture(architecture, num_layers)
+        conv_layers = self.architecture['conv_layers']
+        transformer_layers = self.architecture['transformer_layers']
+        lstm_layers = self.architecture['lstm_layers']
+        bidirectional = self.architecture['bidirectional']
         
         # 输入层
         self.input_projection = nn.Linear(input_features, hidden_dim)
         
+        # 股票嵌入：多只股票联合训练时，每只股票学习一个向量加到输入投影上
+        self.symbol_embedding = nn.Embedding(num_symbols, hidden_dim) if num_symbols > 0 else None
+        
         # 残差卷积层
         self.conv_layers = nn.ModuleList([
             ResidualBlock(hidden_dim if i == 0 else hidden_dim, hidden_dim)
-            for i in range(num_layers)
+            for i in range(conv_layers)
         ])
         
         # 注意力机制
-        self.channel_attention = ChannelAttention(hidden_dim)
-        self.spatial_attention = SpatialAttention()
+        if self.architecture['channel_spatial_attention']:
+            self.channel_attention = ChannelAttention(hidden_dim)
+            self.spatial_attention = SpatialAttention()
+        else:
+            self.channel_attention = self.spatial_attention = None
         
         # Transformer编码器
-        encoder_layer = nn.TransformerEncoderLayer(
-            d_model=hidden_dim,
-            nhead=num_heads,
-            dim_feedforward=hidden_dim * 4,
-            dropout=dropout,
-            batch_first=True
-        )
-        self.transformer_encoder = nn.TransformerEncoder(encoder_layer, num_layers=num_layers)
+        self.transformer_encoder = None
+        if transformer_layers > 0:
+            encoder_layer = nn.TransformerEncoderLayer(
+                d_model=hidden_dim,
+                nhead=num_heads,
+                dim_feedforward=hidden_dim * 4,
+                dropout=dropout,
+                batch_first=True
+            )
+            self.transformer_encoder = nn.TransformerEncoder(encoder_layer, num_layers=transformer_layers)
         
         # LSTM层
-        self.lstm = nn.LSTM(
-            input_size=hidden_dim,
-            hidden_size=hidden_dim,
-            num_layers=2,
-            batch_first=True,
-            dropout=dropout,
-            bidirectional=True
-        )
+        self.lstm = None
+        sequence_dim = hidden_dim
+        if lstm_layers > 0:
+            self.lstm = nn.LSTM(
+                input_size=hidden_dim,
+                hidden_size=hidden_dim,
+                num_layers=lstm_layers,
+                batch_first=True,
+                dropout=dropout if lstm_layers > 1 else 0.0,
+                bidirectional=bidirectional
+            )
+            sequence_dim = hidden_dim * (2 if bidirectional else 1)
         
         # 注意力融合层
-        self.attention_fusion = nn.MultiheadAttention(
-            embed_dim=hidden_dim * 2,
-            num_heads=num_heads,
-            dropout=dropout,
-            batch_first=True
-        )
+        self.attention_fusion = None
+        if self.architecture['attention_fusion']:
+            self.attention_fusion = nn.MultiheadAttention(
+                embed_dim=sequence_dim,
+                num_heads=num_heads,
+                dropout=dropout,
+                batch_first=True
+            )
         
         # 输出层
         self.output_layers = nn.Sequential(
-            nn.Linear(hidden_dim * 2, hidden_dim),
+            nn.Linear(sequence_dim, hidden_dim),
             nn.ReLU(),
             nn.Dropout(dropout),
             nn.Linear(hidden_dim, hidden_dim // 2),
@@ -127,7 +206,19 @@ class RCSAN(nn.Module):
         
         # 位置编码
         self.pos_encoding = self._create_positional_encoding(sequence_length, hidden_dim)
-        
+
+    def config(self):
+        """决定参数形状的结构与超参数（只含普通类型，可保存为 JSON）"""
+        return {
+            'input_features': self.input_features,
+            'sequence_length': self.sequence_length,
+            'hidden_dim': self.hidden_dim,
+            'num_heads': self.num_heads,
+            'prediction_days': self.prediction_days,
+            'num_symbols': self.num_symbols,
+            'architecture': dict(self.architecture),
+        }
+
     def _create_positional_encoding(self, seq_len, d_model):
         """创建位置编码"""
         pe = torch.zeros(seq_len, d_model)
@@ -137,11 +228,13 @@ class RCSAN(nn.Module):
         pe[:, 1::2] = torch.cos(position * div_term)
         return pe.unsqueeze(0)
     
-    def forward(self, x):
+    def forward(self, x, symbol_ids=None):
         batch_size, seq_len, features = x.shape
         
         # 输入投影
         x = self.input_projection(x)  # [batch_size, seq_len, hidden_dim]
+        if self.symbol_embedding is not None and symbol_ids is not None:
+            x = x + self.symbol_embedding(symbol_ids).unsqueeze(1)
         
         # 添加位置编码
         if x.device != self.pos_encoding.device:
@@ -149,54 +242,210 @@ class RCSAN(nn.Module):
         x = x + self.pos_encoding[:, :seq_len, :]
         
         # 残差卷积处理 (需要转换维度)
-        x_conv = x.transpose(1, 2)  # [batch_size, hidden_dim, seq_len]
-        for conv_layer in self.conv_layers:
-            x_conv = conv_layer(x_conv)
-        
-        # 通道注意力 (添加一个维度用于2D卷积)
-        x_conv_2d = x_conv.unsqueeze(-1)  # [batch_size, hidden_dim, seq_len, 1]
-        ca_weight = self.channel_attention(x_conv_2d)
-        x_conv_2d = x_conv_2d * ca_weight
-        
-        # 空间注意力
-        sa_weight = self.spatial_attention(x_conv_2d)
-        x_conv_2d = x_conv_2d * sa_weight
-        
-        # 转回原维度
-        x_conv = x_conv_2d.squeeze(-1).transpose(1, 2)  # [batch_size, seq_len, hidden_dim]
+        if len(self.conv_layers) > 0:
+            x_conv = x.transpose(1, 2)  # [batch_size, hidden_dim, seq_len]
+            for conv_layer in self.conv_layers:
+                x_conv = conv_layer(x_conv)
+            x = x_conv.transpose(1, 2)  # [batch_size, seq_len, hidden_dim]
+        
+        if self.channel_attention is not None:
+            # 通道注意力 (添加一个维度用于2D卷积)
+            x_conv_2d = x.transpose(1, 2).unsqueeze(-1)  # [batch_size, hidden_dim, seq_len, 1]
+            ca_weight = self.channel_attention(x_conv_2d)
+            x_conv_2d = x_conv_2d * ca_weight
+            
+            # 空间注意力
+            sa_weight = self.spatial_attention(x_conv_2d)
+            x_conv_2d = x_conv_2d * sa_weight
+            
+            # 转回原维度
+            x = x_conv_2d.squeeze(-1).transpose(1, 2)  # [batch_size, seq_len, hidden_dim]
         
         # Transformer编码
-        x_transformer = self.transformer_encoder(x_conv)
+        if self.transformer_encoder is not None:
+            x = self.transformer_encoder(x)
         
         # LSTM处理
-        x_lstm, _ = self.lstm(x_transformer)
-        
-        # 注意力融合
-        x_fused, _ = self.attention_fusion(x_lstm, x_lstm, x_lstm)
+        if self.lstm is not None:
+            x, _ = self.lstm(x)
         
-        # 取最后一个时间步的输出
-        x_final = x_fused[:, -1, :]  # [batch_size, hidden_dim * 2]
+        # 注意力融合：只用到最后一个时间步的输出，查询只取最后一步，
+        # 结果与对整个序列做自注意力后取最后一步相同
+        if self.attention_fusion is not None:
+            x_final, _ = self.attention_fusion(x[:, -1:, :], x, x)
+            x_final = x_final[:, -1, :]  # [batch_size, sequence_dim]
+        else:
+            x_final = x[:, -1, :]
         
         # 预测输出
         predictions = self.output_layers(x_final)  # [batch_size, prediction_days]
         
         return predictions
 
-class StockPredictor:
+def quantize_rcsan(model):
+    """动态 int8 量化：返回模型的 CPU 副本，其中 Linear 与 LSTM 层的权重为 int8，激活在运行时量化
+    
+    Transformer 编码器层和 MultiheadAttention 内部的 Linear 保持 float32：
+    它们的融合快速路径只接受浮点权重，量化后反而更慢。动态量化不需要校准数据。
+    """
+    import copy
+    from torch.ao.quantization import quantize_dynamic
+    
+    model = copy.deepcopy(model).cpu().eval()
+    skipped = tuple(name for name, module in model.named_modules()
+                    if isinstance(module, (nn.TransformerEncoder, nn.MultiheadAttention)))
+    targets = {name for name, module in model.named_modules()
+               if isinstance(module, (nn.Linear, nn.LSTM))
+               and not any(name.startswith(prefix + '.') for prefix in skipped)}
+    return quantize_dynamic(model, targets, dtype=torch.qint8)
+
+def model_size(model):
+    """state_dict 序列化后的字节数"""
+    import io
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+def model_flops(model, batch_size=1):
+    """单次前向的浮点运算数（一次乘加计为2次）
+    
+    矩阵乘法和卷积由 FlopCounterMode 统计。统计时使用训练模式的副本，因为推理模式下
+    Transformer 与多头注意力走融合内核，FlopCounterMode 不计数；LSTM 的循环计算也不经过
+    可计数的算子，按每层每个方向 seq_len * 2 * 4H * (输入维度 + H) 补上。
+    """
+    import copy
+    from torch.utils.flop_counter import FlopCounterMode
+    
+    model = copy.deepcopy(model).cpu().train()
+    x = torch.zeros(batch_size, model.sequence_length, model.input_features)
+    with FlopCounterMode(display=False) as counter, torch.no_grad():
+        model(x)
+    flops = counter.get_total_flops()
+    
+    lstm = getattr(model, 'lstm', None)
+    if isinstance(lstm, nn.LSTM):
+        directions = 2 if lstm.bidirectional else 1
+        for layer in range(lstm.num_layers):
+            input_size = lstm.input_size if layer == 0 else lstm.hidden_size * directions
+            flops += (directions * batch_size * model.sequence_length
+                      * 2 * 4 * lstm.hidden_size * (input_size + lstm.hidden_size))
+    return flops
+
+def profile_rcsan(model, batch_size=1, repeats=20):
+    """返回模型的参数量、单次前向浮点运算数和 CPU 上 batch_size 个窗口的平均前向延迟（秒）"""
+    import copy
+    import time
+    
+    flops = model_flops(model, batch_size)
+    model = copy.deepcopy(model).cpu().eval()
+    x = torch.randn(batch_size, model.sequence_length, model.input_features)
+    with torch.inference_mode():
+        model(x)  # 预热
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            model(x)
+        latency = (time.perf_counter() - start_time) / repeats
+    return {
+        'params': sum(p.numel() for p in model.parameters()),
+        'flops': flops,
+        'latency': latency,
+    }
+
+class CheckpointWriter:
+    """后台线程写检查点
+    
+    submit 只记录最新一份待写的 state_dict 并立即返回，写盘在后台线程进行；
+    写盘期间提交的多份只写最后一份。先写临时文件再替换，中途失败不会损坏已有的检查点。
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.error = None
+        self._pending = None
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def submit(self, state_dict):
+        """提交一份 state_dict（调用方保证之后不再修改其中的张量）"""
+        with self._lock:
+            self._pending = state_dict
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            with self._lock:
+                state_dict, self._pending = self._pending, None
+                if state_dict is None:
+                    self._thread = None
+                    return
+            tmp_path = self.path + '.tmp'
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                torch.save(state_dict, tmp_path)
+                os.replace(tmp_path, self.path)
+                self.error = None  # error 只反映最近一次写盘的结果
+            except Exception as e:
+                self.error = e
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+    
+    def close(self):
+        """等待后台写盘完成，最近一次写盘失败时返回 False"""
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        if self.error is not None:
+            print(f"⚠️ 检查点保存失败: {str(self.error)}")
+            return False
+        return True
+
+class StockPredictor(BatchInference):
     """股票预测器"""
     
-    def __init__(self, input_features=15, sequence_length=60, prediction_days=7, device=None):
+    def __init__(self, input_features=15, sequence_length=60, prediction_days=7, device=None,
+                 extended_features=False, num_symbols=0, mixed_precision=None, compile_model=None,
+                 checkpoint_path=None, quantized=None, **model_kwargs):
+        """model_kwargs 透传给 RCSAN（hidden_dim、num_layers、num_heads、dropout 等）"""
         self.device = device if device else torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.sequence_length = sequence_length
         self.prediction_days = prediction_days
+        self.feature_columns = get_feature_columns(extended_features)
+        self.symbol_index = None    # 联合训练时的 股票代码 -> 编号
+        self.symbol_transforms = None  # 联合训练时每只股票的 FeatureTransform
+        self.feature_transform = None  # 单只股票训练时 prepare_data 拟合的 FeatureTransform
+        self.checkpoint_path = checkpoint_path or os.path.join(PATH_CONFIG['model_dir'], 'best_model.pth')
+        self.checkpoint_interval = MODEL_CONFIG.get('checkpoint_interval', 10)
+        self.history = []           # 每个epoch的 (训练损失, 验证损失)
+        
+        # 推理时使用动态 int8 量化模型（只在 CPU 上运行，首次预测时由当前参数生成）
+        self.quantized = MODEL_CONFIG.get('quantized_inference', False) if quantized is None else quantized
+        self._quantized_model = None
         
         # 初始化模型
         self.model = RCSAN(
             input_features=input_features,
             sequence_length=sequence_length,
-            prediction_days=prediction_days
+            prediction_days=prediction_days,
+            num_symbols=num_symbols,
+            **model_kwargs
         ).to(self.device)
         
+        # 训练加速：混合精度与 torch.compile，默认取 MODEL_CONFIG 中的开关
+        # bfloat16 与 float32 的指数范围相同，不需要 GradScaler
+        self.mixed_precision = MODEL_CONFIG.get('mixed_precision', False) if mixed_precision is None else mixed_precision
+        self.amp_dtype = torch.bfloat16
+        compile_model = MODEL_CONFIG.get('compile_model', False) if compile_model is None else compile_model
+        self.train_module = self.model
+        if compile_model:
+            if hasattr(torch, 'compile'):
+                # 编译后的模块与 self.model 共享参数，保存/加载仍使用 self.model
+                self.train_module = torch.compile(self.model)
+            else:
+                print("⚠️ 当前 PyTorch 版本不支持 torch.compile，使用普通模式训练")
+        
         # 损失函数和优化器
         self.criterion = nn.MSELoss()
         self.optimizer = torch.optim.AdamW(self.model.parameters(), lr=1e-3, weight_decay=1e-5)
@@ -208,48 +457,52 @@ class StockPredictor:
         print(f"模型参数数量: {sum(p.numel() for p in self.model.parameters()):,}")
     
     def prepare_data(self, data, target_column='close'):
-        """准备训练数据"""
+        """准备训练数据，返回 (X, y)
+        
+        X、y 是同一块内存上相互重叠的滑动窗口，不能原地修改（如 X -= ...、数据增强），
+        否则会同时改动相邻样本；需要修改时先 clone()。
+        """
         # 选择特征列
-        feature_columns = [
-            'open', 'high', 'low', 'close', 'volume', 'amount',
-            'ma5', 'ma10', 'ma20', 'ma60', 'rsi', 'macd', 'macd_signal', 'macd_hist'
-        ]
+        feature_columns = self.feature_columns
         
         # 检查列是否存在
         available_columns = [col for col in feature_columns if col in data.columns]
         if len(available_columns) < len(feature_columns):
             print(f"警告: 缺少某些特征列，将使用可用的 {len(available_columns)} 个特征")
         
-        # 数据归一化
-        from sklearn.preprocessing import MinMaxScaler
-        self.scaler = MinMaxScaler()
-        
         # 准备特征数据
         features = data[available_columns].fillna(method='bfill').fillna(method='ffill')
-        scaled_features = self.scaler.fit_transform(features)
         
         # 准备目标数据
-        target = data[target_column].values
-        
-        # 创建序列数据
-        X, y = [], []
-        for i in range(len(scaled_features) - self.sequence_length - self.prediction_days + 1):
-            X.append(scaled_features[i:i + self.sequence_length])
-            y.append(target[i + self.sequence_length:i + self.sequence_length + self.prediction_days])
-        
-        X = np.array(X)
-        y = np.array(y)
-        
-        # 目标值归一化
-        self.target_scaler = MinMaxScaler()
-        y_reshaped = y.reshape(-1, 1)
-        y_scaled = self.target_scaler.fit_transform(y_reshaped)
-        y = y_scaled.reshape(y.shape)
-        
-        return torch.FloatTensor(X), torch.FloatTensor(y)
+        target = data[target_column].values.reshape(-1, 1)
+        num_samples = len(features) - self.sequence_length - self.prediction_days + 1
+        
+        # 数据归一化：拟合一次，推理和批量预测复用同一份参数。
+        # 目标值的各样本窗口恰好覆盖 sequence_length 之后的全部收盘价，
+        # 按这一段拟合与按展开后的 y 拟合得到的最小/最大值相同
+        self.feature_transform = FeatureTransform.fit(
+            features, target[self.sequence_length:] if num_samples > 0 else target, available_columns)
+        scaled_features = self.feature_transform.transform(features)
+        
+        if num_samples <= 0:
+            return (torch.empty(0, self.sequence_length, scaled_features.shape[1]),
+                    torch.empty(0, self.prediction_days))
+        
+        # 创建序列数据：滑动窗口视图，不复制数据，DataLoader 取批次时才拷贝
+        # 内存占用为 O(序列长度) 而不是 O(样本数 x sequence_length)
+        features = np.ascontiguousarray(scaled_features, dtype=np.float32)
+        targets = self.feature_transform.transform_target(target[self.sequence_length:]).astype(np.float32).ravel()
+        X = sliding_window_view(features, self.sequence_length, axis=0)[:num_samples]
+        y = sliding_window_view(targets, self.prediction_days)[:num_samples]
+        
+        # 视图形状为 (样本, 特征, 序列)，转置为 (样本, 序列, 特征)，仍然共享内存。
+        # 视图在 NumPy 中是只读的，PyTorch 不支持只读张量，会对此给出警告；训练流程只读取这些数据
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='The given NumPy array is not writable')
+            return torch.from_numpy(X).transpose(1, 2), torch.from_numpy(y)
     
-    def train(self, train_data, epochs=100, batch_size=32, validation_split=0.2):
-        """训练模型"""
+    def train(self, train_data, epochs=100, batch_size=32, validation_split=0.2, callback=None):
+        """训练模型，返回最好的验证损失"""
         X, y = train_data
         
         # 分割训练和验证数据
@@ -267,19 +520,63 @@ class StockPredictor:
         print(f"开始训练模型...")
         print(f"训练集大小: {len(X_train)}, 验证集大小: {len(X_val)}")
         
+        return self._fit(train_loader, val_loader, epochs, callback)
+    
+    def train_pooled(self, dataset, epochs=100, batch_size=256, validation_split=0.2, callback=None):
+        """多只股票联合训练
+        
+        dataset 为 PooledWindowDataset，每只股票按时间顺序切出最后 validation_split 比例的样本做验证，
+        模型需要以 num_symbols >= 股票数 创建。
+        """
+        if self.model.symbol_embedding is None or self.model.num_symbols < len(dataset.symbols):
+            raise ValueError(f"联合训练需要 num_symbols >= {len(dataset.symbols)}")
+        
+        train_idx, val_idx = dataset.split(validation_split)
+        train_loader = dataset.make_loader(train_idx, batch_size=batch_size, shuffle=True)
+        val_loader = dataset.make_loader(val_idx, batch_size=batch_size, shuffle=False)
+        
+        self.feature_columns = dataset.feature_columns
+        self.symbol_index = dict(dataset.symbol_index)
+        self.symbol_transforms = dict(dataset.transforms)
+        
+        print(f"开始联合训练模型...")
+        print(f"股票数: {len(dataset.symbols)}, 训练集大小: {len(train_idx)}, 验证集大小: {len(val_idx)}")
+        
+        return self._fit(train_loader, val_loader, epochs, callback)
+    
+    def _forward(self, batch):
+        """批次为 (X, y) 或 (X, y, symbol_ids)，返回 (预测值, 目标值)"""
+        batch = [tensor.to(self.device) for tensor in batch]
+        with torch.autocast(device_type=self.device.type, dtype=self.amp_dtype, enabled=self.mixed_precision):
+            if len(batch) == 3:
+                predictions = self.train_module(batch[0], batch[2])
+            else:
+                predictions = self.train_module(batch[0])
+        # 损失在 float32 下计算
+        return predictions.float(), batch[1]
+    
+    def _fit(self, train_loader, val_loader, epochs, callback=None):
+        """训练循环：学习率调度、早停，结束时恢复验证集上最好的参数
+        
+        最好的参数保存在内存中，每 checkpoint_interval 个 epoch（有更新时）及训练结束时
+        由后台线程写入 checkpoint_path。callback(epoch, train_loss, val_loss) 每个epoch后调用，
+        返回 True 时提前结束训练（用于超参数搜索剪枝）。
+        """
+        self.history = []
         best_val_loss = float('inf')
         patience_counter = 0
+        best_state = None
+        unsaved = False
+        writer = CheckpointWriter(self.checkpoint_path)
         
         for epoch in range(epochs):
             # 训练阶段
             self.model.train()
             train_loss = 0.0
             
-            for batch_X, batch_y in train_loader:
-                batch_X, batch_y = batch_X.to(self.device), batch_y.to(self.device)
-                
+            for batch in train_loader:
                 self.optimizer.zero_grad()
-                predictions = self.model(batch_X)
+                predictions, batch_y = self._forward(batch)
                 loss = self.criterion(predictions, batch_y)
                 loss.backward()
                 
@@ -294,14 +591,14 @@ class StockPredictor:
             val_loss = 0.0
             
             with torch.no_grad():
-                for batch_X, batch_y in val_loader:
-                    batch_X, batch_y = batch_X.to(self.device), batch_y.to(self.device)
-                    predictions = self.model(batch_X)
+                for batch in val_loader:
+                    predictions, batch_y = self._forward(batch)
                     loss = self.criterion(predictions, batch_y)
                     val_loss += loss.item()
             
             train_loss /= len(train_loader)
             val_loss /= len(val_loader)
+            self.history.append((train_loss, val_loss))
             
             # 学习率调度
             self.scheduler.step(val_loss)
@@ -310,65 +607,211 @@ class StockPredictor:
             if val_loss < best_val_loss:
                 best_val_loss = val_loss
                 patience_counter = 0
-                # 保存最佳模型
-                torch.save(self.model.state_dict(), 'd:/股票分析/best_model.pth')
+                # 在内存中保存最佳参数的副本
+                best_state = {name: tensor.detach().clone() for name, tensor in self.model.state_dict().items()}
+                unsaved = True
             else:
                 patience_counter += 1
             
+            if unsaved and self.checkpoint_interval and (epoch + 1) % self.checkpoint_interval == 0:
+                writer.submit(best_state)
+                unsaved = False
+            
             if epoch % 10 == 0 or patience_counter >= 20:
                 print(f'Epoch [{epoch+1}/{epochs}], Train Loss: {train_loss:.6f}, Val Loss: {val_loss:.6f}')
             
             if patience_counter >= 20:
                 print("早停触发，训练结束")
                 break
+            
+            if callback is not None and callback(epoch, train_loss, val_loss):
+                print(f"Epoch [{epoch+1}/{epochs}] 回调要求停止，训练结束")
+                break
         
         # 加载最佳模型
-        self.model.load_state_dict(torch.load('d:/股票分析/best_model.pth'))
+        if best_state is not None:
+            self.model.load_state_dict(best_state)
+            if unsaved:
+                writer.submit(best_state)
+        if writer.close() and best_state is not None:
+            print(f"最佳模型已保存到: {self.checkpoint_path}")
+        self._quantized_model = None  # 参数已更新，量化模型需要重新生成
         print("训练完成！")
+        return best_val_loss
+    
+    def _inference_model(self):
+        """返回 (推理用的模型, 设备)：开启 quantized 时为缓存的 int8 量化模型"""
+        if not self.quantized:
+            return self.model, self.device
+        if self._quantized_model is None:
+            self._quantized_model = quantize_rcsan(self.model)
+        return self._quantized_model, torch.device('cpu')
+    
+    def _infer(self, inputs, symbol_ids, batch_size):
+        """在 inference_mode 下分批前向"""
+        model, device = self._inference_model()
+        inputs = torch.from_numpy(inputs)
+        symbol_ids = torch.from_numpy(symbol_ids).to(device) if symbol_ids is not None else None
+        outputs = []
+        model.eval()
+        with torch.inference_mode():
+            for start in range(0, len(inputs), batch_size):
+                batch = inputs[start:start + batch_size].to(device)
+                ids = symbol_ids[start:start + batch_size] if symbol_ids is not None else None
+                outputs.append(model(batch, ids).cpu())
+        return torch.cat(outputs).numpy()
     
-    def predict(self, input_data):
-        """预测未来股价"""
-        self.model.eval()
+    def quantization_report(self, train_data, validation_split=0.2, batch_size=256):
+        """在验证窗口（与 train 相同的后 validation_split 部分）上比较 float32 与 int8 量化模型
         
-        with torch.no_grad():
-            if isinstance(input_data, np.ndarray):
-                input_data = torch.FloatTensor(input_data)
-            
-            input_data = input_data.to(self.device)
-            if len(input_data.shape) == 2:
-                input_data = input_data.unsqueeze(0)
-            
-            predictions = self.model(input_data)
-            
-            # 反归一化
-            predictions_np = predictions.cpu().numpy()
-            predictions_original = self.target_scaler.inverse_transform(
-                predictions_np.reshape(-1, 1)
-            ).reshape(predictions_np.shape)
-            
-            return predictions_original
+        返回两者的验证损失（归一化后的MSE）、预测价格的平均/最大偏差、模型大小和延迟。
+        """
+        import time
+        
+        X, y = train_data
+        split_idx = int(len(X) * (1 - validation_split))
+        inputs = np.ascontiguousarray(X[split_idx:].numpy(), dtype=np.float32)
+        targets = y[split_idx:].numpy()
+        
+        quantized = self.quantized
+        results = {}
+        try:
+            for mode in (False, True):
+                self.quantized = mode
+                model, _ = self._inference_model()
+                self._infer(inputs[:1], None, 1)  # 预热
+                start_time = time.time()
+                outputs = self._infer(inputs, None, batch_size)
+                batch_time = time.time() - start_time
+                start_time = time.time()
+                for i in range(min(len(inputs), 20)):
+                    self._infer(inputs[i:i + 1], None, 1)
+                single_time = (time.time() - start_time) / min(len(inputs), 20)
+                results[mode] = {
+                    'outputs': outputs,
+                    'val_loss': float(np.mean((outputs - targets) ** 2)),
+                    'size': model_size(model),
+                    'batch_latency': batch_time,
+                    'single_latency': single_time,
+                }
+        finally:
+            self.quantized = quantized
+        
+        prices = self.feature_transform.inverse_target(results[False]['outputs'])
+        price_error = np.abs(self.feature_transform.inverse_target(results[True]['outputs']) - prices)
+        return {
+            'samples': len(inputs),
+            'fp32_val_loss': results[False]['val_loss'],
+            'int8_val_loss': results[True]['val_loss'],
+            'mean_price_diff': float(price_error.mean()) if len(price_error) else 0.0,
+            'max_price_diff': float(price_error.max()) if len(price_error) else 0.0,
+            'fp32_size': results[False]['size'],
+            'int8_size': results[True]['size'],
+            'fp32_single_latency': results[False]['single_latency'],
+            'int8_single_latency': results[True]['single_latency'],
+            'fp32_batch_latency': results[False]['batch_latency'],
+            'int8_batch_latency': results[True]['batch_latency'],
+        }
+    
+    def export_onnx(self, filepath, opset_version=17):
+        """导出为 ONNX 模型，推理元数据（序列长度、特征列、归一化参数等）写入同名 .json 文件
+        
+        批次维度为动态，联合训练的模型额外有 symbol_ids 输入。返回 .json 文件路径。
+        """
+        import copy
+        import json
+        import inspect
+        
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        # 导出 CPU 上的副本，导出失败时原模型的设备和训练状态都不受影响
+        model = copy.deepcopy(self.model).cpu().eval()
+        inputs = (torch.zeros(1, self.sequence_length, model.input_features),)
+        input_names = ['x']
+        if model.symbol_embedding is not None:
+            inputs += (torch.zeros(1, dtype=torch.long),)
+            input_names.append('symbol_ids')
+        
+        options = {}
+        if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+            options['dynamo'] = False  # 使用 TorchScript 导出器，LSTM 与注意力层导出更稳定
+        torch.onnx.export(
+            model, inputs, filepath,
+            input_names=input_names,
+            output_names=['predictions'],
+            dynamic_axes={name: {0: 'batch'} for name in input_names + ['predictions']},
+            opset_version=opset_version,
+            **options
+        )
+        
+        metadata_path = filepath + '.json'
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(self.metadata(), f, ensure_ascii=False)
+        print(f"ONNX 模型已导出到: {filepath}")
+        return metadata_path
+    
+    def metadata(self):
+        """在推理元数据之外记录模型结构和超参数，加载时据此检查当前模型是否与文件一致"""
+        metadata = super().metadata()
+        metadata['model_config'] = self.model.config()
+        return metadata
     
     def save_model(self, filepath):
         """保存模型"""
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
         torch.save({
             'model_state_dict': self.model.state_dict(),
             'optimizer_state_dict': self.optimizer.state_dict(),
-            'scaler': self.scaler,
-            'target_scaler': self.target_scaler,
-            'sequence_length': self.sequence_length,
-            'prediction_days': self.prediction_days
+            **self.metadata()
         }, filepath)
         print(f"模型已保存到: {filepath}")
     
+    @staticmethod
+    def _load_checkpoint(filepath, map_location):
+        """读取模型文件
+        
+        torch.load 默认 weights_only=True，不反序列化任意对象。旧版模型文件保存的是 sklearn MinMaxScaler，
+        只对这种格式放行 MinMaxScaler 和其中的 NumPy 数组，含其他对象的文件仍然拒绝加载。
+        """
+        try:
+            return torch.load(filepath, map_location=map_location)
+        except pickle.UnpicklingError:
+            from sklearn.preprocessing import MinMaxScaler
+            # NumPy 2 把 numpy.core 移到 numpy._core，旧文件里记录的仍是 numpy.core.multiarray._reconstruct
+            try:
+                from numpy._core.multiarray import _reconstruct as reconstruct
+            except ImportError:
+                from numpy.core.multiarray import _reconstruct as reconstruct
+            legacy_globals = [MinMaxScaler, reconstruct, (reconstruct, 'numpy.core.multiarray._reconstruct'),
+                              np.ndarray, np.dtype]
+            legacy_globals += [type(np.dtype(dtype)) for dtype in (np.float64, np.int64, object)]
+            with torch.serialization.safe_globals(legacy_globals):
+                return torch.load(filepath, map_location=map_location)
+    
     def load_model(self, filepath):
-        """加载模型"""
-        checkpoint = torch.load(filepath, map_location=self.device)
+        """加载模型（兼容保存 sklearn MinMaxScaler 的旧版模型文件）"""
+        checkpoint = self._load_checkpoint(filepath, self.device)
+        saved_config = checkpoint.get('model_config')
+        if saved_config is not None:
+            current_config = self.model.config()
+            mismatched = [f"{name}: 文件为 {value}，当前为 {current_config.get(name)}"
+                          for name, value in saved_config.items() if current_config.get(name) != value]
+            if mismatched:
+                raise ValueError(f"模型文件 {filepath} 的结构与当前模型不一致，请用相同的参数创建 StockPredictor（"
+                                 + "；".join(mismatched) + "）")
         self.model.load_state_dict(checkpoint['model_state_dict'])
         self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
-        self.scaler = checkpoint['scaler']
-        self.target_scaler = checkpoint['target_scaler']
-        self.sequence_length = checkpoint['sequence_length']
-        self.prediction_days = checkpoint['prediction_days']
+        
+        if 'scaler' in checkpoint:
+            # 旧版模型文件保存的是 sklearn MinMaxScaler
+            self.sequence_length = checkpoint['sequence_length']
+            self.prediction_days = checkpoint['prediction_days']
+            self.feature_columns = checkpoint.get('feature_columns', self.feature_columns)
+            self.symbol_index = checkpoint.get('symbol_index')
+            self.feature_transform = FeatureTransform.from_min_max_scaler(
+                checkpoint['scaler'], checkpoint['target_scaler'], self.feature_columns)
+        else:
+            self.load_metadata(checkpoint)
+        self._quantized_model = None
         print(f"模型已从 {filepath} 加载")
 
 if __name__ == "__main__":
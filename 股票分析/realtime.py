@@ -0,0 +1,201 @@
+import asyncio
+import inspect
+from functools import partial
+import numpy as np
+import pandas as pd
+
+from config import REALTIME_CONFIG
+
+class TickRingBuffer:
+    """定长环形缓冲区，保存单只股票最近 capacity 笔行情快照
+
+    各字段为预先分配的 NumPy 数组，写满后覆盖最早的数据，内存占用固定。
+    """
+
+    FIELDS = ('timestamp', 'price', 'volume', 'amount')
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.timestamp = np.zeros(capacity, dtype=np.float64)  # 秒级时间戳
+        self.price = np.zeros(capacity, dtype=np.float64)
+        self.volume = np.zeros(capacity, dtype=np.float64)     # 当日累计成交量
+        self.amount = np.zeros(capacity, dtype=np.float64)     # 当日累计成交额
+        self.count = 0                                         # 累计写入条数
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def last_timestamp(self):
+        if self.count == 0:
+            return None
+        return self.timestamp[(self.count - 1) % self.capacity]
+
+    def append(self, timestamp, price, volume, amount):
+        i = self.count % self.capacity
+        self.timestamp[i] = timestamp
+        self.price[i] = price
+        self.volume[i] = volume
+        self.amount[i] = amount
+        self.count += 1
+
+    def latest(self, n=None):
+        """按时间顺序返回最近 n 条数据（各字段数组的副本）"""
+        size = len(self) if n is None else min(n, len(self))
+        idx = np.arange(self.count - size, self.count) % self.capacity
+        return {field: getattr(self, field)[idx] for field in self.FIELDS}
+
+    def to_frame(self, n=None):
+        data = self.latest(n)
+        df = pd.DataFrame(data)
+        df.insert(0, 'date', pd.to_datetime(df.pop('timestamp'), unit='s'))
+        return df
+
+class BarAggregator:
+    """把累计成交量的行情快照增量合成为固定周期K线"""
+
+    def __init__(self, seconds=60):
+        self.seconds = seconds
+        self.bucket = None
+        self.volume_base = None
+        self.amount_base = None
+
+    def update(self, timestamp, price, cum_volume, cum_amount):
+        """写入一笔快照，跨越周期边界时返回上一根已完成的K线，否则返回 None"""
+        bucket = int(timestamp // self.seconds)
+        finished = None
+
+        if self.bucket is not None and bucket != self.bucket:
+            finished = self.current_bar()
+            self.volume_base, self.amount_base = self.last_volume, self.last_amount
+            self.bucket = None
+
+        if self.volume_base is None:
+            self.volume_base, self.amount_base = cum_volume, cum_amount
+        elif cum_volume < self.volume_base:
+            # 新交易日累计量归零
+            self.volume_base, self.amount_base = 0.0, 0.0
+
+        if self.bucket is None:
+            self.bucket = bucket
+            self.open = self.high = self.low = price
+        self.high = max(self.high, price)
+        self.low = min(self.low, price)
+        self.close = price
+        self.last_volume = cum_volume
+        self.last_amount = cum_amount
+        return finished
+
+    def current_bar(self):
+        """当前（可能尚未完成的）K线，时间戳为周期结束时间"""
+        if self.bucket is None:
+            return None
+        return {
+            'date': pd.Timestamp((self.bucket + 1) * self.seconds, unit='s'),
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            'volume': self.last_volume - self.volume_base,
+            'amount': self.last_amount - self.amount_base,
+        }
+
+class TickStreamer:
+    """基于 asyncio 的实时行情轮询器
+
+    按 poll_interval 秒批量拉取自选股的新浪行情快照，新快照写入每只股票的
+    环形缓冲区并增量合成K线。通过 subscribe 注册回调：
+    'tick' 事件在每笔新快照时触发，'bar' 事件在一根K线完成时触发，
+    回调签名为 callback(code, payload)，可以是普通函数或协程函数。
+    """
+
+    EVENTS = ('tick', 'bar')
+
+    def __init__(self, crawler, codes, poll_interval=None, buffer_size=None, bar_seconds=None):
+        self.crawler = crawler
+        self.codes = list(dict.fromkeys(codes))
+        self.poll_interval = poll_interval if poll_interval is not None else REALTIME_CONFIG['poll_interval']
+        buffer_size = buffer_size or REALTIME_CONFIG['buffer_size']
+        bar_seconds = bar_seconds or REALTIME_CONFIG['bar_seconds']
+
+        self.buffers = {code: TickRingBuffer(buffer_size) for code in self.codes}
+        self.bars = {code: BarAggregator(bar_seconds) for code in self.codes}
+        self._subscribers = {event: [] for event in self.EVENTS}
+        self._running = False
+
+    def subscribe(self, callback, event='bar'):
+        """注册回调，返回取消订阅的函数"""
+        if event not in self.EVENTS:
+            raise ValueError(f"不支持的事件类型: {event}")
+        self._subscribers[event].append(callback)
+        return lambda: self._subscribers[event].remove(callback)
+
+    def ingest(self, quotes):
+        """处理一批行情快照，返回待分发的事件列表 [(event, code, payload)]"""
+        events = []
+        if quotes is None or len(quotes) == 0:
+            return events
+
+        parsed = pd.to_datetime(quotes['date'] + ' ' + quotes['time'], errors='coerce')
+        timestamps = parsed.values.astype('M8[s]').astype(np.int64).astype(np.float64)
+        timestamps[parsed.isna().values] = np.nan
+
+        for code, ts, price, volume, amount in zip(quotes['code'], timestamps, quotes['close'],
+                                                   quotes['volume'], quotes['amount']):
+            buffer = self.buffers.get(code)
+            # 停牌或未开盘时价格为0；时间戳未变化说明是重复快照
+            if buffer is None or price <= 0 or np.isnan(ts):
+                continue
+            if buffer.last_timestamp is not None and ts <= buffer.last_timestamp:
+                continue
+
+            buffer.append(ts, price, volume, amount)
+            events.append(('tick', code, {'date': pd.Timestamp(ts, unit='s'), 'price': price,
+                                          'volume': volume, 'amount': amount}))
+
+            bar = self.bars[code].update(ts, price, volume, amount)
+            if bar is not None:
+                events.append(('bar', code, bar))
+        return events
+
+    async def _emit(self, events):
+        for event, code, payload in events:
+            for callback in list(self._subscribers[event]):
+                result = callback(code, payload)
+                if inspect.isawaitable(result):
+                    await result
+
+    async def poll_once(self):
+        """拉取一次行情并分发事件，返回新快照条数"""
+        loop = asyncio.get_running_loop()
+        quotes = await loop.run_in_executor(
+            None, partial(self.crawler.get_realtime_quotes, self.codes, use_cache=False)
+        )
+        events = self.ingest(quotes)
+        await self._emit(events)
+        return sum(1 for event, _, _ in events if event == 'tick')
+
+    async def run(self, max_polls=None):
+        """持续轮询，直到调用 stop() 或达到 max_polls 次"""
+        loop = asyncio.get_running_loop()
+        self._running = True
+        polls = 0
+
+        while self._running and (max_polls is None or polls < max_polls):
+            started = loop.time()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"实时行情轮询失败: {str(e)}")
+            polls += 1
+            if max_polls is None or polls < max_polls:
+                await asyncio.sleep(max(0.0, self.poll_interval - (loop.time() - started)))
+
+        self._running = False
+
+    def stop(self):
+        self._running = False
+
+    def get_ticks(self, code, n=None):
+        """某只股票最近 n 笔快照的 DataFrame"""
+        return self.buffers[code].to_frame(n)
@@ -0,0 +1,70 @@
+"""
+行情数据的紧凑类型约定
+
+爬取的数据默认全部为 float64，全市场多年的面板数据放不进内存。这里统一约定：
+价格、比例类字段和技术指标使用 float32，成交量为整数时使用 int64（否则 float32），
+多只股票拼接时 symbol 列使用 category。
+
+每100万行的内存占用（date + 10个行情字段，memory_per_million_rows 实测）：
+    默认 float64            约 84 MB
+    compact_frame           约 50 MB
+    长表 + symbol 列         object 约 144 MB，category 约 51 MB
+加上 add_technical_indicators 的11个指标列后：float64 约 168 MB，紧凑类型约 92 MB。
+"""
+
+import numpy as np
+import pandas as pd
+
+# 单精度即可满足的字段（相对误差约 1e-7）
+FLOAT32_COLUMNS = [
+    'open', 'close', 'high', 'low', 'amount', 'amplitude', 'change_pct', 'change', 'turnover',
+    'close_yesterday',
+]
+# 技术指标列前缀（含扩展指标）与后缀
+INDICATOR_PREFIXES = ('ma', 'rsi', 'macd', 'bb_', 'atr', 'obv', 'kdj_', 'cci', 'wr', 'vwap', 'sar')
+INDICATOR_SUFFIXES = ('_zscore',)
+
+def _is_indicator(column):
+    return column.startswith(INDICATOR_PREFIXES) or column.endswith(INDICATOR_SUFFIXES)
+
+def compact_frame(df, copy=True):
+    """把行情 DataFrame 转换为紧凑类型，返回新的 DataFrame（copy=False 时原地修改）"""
+    if df is None:
+        return df
+    out = df.copy() if copy else df
+
+    for col in out.columns:
+        series = out[col]
+        if col in FLOAT32_COLUMNS or (_is_indicator(col) and series.dtype == np.float64):
+            out[col] = series.astype(np.float32)
+        elif col == 'volume':
+            values = series.to_numpy()
+            if np.isfinite(values).all() and np.array_equal(values, np.round(values)):
+                out[col] = series.astype(np.int64)
+            else:
+                out[col] = series.astype(np.float32)
+        elif col in ('symbol', 'code') and series.dtype == object:
+            out[col] = series.astype('category')
+    return out
+
+def concat_symbols(frames, symbol_column='symbol'):
+    """把 {股票代码: DataFrame} 拼接成带 category 类型 symbol 列的紧凑长表"""
+    parts = []
+    for symbol, df in frames.items():
+        if df is None or len(df) == 0:
+            continue
+        part = compact_frame(df)
+        part.insert(0, symbol_column, symbol)
+        parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=[symbol_column])
+
+    panel = pd.concat(parts, ignore_index=True)
+    panel[symbol_column] = pd.Categorical(panel[symbol_column], categories=list(frames))
+    return panel
+
+def memory_per_million_rows(df):
+    """按当前列类型估算每100万行的内存占用（MB）"""
+    if len(df) == 0:
+        return 0.0
+    return df.memory_usage(index=False, deep=True).sum() / len(df) * 1_000_000 / 1024 ** 2
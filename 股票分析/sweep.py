@@ -0,0 +1,190 @@
+"""
+R-CSAN 超参数搜索
+
+按网格组合 SWEEP_CONFIG['search_space'] 中的参数，在进程池中并行训练 StockPredictor。
+每个进程分到 CPU核数 / 进程数 个 PyTorch 线程，避免线程数超过核数互相争抢。
+各组参数每个epoch把到目前为止最好的验证损失写入共享列表，MedianPruner 在同一epoch
+比其他组的中位数差时提前停止该组。结果按最好的验证损失排序写入 CSV。
+
+run_ablation 在同一份数据上依次训练 ARCHITECTURE_CONFIG 中的各个结构，比较参数量、
+浮点运算数、CPU 推理延迟和验证损失。
+"""
+
+import os
+import time
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import torch
+
+from config import SWEEP_CONFIG, MODEL_CONFIG, PATH_CONFIG, ARCHITECTURE_CONFIG
+from rcsan_model import StockPredictor, get_feature_columns, profile_rcsan
+
+# 不属于 RCSAN 构造参数、由搜索流程单独处理的参数
+TRIAL_PARAMS = ('sequence_length',)
+
+def grid_trials(search_space):
+    """把 {参数: 候选值列表} 展开为参数组合列表"""
+    names = list(search_space)
+    return [dict(zip(names, values)) for values in itertools.product(*(search_space[name] for name in names))]
+
+def partition_threads(num_trials, max_workers=None):
+    """返回 (进程数, 每个进程的线程数)，进程数不超过CPU核数和参数组数"""
+    cores = os.cpu_count() or 1
+    workers = max(1, min(max_workers or cores, cores, num_trials))
+    return workers, max(1, cores // workers)
+
+class MedianPruner:
+    """中位数剪枝：某组参数在第 epoch 轮的最好验证损失比其他组同一轮的中位数差时剪枝
+
+    reports 为 (参数组编号, epoch, 最好验证损失) 的列表，进程池中使用 Manager().list() 共享。
+    """
+
+    def __init__(self, reports, prune_after=5, min_trials=3):
+        self.reports = reports
+        self.prune_after = prune_after
+        self.min_trials = min_trials
+
+    def should_prune(self, trial_id, epoch, best_val_loss):
+        """记录本组结果，返回是否剪枝"""
+        self.reports.append((trial_id, epoch, best_val_loss))
+        if epoch + 1 < self.prune_after:
+            return False
+        others = [value for tid, ep, value in list(self.reports) if ep == epoch and tid != trial_id]
+        if len(others) < self.min_trials:
+            return False
+        return best_val_loss > np.median(others)
+
+_worker_state = {}
+
+def _init_worker(num_threads, reports, pruner_options):
+    """进程池初始化：限制 PyTorch 线程数并保存共享的剪枝记录"""
+    torch.set_num_threads(num_threads)
+    _worker_state['pruner'] = MedianPruner(reports, **pruner_options)
+
+def run_trial(trial_id, params, data, epochs, batch_size, checkpoint_dir=None, pruner=None, profile=False):
+    """训练一组参数，返回结果字典（训练失败时 status 为 failed）
+
+    profile=True 时结果中加入 profile_rcsan 的参数量、浮点运算数和单窗口延迟。
+    """
+    pruner = pruner or _worker_state.get('pruner')
+    sequence_length = params.get('sequence_length', MODEL_CONFIG['sequence_length'])
+    model_kwargs = {name: value for name, value in params.items() if name not in TRIAL_PARAMS}
+    result = dict(params, trial=trial_id, best_val_loss=np.nan, epochs=0, status='completed', seconds=0.0)
+    start_time = time.time()
+
+    try:
+        # 与训练、预测使用相同的特征集合
+        extended_features = MODEL_CONFIG.get('extended_features', False)
+        feature_columns = [col for col in get_feature_columns(extended_features) if col in data.columns]
+        checkpoint_path = os.path.join(checkpoint_dir, f"trial_{trial_id}.pth") if checkpoint_dir else None
+        predictor = StockPredictor(input_features=len(feature_columns), sequence_length=sequence_length,
+                                   prediction_days=MODEL_CONFIG['prediction_days'], device=torch.device('cpu'),
+                                   extended_features=extended_features, checkpoint_path=checkpoint_path,
+                                   **model_kwargs)
+        predictor.checkpoint_interval = 0
+        X, y = predictor.prepare_data(data)
+
+        best = [float('inf')]
+        pruned = [False]
+
+        def callback(epoch, train_loss, val_loss):
+            best[0] = min(best[0], val_loss)
+            if pruner is not None and pruner.should_prune(trial_id, epoch, best[0]):
+                pruned[0] = True
+            return pruned[0]
+
+        result['best_val_loss'] = predictor.train((X, y), epochs=epochs, batch_size=batch_size, callback=callback)
+        result['epochs'] = len(predictor.history)
+        result['status'] = 'pruned' if pruned[0] else 'completed'
+        if profile:
+            result.update(profile_rcsan(predictor.model))
+    except Exception as e:
+        print(f"❌ 参数组 {trial_id} 训练失败: {str(e)}")
+        result['status'] = 'failed'
+
+    result['seconds'] = time.time() - start_time
+    return result
+
+def run_sweep(data, search_space=None, epochs=None, batch_size=None, max_workers=None,
+              results_path=None, checkpoint_dir=None):
+    """并行搜索超参数，返回按最好验证损失排序的结果表并写入 results_path（CSV）
+
+    每组参数的最佳模型保存为 checkpoint_dir/trial_{编号}.pth。
+    """
+    search_space = search_space or SWEEP_CONFIG['search_space']
+    epochs = epochs or SWEEP_CONFIG['epochs']
+    batch_size = batch_size or SWEEP_CONFIG['batch_size']
+    results_path = results_path or os.path.join(PATH_CONFIG['output_dir'], 'sweep_results.csv')
+    checkpoint_dir = checkpoint_dir or os.path.join(PATH_CONFIG['model_dir'], 'sweep')
+
+    trials = grid_trials(search_space)
+    workers, num_threads = partition_threads(len(trials), max_workers or SWEEP_CONFIG.get('max_workers'))
+    pruner_options = {
+        'prune_after': SWEEP_CONFIG.get('prune_after', 5),
+        'min_trials': SWEEP_CONFIG.get('prune_min_trials', 3),
+    }
+    print(f"🔍 超参数搜索: {len(trials)} 组参数, {workers} 个进程 x {num_threads} 个线程")
+
+    # spawn 启动的子进程不继承父进程的 PyTorch 线程池，Windows 上也是默认方式
+    context = multiprocessing.get_context('spawn')
+    results = []
+    with context.Manager() as manager:
+        reports = manager.list()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(num_threads, reports, pruner_options)) as executor:
+            futures = [executor.submit(run_trial, i, params, data, epochs, batch_size, checkpoint_dir)
+                       for i, params in enumerate(trials)]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(f"   参数组 {result['trial']} {result['status']}: 验证损失 {result['best_val_loss']:.6f}, "
+                      f"{result['epochs']} 个epoch, {result['seconds']:.1f}秒")
+
+    table = pd.DataFrame(results).sort_values('best_val_loss', na_position='last').reset_index(drop=True)
+    os.makedirs(os.path.dirname(results_path) or '.', exist_ok=True)
+    table.to_csv(results_path, index=False)
+    print(f"✅ 搜索完成，结果已保存到: {results_path}")
+    return table
+
+def run_ablation(data, architectures=None, epochs=None, batch_size=None, results_path=None,
+                 checkpoint_dir=None, **model_kwargs):
+    """结构消融：依次训练各个结构，返回参数量、浮点运算数、延迟和验证损失的对比表并写入 results_path（CSV）
+
+    architectures 为结构名称列表（默认 ARCHITECTURE_CONFIG 中的全部结构），model_kwargs 为各结构共用的
+    RCSAN 参数（hidden_dim、num_layers 等）。为了让延迟可比，各结构在当前进程中顺序运行，不剪枝。
+    每个结构的最佳模型保存为 checkpoint_dir/trial_{编号}.pth。
+    """
+    architectures = architectures or list(ARCHITECTURE_CONFIG)
+    epochs = epochs or SWEEP_CONFIG['epochs']
+    batch_size = batch_size or SWEEP_CONFIG['batch_size']
+    results_path = results_path or os.path.join(PATH_CONFIG['output_dir'], 'ablation_results.csv')
+    checkpoint_dir = checkpoint_dir or os.path.join(PATH_CONFIG['model_dir'], 'ablation')
+
+    results = []
+    for i, architecture in enumerate(architectures):
+        torch.manual_seed(0)
+        result = run_trial(i, dict(model_kwargs, architecture=architecture), data, epochs, batch_size,
+                           checkpoint_dir, profile=True)
+        results.append(result)
+        if result['status'] != 'failed':
+            print(f"   {architecture}: 参数 {result['params']:,}, {result['flops'] / 1e6:.1f} MFLOPs, "
+                  f"单窗口 {result['latency'] * 1e3:.2f}毫秒, 验证损失 {result['best_val_loss']:.6f}")
+
+    table = pd.DataFrame(results)
+    os.makedirs(os.path.dirname(results_path) or '.', exist_ok=True)
+    table.to_csv(results_path, index=False)
+    print(f"✅ 结构消融完成，结果已保存到: {results_path}")
+    return table
+
+if __name__ == '__main__':
+    from data_crawler import StockDataCrawler
+
+    crawler = StockDataCrawler()
+    raw_data = crawler.get_stock_data('000001', 500)
+    if raw_data is not None and len(raw_data) > 0:
+        data = crawler.add_technical_indicators(raw_data, extended=MODEL_CONFIG.get('extended_features', False))
+        print(run_sweep(data).to_string())
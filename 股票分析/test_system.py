@@ -5,19 +5,203 @@
 
 import sys
 import os
+import json
+import pickle
+import time
+import asyncio
+import tempfile
+import threading
 import unittest
+import warnings
+from unittest.mock import patch
 import pandas as pd
 import numpy as np
 import torch
 from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 
 # 添加项目路径
 sys.path.append('d:/股票分析')
 
+from config import ARCHITECTURE_CONFIG, MODEL_CONFIG
 from data_crawler import StockDataCrawler
-from rcsan_model import StockPredictor, RCSAN
+from kline_store import resample_klines
+from realtime import TickStreamer
+from schema import compact_frame, concat_symbols, memory_per_million_rows
+import indicator_kernels
+from indicators import (IndicatorPlan, IndicatorNode, IndicatorState, INDICATOR_REGISTRY,
+                        register_indicator, compute_indicators, extended_feature_columns)
+from http_cache import ResponseCache
+from rate_limiter import TokenBucket, CircuitBreaker, SourceUnavailableError
+from rcsan_model import (StockPredictor, RCSAN, CheckpointWriter, get_feature_columns, quantize_rcsan, model_size,
+                         resolve_architecture, profile_rcsan)
+from pooled_dataset import PooledWindowDataset
+from feature_transform import FeatureTransform, FEATURE_TRANSFORM_VERSION
+from onnx_backend import OnnxPredictor, ONNX_AVAILABLE
+from sweep import grid_trials, partition_threads, MedianPruner, run_trial, run_sweep, run_ablation
 from visualizer import StockVisualizer
 
+class StubKlineHandler(BaseHTTPRequestHandler):
+    """模拟东方财富K线接口和新浪行情接口的本地HTTP服务"""
+    
+    def do_GET(self):
+        if self.path.startswith('/list='):
+            self.server.requests.append(self.path)
+            self._send(self.sina_quotes(self.path[len('/list='):].split(',')).encode('gbk'), 'application/javascript; charset=GBK')
+            return
+        
+        query = parse_qs(urlparse(self.path).query)
+        secid = query.get('secid', [''])[0]
+        self.server.requests.append(query)
+        
+        if urlparse(self.path).path.endswith('/clist/get'):
+            self._send(json.dumps(self.stock_list(query)).encode('utf-8'), 'application/json')
+            return
+        
+        # 模拟服务端暂时不可用
+        if self.server.fail_next > 0:
+            self.server.fail_next -= 1
+            self._send(b'service unavailable', 'text/plain', status=503)
+            return
+        
+        # 以 8 结尾的代码模拟客户端错误
+        if secid.endswith('8'):
+            self._send(b'not found', 'text/plain', status=404)
+            return
+        
+        # 以 9 结尾的代码模拟无数据的股票
+        if secid.endswith('9'):
+            payload = {'rc': 0, 'data': None}
+        else:
+            beg = datetime.strptime(query.get('beg', ['20230101'])[0], '%Y%m%d')
+            end = datetime.strptime(query.get('end', ['20230101'])[0], '%Y%m%d')
+            klines = []
+            for i, date in enumerate(pd.date_range(beg, end)):
+                # 价格只由日期决定，保证不同区间请求返回的同一天K线一致
+                price = 10.0 + (date.toordinal() % 100) * 0.1
+                klines.append(f"{date.strftime('%Y-%m-%d')},{price:.2f},{price + 0.05:.2f},"
+                              f"{price + 0.2:.2f},{price - 0.2:.2f},{1000 + i},{10000.0 + i},"
+                              f"4.0,0.5,0.05,1.2")
+            payload = {'rc': 0, 'data': {'code': secid.split('.')[-1], 'klines': klines}}
+        
+        self._send(json.dumps(payload).encode('utf-8'), 'application/json')
+    
+    @staticmethod
+    def stock_list(query):
+        """模拟东方财富全市场列表接口（共250只股票，分页返回）"""
+        universe = [{'f12': f"{600000 + i}", 'f13': 1, 'f14': f"沪股{i}"} for i in range(120)]
+        universe += [{'f12': f"{i + 1:06d}", 'f13': 0, 'f14': f"深股{i}"} for i in range(120)]
+        universe += [{'f12': f"{830000 + i}", 'f13': 0, 'f14': f"京股{i}"} for i in range(10)]
+        page, size = int(query['pn'][0]), int(query['pz'][0])
+        return {'rc': 0, 'data': {'total': len(universe), 'diff': universe[(page - 1) * size:page * size]}}
+    
+    @staticmethod
+    def sina_quotes(symbols):
+        """生成新浪行情格式的多行文本"""
+        lines = []
+        for symbol in symbols:
+            if symbol.endswith('9'):
+                lines.append(f'var hq_str_{symbol}="";')
+                continue
+            fields = [f"股票{symbol[2:]}", '10.00', '9.90', '10.10', '10.20', '9.80', '10.09', '10.10',
+                      '123456', '1234567.00'] + ['0'] * 20 + ['2024-01-02', '15:00:00', '00']
+            lines.append(f'var hq_str_{symbol}="{",".join(fields)}";')
+        return '\n'.join(lines) + '\n'
+    
+    def _send(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def make_klines(n, start='2015-01-01'):
+    """生成东方财富格式的K线字符串"""
+    dates = pd.date_range(start=start, periods=n, freq='min')
+    rng = np.random.default_rng(0)
+    prices = 10 + np.cumsum(rng.normal(0, 0.01, n))
+    return [f"{d.strftime('%Y-%m-%d %H:%M')},{p:.2f},{p + 0.01:.2f},{p + 0.05:.2f},{p - 0.05:.2f},"
+            f"{1000 + i % 500},{12345.6 + i},1.23,0.45,0.01,0.78"
+            for i, (d, p) in enumerate(zip(dates, prices))]
+
+def make_minute_bars(days=2, start='2024-01-02'):
+    """生成完整交易时段的1分钟K线（每天240根）"""
+    stamps = []
+    for day in pd.bdate_range(start=start, periods=days):
+        stamps.extend(day + pd.Timedelta(hours=9, minutes=30) + pd.to_timedelta(np.arange(1, 121), unit='m'))
+        stamps.extend(day + pd.Timedelta(hours=13) + pd.to_timedelta(np.arange(1, 121), unit='m'))
+    n = len(stamps)
+    close = 10 + np.arange(n) * 0.01
+    return pd.DataFrame({
+        'date': pd.DatetimeIndex(stamps),
+        'open': close - 0.005, 'close': close, 'high': close + 0.02, 'low': close - 0.02,
+        'volume': np.ones(n) * 100, 'amount': np.ones(n) * 1000,
+        'amplitude': 0.0, 'change_pct': 0.0, 'change': 0.0, 'turnover': np.ones(n) * 0.01,
+    })
+
+def parse_klines_loop(klines):
+    """逐行解析K线（旧实现，用于性能对比）"""
+    df_data = []
+    for kline in klines:
+        parts = kline.split(',')
+        if len(parts) >= 11:
+            df_data.append({
+                'date': parts[0],
+                'open': float(parts[1]),
+                'close': float(parts[2]),
+                'high': float(parts[3]),
+                'low': float(parts[4]),
+                'volume': float(parts[5]),
+                'amount': float(parts[6]),
+                'amplitude': float(parts[7]),
+                'change_pct': float(parts[8]),
+                'change': float(parts[9]),
+                'turnover': float(parts[10])
+            })
+    df = pd.DataFrame(df_data)
+    df['date'] = pd.to_datetime(df['date'])
+    return df.sort_values('date').reset_index(drop=True)
+
+def pandas_indicators(df):
+    """逐列调用 pandas 计算技术指标（旧实现，用于校验和性能对比）"""
+    df['ma5'] = df['close'].rolling(window=5).mean()
+    df['ma10'] = df['close'].rolling(window=10).mean()
+    df['ma20'] = df['close'].rolling(window=20).mean()
+    df['ma60'] = df['close'].rolling(window=60).mean()
+    delta = df['close'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    df['rsi'] = 100 - (100 / (1 + gain / loss))
+    df['macd'] = df['close'].ewm(span=12).mean() - df['close'].ewm(span=26).mean()
+    df['macd_signal'] = df['macd'].ewm(span=9).mean()
+    df['macd_hist'] = df['macd'] - df['macd_signal']
+    df['bb_middle'] = df['close'].rolling(window=20).mean()
+    bb_std = df['close'].rolling(window=20).std()
+    df['bb_upper'] = df['bb_middle'] + (bb_std * 2)
+    df['bb_lower'] = df['bb_middle'] - (bb_std * 2)
+    return df
+
+def prepare_windows_loop(scaled_features, target, sequence_length, prediction_days):
+    """逐个复制滑动窗口（旧实现，用于校验和性能对比）"""
+    X, y = [], []
+    for i in range(len(scaled_features) - sequence_length - prediction_days + 1):
+        X.append(scaled_features[i:i + sequence_length])
+        y.append(target[i + sequence_length:i + sequence_length + prediction_days])
+    return np.array(X), np.array(y)
+
+def start_stub_server():
+    """启动本地模拟服务，返回 (server, K线接口地址)，新浪接口地址为 http://host:port/list="""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubKlineHandler)
+    server.requests = []
+    server.fail_next = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/qt/stock/kline/get"
+
 class TestStockAnalysisSystem(unittest.TestCase):
     """测试股票分析系统"""
     
@@ -78,6 +262,774 @@ class TestStockAnalysisSystem(unittest.TestCase):
         print("✅ 技术指标计算测试通过")
         print(f"   添加了 {len(expected_columns)} 个技术指标")
         
+    def test_get_many(self):
+        """测试并发批量获取"""
+        print("🌐 测试并发批量获取...")
+        
+        server, base_url = start_stub_server()
+        try:
+            crawler = StockDataCrawler(use_store=False)
+            crawler.eastmoney_base_url = base_url
+            codes = ['000001', '600000', '300750', '000009']
+            
+            results, errors = crawler.get_many(codes, days=30, max_workers=3)
+            
+            self.assertEqual(set(results), {'000001', '600000', '300750'})
+            self.assertEqual(set(errors), {'000009'})
+            for df in results.values():
+                self.assertEqual(len(df), 31)
+                self.assertTrue(df['date'].is_monotonic_increasing)
+            self.assertEqual(len(server.requests), len(codes))
+            print(f"✅ 批量获取测试通过: 成功 {len(results)} 只, 失败 {len(errors)} 只")
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+    def test_kline_store_incremental(self):
+        """测试本地K线存储与增量更新"""
+        print("💾 测试本地K线存储...")
+        
+        server, base_url = start_stub_server()
+        try:
+            with tempfile.TemporaryDirectory() as data_dir:
+                crawler = StockDataCrawler(data_dir=data_dir)
+                crawler.eastmoney_base_url = base_url
+                
+                first = crawler.crawl_eastmoney_data('600036', days=60)
+                self.assertEqual(crawler.store.get_meta('600036')['rows'], len(first))
+                
+                # 第二次只请求最后两根K线以来的区间
+                second = crawler.crawl_eastmoney_data('600036', days=60)
+                beg = server.requests[-1]['beg'][0]
+                self.assertEqual(beg, first['date'].iloc[-2].strftime('%Y%m%d'))
+                self.assertEqual(len(second), len(first))
+                np.testing.assert_allclose(second['close'].values, first['close'].values)
+                self.assertEqual(crawler.store.get_meta('600036')['rows'], len(first))
+                
+                # 请求更长的区间时整体重新获取
+                longer = crawler.crawl_eastmoney_data('600036', days=90)
+                self.assertEqual(len(longer), 91)
+                self.assertEqual(crawler.store.symbols(), ['600036'])
+                print(f"✅ 本地存储测试通过，共请求 {len(server.requests)} 次")
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+    def test_response_cache(self):
+        """测试HTTP响应缓存"""
+        print("🗄️ 测试HTTP响应缓存...")
+        
+        # LRU淘汰与TTL过期
+        cache = ResponseCache(max_entries=2, ttl=60)
+        cache.set('a', '1')
+        cache.set('b', '2')
+        self.assertEqual(cache.get('a'), '1')
+        cache.set('c', '3')  # 淘汰最久未使用的 b
+        self.assertIsNone(cache.get('b'))
+        cache.set('d', '4', ttl=-1)
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 2)
+        
+        # 缓存键忽略时间戳参数
+        self.assertEqual(ResponseCache.make_key('u', {'b': 1, 'a': 2, '_': 123}),
+                         ResponseCache.make_key('u', {'a': 2, 'b': 1, '_': 456}))
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # SQLite持久化
+            db_path = os.path.join(tmp_dir, 'cache.db')
+            persistent = ResponseCache(sqlite_path=db_path)
+            persistent.set('k', 'v')
+            persistent.close()
+            reopened = ResponseCache(sqlite_path=db_path)
+            self.assertEqual(reopened.get('k'), 'v')
+            reopened.close()
+            
+            # 爬虫重复请求命中缓存
+            server, base_url = start_stub_server()
+            try:
+                crawler = StockDataCrawler(use_store=False)
+                crawler.eastmoney_base_url = base_url
+                crawler.crawl_eastmoney_data('000001', days=10)
+                crawler.crawl_eastmoney_data('000001', days=10)
+                self.assertEqual(len(server.requests), 1)
+                self.assertEqual(crawler.cache.stats()['hits'], 1)
+            finally:
+                server.shutdown()
+                server.server_close()
+        
+        print("✅ HTTP响应缓存测试通过")
+        
+    def test_realtime_quotes_batch(self):
+        """测试新浪批量行情"""
+        print("📡 测试新浪批量行情...")
+        
+        server, base_url = start_stub_server()
+        try:
+            crawler = StockDataCrawler(use_store=False)
+            crawler.sina_base_url = base_url.split('/api/')[0] + '/list='
+            codes = ['000010', '600010', '300010', '000019', '600020']
+            
+            quotes = crawler.get_realtime_quotes(codes, batch_size=2)
+            
+            self.assertEqual(len(server.requests), 3)
+            self.assertEqual(list(quotes['code']), ['000010', '600010', '300010', '600020'])
+            self.assertAlmostEqual(quotes['close'].iloc[0], 10.10)
+            self.assertEqual(crawler.stock_names['600010'], '股票600010')
+            self.assertNotIn('000019', crawler.stock_names)
+            
+            # 单只股票接口复用批量解析
+            self.assertEqual(crawler.get_stock_name('300020'), '股票300020')
+            self.assertEqual(len(crawler.crawl_sina_data('600030')), 1)
+            print(f"✅ 批量行情测试通过，{len(codes)} 只股票共请求 3 次")
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+    def test_retry_and_circuit_breaker(self):
+        """测试重试、限流和熔断"""
+        print("🔁 测试重试、限流和熔断...")
+        
+        # 令牌桶：突发额度用完后按速率放行
+        bucket = TokenBucket(rate=50, burst=2)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertGreater(bucket.acquire(), 0.0)
+        bucket.penalize()
+        self.assertEqual(bucket.rate, 25)
+        
+        # 熔断器：连续失败后打开，冷却后半开放行一次
+        breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+        
+        server, base_url = start_stub_server()
+        try:
+            crawler = StockDataCrawler(use_store=False, cache=False)
+            crawler.eastmoney_base_url = base_url
+            crawler.backoff_base = 0.01
+            
+            # 服务端错误按退避重试后成功
+            server.fail_next = 2
+            df = crawler.crawl_eastmoney_data('000001', days=10)
+            self.assertIsNotNone(df)
+            self.assertEqual(len(server.requests), 3)
+            
+            # 客户端错误（404）不重试，也不计入熔断
+            crawler.max_retries = 0
+            _, breaker = crawler._source_guard('eastmoney')
+            breaker.threshold = 2
+            request_count = len(server.requests)
+            for _ in range(3):
+                with self.assertRaises(ValueError):
+                    crawler._http_get(base_url, params={'secid': '0.000008'})
+            self.assertEqual(len(server.requests), request_count + 3)
+            self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+            
+            # 重试耗尽后计入熔断，熔断期间不再请求
+            server.fail_next = 2
+            self.assertIsNone(crawler.crawl_eastmoney_data('000001', days=10))
+            self.assertIsNone(crawler.crawl_eastmoney_data('000001', days=10))
+            request_count = len(server.requests)
+            with self.assertRaises(SourceUnavailableError):
+                crawler._http_get(base_url, params={'secid': '0.000001'})
+            self.assertEqual(len(server.requests), request_count)
+            print("✅ 重试、限流和熔断测试通过")
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+    def test_resample_klines(self):
+        """测试K线周期合成"""
+        print("🕒 测试K线周期合成...")
+        
+        minute = make_minute_bars(days=2)
+        
+        bars_5 = resample_klines(minute, '5min')
+        self.assertEqual(len(bars_5), 96)
+        self.assertEqual(bars_5['date'].iloc[0], pd.Timestamp('2024-01-02 09:35'))
+        self.assertEqual(bars_5['volume'].iloc[0], 500)
+        self.assertAlmostEqual(bars_5['open'].iloc[0], minute['open'].iloc[0])
+        self.assertAlmostEqual(bars_5['close'].iloc[0], minute['close'].iloc[4])
+        
+        # 60分钟K线跳过午间休市
+        bars_60 = resample_klines(minute, '60min')
+        self.assertEqual([d.strftime('%H:%M') for d in bars_60['date'].iloc[:4]],
+                         ['10:30', '11:30', '14:00', '15:00'])
+        
+        daily = resample_klines(minute, 'daily')
+        self.assertEqual(len(daily), 2)
+        self.assertAlmostEqual(daily['high'].iloc[0], minute['high'].iloc[:240].max())
+        self.assertAlmostEqual(daily['change'].iloc[1], daily['close'].iloc[1] - daily['close'].iloc[0])
+        
+        # 多只股票一次合成，周K线以最后一个交易日为时间戳
+        with tempfile.TemporaryDirectory() as data_dir:
+            crawler = StockDataCrawler(data_dir=data_dir)
+            store = crawler.store_for('daily')
+            days = pd.bdate_range('2024-01-01', periods=20)
+            for code in ['000001', '600000']:
+                store.write(code, pd.DataFrame({'date': days, 'open': 1.0, 'close': np.arange(20.0),
+                                                'high': 2.0, 'low': 0.5, 'volume': 10.0,
+                                                'amount': 100.0, 'turnover': 0.1}), days[0])
+            weekly = crawler.resample_from_store('weekly', source_period='daily')
+            self.assertEqual(set(weekly), {'000001', '600000'})
+            self.assertEqual(len(weekly['000001']), 4)
+            self.assertEqual(weekly['000001']['date'].iloc[0], pd.Timestamp('2024-01-05'))
+            self.assertEqual(weekly['000001']['volume'].iloc[0], 50)
+            
+            with_indicators = crawler.add_technical_indicators(weekly['600000'])
+            self.assertIn('ma5', with_indicators.columns)
+        print("✅ K线周期合成测试通过")
+        
+    def test_stock_universe(self):
+        """测试全市场代码表"""
+        print("🗂️ 测试全市场代码表...")
+        
+        server, base_url = start_stub_server()
+        try:
+            with tempfile.TemporaryDirectory() as data_dir:
+                crawler = StockDataCrawler(data_dir=data_dir)
+                crawler.eastmoney_list_url = base_url.replace('/stock/kline/get', '/clist/get')
+                
+                universe = crawler.refresh_universe()
+                self.assertEqual(len(universe), 250)
+                self.assertEqual(len(server.requests), 3)
+                self.assertEqual(universe.lookup('600005'), ('沪股5', 'sh'))
+                self.assertEqual(crawler.get_stock_code_format('830001'), 'bj830001')
+                self.assertEqual(crawler.get_stock_code_format('000003'), 'sz000003')
+                self.assertEqual(crawler.get_stock_name('000003'), '深股2')
+                
+                # 当天已更新，不再请求网络
+                crawler.refresh_universe()
+                self.assertEqual(len(server.requests), 3)
+                
+                # 新实例直接从本地文件加载
+                visualizer = StockVisualizer(data_dir=data_dir)
+                self.assertEqual(visualizer.get_stock_name_dict()['830009'], '京股9')
+                self.assertEqual(visualizer.get_stock_name_dict()['600519'], '贵州茅台')
+                print(f"✅ 全市场代码表测试通过，共 {len(universe)} 只股票")
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+    def test_tick_streamer(self):
+        """测试实时行情轮询与K线合成"""
+        print("⏱️ 测试实时行情轮询...")
+        
+        class ScriptedCrawler:
+            """按脚本返回行情快照：每次轮询前进20秒，成交量累计增加"""
+            def __init__(self):
+                self.calls = 0
+            
+            def get_realtime_quotes(self, codes, use_cache=True):
+                self.calls += 1
+                stamp = pd.Timestamp('2024-01-02 09:30:00') + pd.Timedelta(seconds=20 * (self.calls // 2))
+                return pd.DataFrame({
+                    'code': codes,
+                    'close': [10.0 + self.calls * 0.1] * len(codes),
+                    'volume': [1000.0 * self.calls] * len(codes),
+                    'amount': [10000.0 * self.calls] * len(codes),
+                    'date': [stamp.strftime('%Y-%m-%d')] * len(codes),
+                    'time': [stamp.strftime('%H:%M:%S')] * len(codes),
+                })
+        
+        streamer = TickStreamer(ScriptedCrawler(), ['000001', '600000'],
+                                poll_interval=0, buffer_size=4, bar_seconds=60)
+        ticks, bars = [], []
+        streamer.subscribe(lambda code, tick: ticks.append((code, tick)), event='tick')
+        
+        async def on_bar(code, bar):
+            bars.append((code, bar))
+        streamer.subscribe(on_bar, event='bar')
+        
+        asyncio.run(streamer.run(max_polls=12))
+        
+        # 奇数次轮询返回重复时间戳的快照，被去重
+        self.assertEqual(len(ticks), 2 * 7)
+        self.assertEqual(len(streamer.buffers['000001']), 4)
+        frame = streamer.get_ticks('000001')
+        self.assertTrue(frame['date'].is_monotonic_increasing)
+        self.assertEqual(len(frame), 4)
+        
+        # 09:30:00-09:31:00 为第一根K线，成交量为相对首笔快照的增量
+        first_bars = [bar for code, bar in bars if code == '000001']
+        self.assertEqual(len(first_bars), 2)
+        self.assertEqual(first_bars[0]['date'], pd.Timestamp('2024-01-02 09:31:00'))
+        self.assertEqual(first_bars[0]['volume'], 3000.0)
+        self.assertAlmostEqual(first_bars[0]['open'], 10.1)
+        print(f"✅ 实时行情测试通过: {len(ticks)} 笔快照, {len(bars)} 根K线")
+        
+    def test_compact_schema(self):
+        """测试紧凑数据类型"""
+        print("🗜️ 测试紧凑数据类型...")
+        
+        crawler = StockDataCrawler(use_store=False)
+        data = crawler.add_technical_indicators(self.test_data.copy())
+        compact = compact_frame(data)
+        
+        self.assertEqual(compact['close'].dtype, np.float32)
+        self.assertEqual(compact['ma20'].dtype, np.float32)
+        self.assertEqual(compact['volume'].dtype, np.int64)
+        self.assertEqual(data['close'].dtype, np.float64)  # 默认不修改原数据
+        np.testing.assert_allclose(compact['close'], data['close'], rtol=1e-6)
+        self.assertLess(memory_per_million_rows(compact), memory_per_million_rows(data) * 0.7)
+        
+        # 紧凑数据仍可计算指标和准备训练数据
+        recomputed = crawler.add_technical_indicators(compact_frame(self.test_data))
+        np.testing.assert_allclose(recomputed['ma5'].dropna(), data['ma5'].dropna(), rtol=1e-5)
+        
+        panel = concat_symbols({'000001': data, '600000': data.head(50)})
+        self.assertEqual(panel['symbol'].dtype.name, 'category')
+        self.assertEqual(len(panel), len(data) + 50)
+        self.assertEqual(list(panel['symbol'].cat.categories), ['000001', '600000'])
+        print(f"✅ 紧凑数据类型测试通过: 每百万行 {memory_per_million_rows(data):.0f}MB -> "
+              f"{memory_per_million_rows(compact):.0f}MB")
+        
+    def test_parse_klines(self):
+        """测试K线批量解析"""
+        print("🧾 测试K线批量解析...")
+        
+        klines = make_klines(500)
+        klines.insert(10, '2015-01-01 00:00,1.0,2.0')  # 字段不足的脏数据
+        
+        expected = parse_klines_loop(klines)
+        parsed = StockDataCrawler.parse_klines(klines)
+        
+        self.assertEqual(list(parsed.columns), list(expected.columns))
+        self.assertEqual(len(parsed), 500)
+        pd.testing.assert_frame_equal(parsed, expected)
+        self.assertEqual(len(StockDataCrawler.parse_klines([])), 0)
+        
+        # 停牌或新股当天换手率等字段为 '-'：保留这根K线，按0处理
+        suspended = klines[:5] + ['2016-06-01 09:30,10.0,10.0,10.0,10.0,0,0.0,-,-,-,-']
+        parsed = StockDataCrawler.parse_klines(suspended)
+        self.assertEqual(len(parsed), 6)
+        self.assertEqual(parsed['close'].iloc[-1], 10.0)
+        self.assertEqual(parsed[['amplitude', 'change_pct', 'change', 'turnover']].iloc[-1].tolist(), [0.0] * 4)
+        print("✅ K线批量解析测试通过")
+        
+    def test_panel_indicators(self):
+        """测试多股票面板指标计算"""
+        print("🧮 测试面板指标计算...")
+        
+        crawler = StockDataCrawler(use_store=False)
+        frames = {
+            '000001': self.test_data.copy(),
+            '600036': self.test_data.tail(80).reset_index(drop=True).copy(),  # 长度不同，面板前部补齐
+            '300750': self.test_data.head(10).copy(),                          # 不足一个窗口
+        }
+        frames['600036']['close'] *= 3.5
+        
+        expected = {code: crawler.add_technical_indicators(df.copy()) for code, df in frames.items()}
+        result = crawler.add_technical_indicators_panel({code: df.copy() for code, df in frames.items()})
+        
+        self.assertEqual(set(result), set(frames))
+        for code, df in result.items():
+            self.assertEqual(list(df.columns), list(expected[code].columns))
+            for col in ['ma5', 'ma10', 'ma20', 'ma60', 'rsi', 'macd', 'macd_signal', 'macd_hist',
+                        'bb_middle', 'bb_upper', 'bb_lower']:
+                np.testing.assert_allclose(df[col].values, expected[code][col].values,
+                                           rtol=1e-8, atol=1e-8, equal_nan=True, err_msg=f"{code} {col}")
+        print(f"✅ 面板指标计算测试通过: {len(result)} 只股票")
+        
+    def test_incremental_indicators(self):
+        """测试增量指标更新"""
+        print("➕ 测试增量指标更新...")
+        
+        crawler = StockDataCrawler(use_store=False)
+        expected = crawler.add_technical_indicators(self.test_data.copy())
+        columns = ['ma5', 'ma10', 'ma20', 'ma60', 'rsi', 'macd', 'macd_signal', 'macd_hist',
+                   'bb_middle', 'bb_upper', 'bb_lower']
+        
+        # 用前100根K线初始化，再逐根更新剩余K线
+        state = IndicatorState.from_history(self.test_data.head(100))
+        np.testing.assert_allclose([state.values[col] for col in columns],
+                                   expected.loc[99, columns].values.astype(float), rtol=1e-9)
+        
+        updates = [state.update(close) for close in self.test_data['close'].iloc[100:]]
+        actual = pd.DataFrame(updates)[columns].values
+        np.testing.assert_allclose(actual, expected[columns].iloc[100:].values, rtol=1e-9, atol=1e-9)
+        self.assertEqual(state.count, len(self.test_data))
+        
+        # 窗口未满时为 NaN，与批量计算一致
+        fresh = IndicatorState()
+        first = fresh.seed(self.test_data['close'].head(10).values)
+        self.assertFalse(np.isnan(first['ma5']))
+        self.assertTrue(np.isnan(first['ma20']))
+        self.assertTrue(np.isnan(first['bb_upper']))
+        print(f"✅ 增量指标更新测试通过: {len(updates)} 根K线")
+        
+    def test_indicator_registry(self):
+        """测试配置驱动的指标注册表"""
+        print("🗂️ 测试指标注册表...")
+        
+        crawler = StockDataCrawler(use_store=False)
+        expected = pandas_indicators(self.test_data.copy())
+        data = crawler.add_technical_indicators(self.test_data.copy())
+        self.assertEqual(list(data.columns), list(expected.columns))
+        np.testing.assert_allclose(data.iloc[:, 7:].values.astype(float), expected.iloc[:, 7:].values.astype(float),
+                                   rtol=1e-9, atol=1e-9)
+        
+        # 20日均值由 ma20 和布林带中轨共享，只计算一次
+        plan = IndicatorPlan()
+        keys = [node.key for node in plan.nodes]
+        self.assertEqual(len(keys), len(set(keys)))
+        self.assertEqual(dict(plan.outputs)['ma20'], dict(plan.outputs)['bb_middle'])
+        self.assertEqual(plan.lookback()['ma60'], 60)
+        self.assertEqual(plan.lookback()['rsi'], 14)
+        
+        # 修改配置即可改变周期，无需改代码
+        custom = crawler.add_technical_indicators(
+            self.test_data.copy(), config={'ma_periods': [3, 7], 'bb_period': 10, 'indicators': ['ma', 'bollinger']})
+        self.assertEqual(list(custom.columns[-5:]), ['ma3', 'ma7', 'bb_middle', 'bb_upper', 'bb_lower'])
+        np.testing.assert_allclose(custom['ma7'].values, self.test_data['close'].rolling(7).mean().values, equal_nan=True)
+        np.testing.assert_allclose(custom['bb_middle'].values, self.test_data['close'].rolling(10).mean().values,
+                                   equal_nan=True)
+        
+        # 注册新指标
+        @register_indicator('momentum')
+        def build_momentum(config):
+            node = IndicatorNode('momentum_10', lambda close, ma: close - ma, ('close', 'mean_10(close)'))
+            return [node], [('momentum', node.key)]
+        try:
+            result = IndicatorPlan({'ma_periods': [10], 'indicators': ['ma', 'momentum']}).compute(self.test_data['close'])
+            np.testing.assert_allclose(result['momentum'], self.test_data['close'] - result['ma10'], equal_nan=True)
+        finally:
+            INDICATOR_REGISTRY.pop('momentum')
+        with self.assertRaises(ValueError):
+            IndicatorPlan({'indicators': ['unknown']})
+        
+        # 路径依赖指标（Wilder RSI、抛物线SAR）可通过配置选用，由 indicator_kernels 计算
+        optional = crawler.add_technical_indicators(self.test_data.copy(), config={'indicators': ['wilder_rsi', 'sar']})
+        self.assertEqual(list(optional.columns[-2:]), ['rsi_wilder', 'sar'])
+        np.testing.assert_allclose(optional['rsi_wilder'], indicator_kernels.wilder_rsi(self.test_data['close']),
+                                   equal_nan=True)
+        np.testing.assert_allclose(optional['sar'], indicator_kernels.parabolic_sar(self.test_data['high'],
+                                                                                    self.test_data['low']), equal_nan=True)
+        lookback = IndicatorPlan({'indicators': ['wilder_rsi', 'sar']}).lookback()
+        self.assertEqual(lookback['rsi_wilder'], 15)
+        self.assertEqual(int(np.flatnonzero(~np.isnan(optional['rsi_wilder'].values))[0]), lookback['rsi_wilder'] - 1)
+        self.assertEqual(int(np.flatnonzero(~np.isnan(optional['sar'].values))[0]), lookback['sar'] - 1)
+        self.assertEqual(compact_frame(optional)['sar'].dtype, np.float32)
+        print(f"✅ 指标注册表测试通过: {len(plan.nodes)} 个计算节点, {len(plan.outputs)} 个输出列")
+        
+    def test_indicator_kernels(self):
+        """测试路径依赖指标内核"""
+        print("🧵 测试路径依赖指标内核...")
+        
+        rng = np.random.default_rng(7)
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (120, 5)), axis=0))
+        high = close * (1 + np.abs(rng.normal(0, 0.01, close.shape)))
+        low = close * (1 - np.abs(rng.normal(0, 0.01, close.shape)))
+        for j, padding in enumerate([0, 3, 30, 119, 120]):  # 上市时间不同，最后一只全为 NaN
+            close[:padding, j] = high[:padding, j] = low[:padding, j] = np.nan
+        first = indicator_kernels._first_valid(close)
+        highest = pd.DataFrame(high).rolling(9, min_periods=1).max().values
+        lowest = pd.DataFrame(low).rolling(9, min_periods=1).min().values
+        kdj_rsv = np.where(highest == lowest, 50.0, (close - lowest) / (highest - lowest) * 100)
+        
+        def reference(loop, *args, outputs=1):
+            """直接以 Python 执行逐元素循环作为参照"""
+            outs = [np.empty_like(close) for _ in range(outputs)]
+            loop(*args, first, *outs)
+            return outs
+        
+        cases = [
+            (lambda **kw: [indicator_kernels.wilder_rsi(close, 14, **kw)],
+             reference(indicator_kernels._wilder_rsi_loop, close, 14)),
+            (lambda **kw: [indicator_kernels.atr(high, low, close, 14, **kw)],
+             reference(indicator_kernels._atr_loop, high, low, close, 14)),
+            (lambda **kw: list(indicator_kernels.kdj(high, low, close, **kw)),
+             reference(indicator_kernels._kdj_loop, kdj_rsv, 3, 3, outputs=3)),
+            (lambda **kw: [indicator_kernels.parabolic_sar(high, low, **kw)],
+             reference(indicator_kernels._sar_loop, high, low, 0.02, 0.2)),
+        ]
+        backends = [False, True] if indicator_kernels.NUMBA_AVAILABLE else [False]
+        for compute, expected in cases:
+            for use_numba in backends:
+                for actual, target in zip(compute(use_numba=use_numba), expected):
+                    np.testing.assert_allclose(actual, target, rtol=1e-10, equal_nan=True)
+        
+        # EMA/MACD 与 pandas 一致，一维输入返回一维结果
+        series = pd.Series(close[:, 2])
+        for use_numba in backends:
+            line, signal, hist = indicator_kernels.macd(series.values, use_numba=use_numba)
+            expected_line = series.ewm(span=12).mean() - series.ewm(span=26).mean()
+            np.testing.assert_allclose(line, expected_line, rtol=1e-10, equal_nan=True)
+            np.testing.assert_allclose(signal, expected_line.ewm(span=9).mean(), rtol=1e-10, equal_nan=True)
+        
+        # Wilder RSI：前14个涨跌幅取简单均值，之后递推平滑
+        delta = np.diff(close[:, 0])
+        gain, loss = np.maximum(delta, 0)[:14].mean(), np.maximum(-delta, 0)[:14].mean()
+        self.assertAlmostEqual(indicator_kernels.wilder_rsi(close[:, 0])[14], 100 - 100 / (1 + gain / loss))
+        
+        # 单调队列滚动极值与 pandas 一致
+        for use_numba in backends:
+            for window, min_periods in [(9, None), (9, 1), (200, 3)]:
+                rolling = pd.DataFrame(high).rolling(window, min_periods=min_periods or window)
+                np.testing.assert_array_equal(
+                    indicator_kernels.rolling_extreme(high, window, True, min_periods, use_numba=use_numba),
+                    rolling.max().values)
+                np.testing.assert_array_equal(
+                    indicator_kernels.rolling_extreme(high, window, False, min_periods, use_numba=use_numba),
+                    rolling.min().values)
+        
+        self.assertTrue(np.isnan(indicator_kernels.parabolic_sar(high, low)[:, 4]).all())
+        
+        # 默认只有大面板才使用 JIT 内核，单只股票的小数据不必加载编译结果
+        self.assertFalse(indicator_kernels._use_numba(None, indicator_kernels.NUMBA_MIN_SIZE - 1))
+        self.assertEqual(indicator_kernels._use_numba(None, indicator_kernels.NUMBA_MIN_SIZE),
+                         indicator_kernels.NUMBA_AVAILABLE)
+        backend = 'numba' if indicator_kernels.NUMBA_AVAILABLE else 'NumPy'
+        print(f"✅ 路径依赖指标内核测试通过 (当前后端: {backend})")
+        
+    def test_extended_indicators(self):
+        """测试扩展技术指标特征"""
+        print("🧰 测试扩展技术指标...")
+        
+        crawler = StockDataCrawler(use_store=False)
+        data = crawler.add_technical_indicators(self.test_data.copy(), extended=True)
+        high, low, close, volume = data['high'], data['low'], data['close'], data['volume']
+        
+        # 与逐个指标的 pandas 写法对照
+        tp = (high + low + close) / 3
+        mad = tp.rolling(14).apply(lambda x: np.abs(x - x.mean()).mean(), raw=True)
+        highest, lowest = high.rolling(14).max(), low.rolling(14).min()
+        expected = {
+            'obv': (np.sign(close.diff()).fillna(0) * volume).cumsum(),
+            'cci': (tp - tp.rolling(14).mean()) / (0.015 * mad),
+            'wr': (highest - close) / (highest - lowest) * -100,
+            'vwap': (tp * volume).rolling(20).sum() / volume.rolling(20).sum(),
+            'close_zscore': (close - close.rolling(20).mean()) / close.rolling(20).std(),
+            'volume_zscore': (volume - volume.rolling(20).mean()) / volume.rolling(20).std(),
+        }
+        for col, values in expected.items():
+            np.testing.assert_allclose(data[col], values, rtol=1e-7, equal_nan=True, err_msg=col)
+        true_range = pd.concat([high - low, (high - close.shift()).abs(), (low - close.shift()).abs()], axis=1).max(axis=1)
+        self.assertAlmostEqual(data['atr'].iloc[13], true_range.iloc[:14].mean())
+        self.assertTrue(data['kdj_k'].between(0, 100).all())
+        np.testing.assert_allclose(data['kdj_j'], 3 * data['kdj_k'] - 2 * data['kdj_d'])
+        
+        # 相同窗口只计算一次：布林带和收盘价 Z 分数共用20日均值与标准差
+        plan = IndicatorPlan(extended=True)
+        keys = [node.key for node in plan.nodes]
+        self.assertEqual(keys.count('mean_20(close)'), 1)
+        self.assertEqual(keys.count('std_20(close)'), 1)
+        self.assertEqual(keys.count('typical_price'), 1)
+        
+        # 面板计算与逐只一致
+        frames = {'000001': self.test_data.copy(), '600036': self.test_data.tail(60).reset_index(drop=True)}
+        panel = crawler.add_technical_indicators_panel(frames, extended=True)
+        single = crawler.add_technical_indicators(frames['600036'].copy(), extended=True)
+        pd.testing.assert_frame_equal(panel['600036'], single)
+        
+        # 紧凑类型下扩展指标列同样为 float32
+        compact = compact_frame(data)
+        for col in extended_feature_columns():
+            self.assertEqual(compact[col].dtype, np.float32, col)
+        
+        # 作为模型的扩展特征
+        predictor = StockPredictor(input_features=len(get_feature_columns(True)), sequence_length=30,
+                                   prediction_days=7, extended_features=True)
+        X, y = predictor.prepare_data(data)
+        self.assertEqual(X.shape[2], 14 + len(extended_feature_columns()))
+        self.assertFalse(torch.isnan(X).any())
+        print(f"✅ 扩展技术指标测试通过: {len(extended_feature_columns())} 个扩展特征")
+        
+    def test_prepare_data_windows(self):
+        """测试滑动窗口数据准备"""
+        print("🪟 测试滑动窗口数据准备...")
+        
+        crawler = StockDataCrawler(use_store=False)
+        data = crawler.add_technical_indicators(self.test_data.copy())
+        predictor = StockPredictor(input_features=14, sequence_length=30, prediction_days=7)
+        X, y = predictor.prepare_data(data)
+        
+        # 与逐个复制窗口的旧实现结果相同
+        scaled = predictor.feature_transform.transform(data[predictor.feature_columns].fillna(method='bfill').fillna(method='ffill'))
+        X_loop, y_loop = prepare_windows_loop(scaled, data['close'].values, 30, 7)
+        y_loop = predictor.feature_transform.transform_target(y_loop)
+        self.assertTrue(torch.equal(X, torch.FloatTensor(X_loop)))
+        self.assertTrue(torch.equal(y, torch.FloatTensor(y_loop)))
+        self.assertAlmostEqual(float(y.min()), 0.0)
+        self.assertAlmostEqual(float(y.max()), 1.0)
+        
+        # 样本共享同一块内存：底层只有一份 (序列长度 x 特征) 数组
+        self.assertLessEqual(X.untyped_storage().nbytes(), len(data) * 14 * 4)
+        self.assertEqual(X[1].data_ptr() - X[0].data_ptr(), 14 * 4)
+        
+        # 历史不足一个样本时返回空数据
+        X_short, y_short = predictor.prepare_data(data.head(30))
+        self.assertEqual(X_short.shape, (0, 30, 14))
+        self.assertEqual(y_short.shape, (0, 7))
+        print(f"✅ 滑动窗口数据准备测试通过: {X.shape[0]} 个样本")
+
+    def test_feature_transform(self):
+        """测试特征归一化变换的拟合、保存与复用"""
+        print("📐 测试特征归一化变换...")
+
+        from sklearn.preprocessing import MinMaxScaler
+        crawler = StockDataCrawler(use_store=False)
+        data = crawler.add_technical_indicators(self.test_data.copy())
+        columns = get_feature_columns()
+        features = data[columns].fillna(method='bfill').fillna(method='ffill')
+        features['ma60'] = 1.0  # 常数列
+
+        # 与 MinMaxScaler 的结果逐位相同
+        transform = FeatureTransform.fit(features, data['close'].values[30:], columns)
+        scaler = MinMaxScaler().fit(features)
+        target_scaler = MinMaxScaler().fit(data[['close']].values[30:])
+        self.assertTrue(np.array_equal(transform.transform(features), scaler.transform(features)))
+        self.assertTrue(np.array_equal(transform.transform_target(data['close'].values),
+                                       target_scaler.transform(data[['close']].values).ravel()))
+        np.testing.assert_allclose(transform.inverse_target(transform.transform_target(data['close'].values)),
+                                   data['close'].values, rtol=1e-12)
+        legacy = FeatureTransform.from_min_max_scaler(scaler, target_scaler, columns)
+        self.assertTrue(np.array_equal(legacy.transform(features), transform.transform(features)))
+
+        # 三维窗口按最后一维广播
+        windows = np.stack([features.values[:30], features.values[30:60]])
+        self.assertTrue(np.array_equal(transform.transform(windows)[1], transform.transform(features.values[30:60])))
+
+        # 序列化只含普通类型，版本不符时拒绝加载
+        state = transform.to_dict()
+        self.assertEqual(state['version'], FEATURE_TRANSFORM_VERSION)
+        self.assertEqual(json.loads(json.dumps(state)), state)
+        restored = FeatureTransform.from_dict(state)
+        self.assertTrue(np.array_equal(restored.transform(features), transform.transform(features)))
+        with self.assertRaises(ValueError):
+            FeatureTransform.from_dict(dict(state, version=FEATURE_TRANSFORM_VERSION + 1))
+
+        # 模型保存后加载，批量预测使用同一份归一化参数
+        torch.manual_seed(0)
+        predictor = StockPredictor(input_features=14, sequence_length=30, prediction_days=7,
+                                   hidden_dim=32, num_layers=1, num_heads=4)
+        predictor.prepare_data(data)
+        expected = predictor.predict_batch([data])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'model.pth')
+            predictor.save_model(path)
+            loaded = StockPredictor(input_features=14, sequence_length=30, prediction_days=7,
+                                    hidden_dim=32, num_layers=1, num_heads=4)
+            with self.assertRaises(ValueError):
+                loaded.predict_batch([data])
+            loaded.load_model(path)
+        self.assertEqual(loaded.feature_transform.to_dict(), predictor.feature_transform.to_dict())
+        np.testing.assert_allclose(loaded.predict_batch([data]), expected, rtol=1e-6)
+
+        # 旧版模型文件（保存 sklearn MinMaxScaler）通过 load_model 加载
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'legacy.pth')
+            torch.save({
+                'model_state_dict': predictor.model.state_dict(),
+                'optimizer_state_dict': predictor.optimizer.state_dict(),
+                'scaler': scaler,
+                'target_scaler': target_scaler,
+                'sequence_length': 30,
+                'prediction_days': 7,
+            }, path)
+            legacy_predictor = StockPredictor(input_features=14, sequence_length=30, prediction_days=7,
+                                              hidden_dim=32, num_layers=1, num_heads=4)
+            legacy_predictor.load_model(path)
+
+            # 其他任意对象仍然拒绝反序列化
+            unsafe_path = os.path.join(tmp_dir, 'unsafe.pth')
+            torch.save({'model_state_dict': predictor.model.state_dict(), 'payload': datetime.now()}, unsafe_path)
+            with self.assertRaises(pickle.UnpicklingError):
+                legacy_predictor.load_model(unsafe_path)
+        self.assertEqual(legacy_predictor.feature_transform.to_dict(), legacy.to_dict())
+        legacy_predictions = legacy_predictor.predict_batch([data])
+        self.assertEqual(legacy_predictions.shape, (1, 7))
+        self.assertTrue(np.isfinite(legacy_predictions).all())
+        print("✅ 特征归一化变换测试通过")
+
+    def test_pooled_dataset(self):
+        """测试多只股票联合训练集"""
+        print("📦 测试多只股票联合训练集...")
+
+        crawler = StockDataCrawler(use_store=False)
+        frames = {}
+        for i, symbol in enumerate(['000001', '000002', '600000']):
+            df = self.test_data.copy()
+            df[['open', 'high', 'low', 'close']] *= 1 + i
+            frames[symbol] = df.iloc[i * 10:].reset_index(drop=True)
+        frames['000003'] = self.test_data.head(20).copy()  # 历史不足，应被跳过
+        frames = crawler.add_technical_indicators_panel(frames)
+
+        columns = get_feature_columns()
+        dataset = PooledWindowDataset(frames, columns, sequence_length=30, prediction_days=7)
+        self.assertEqual(dataset.symbols, ['000001', '000002', '600000'])
+        self.assertEqual(len(dataset), sum(len(frames[s]) - 36 for s in dataset.symbols))
+
+        # 每个窗口等于该股票按自身参数归一化后的连续切片
+        df = frames['000002']
+        values = df[columns].fillna(method='bfill').fillna(method='ffill').to_numpy(dtype=np.float64)
+        scaled = dataset.normalize('000002', values)
+        target = df['close'].to_numpy()
+        first = int(np.flatnonzero(dataset.symbol_ids.numpy() == 1)[0])
+        X, y, ids = dataset[[first, first + 5]]
+        np.testing.assert_allclose(X[1].numpy(), scaled[5:35], rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(dataset.inverse_target('000002', y[1].numpy()), target[35:42], rtol=1e-5)
+        self.assertEqual(ids.tolist(), [1, 1])
+
+        # 验证集为每只股票时间上靠后的样本
+        train_idx, val_idx = dataset.split(0.2)
+        self.assertEqual(len(train_idx) + len(val_idx), len(dataset))
+        for symbol_id in range(len(dataset.symbols)):
+            train_starts = dataset.starts[train_idx][dataset.symbol_ids[train_idx] == symbol_id]
+            val_starts = dataset.starts[val_idx][dataset.symbol_ids[val_idx] == symbol_id]
+            self.assertLess(int(train_starts.max()), int(val_starts.min()))
+
+        # 每个批次一次取出 (X, y, symbol_ids)
+        loader = dataset.make_loader(train_idx, batch_size=16)
+        batch_X, batch_y, batch_ids = next(iter(loader))
+        self.assertEqual(batch_X.shape, (16, 30, 14))
+        self.assertEqual(batch_y.shape, (16, 7))
+        self.assertEqual(batch_ids.shape, (16,))
+        self.assertEqual(len(loader), -(-len(train_idx) // 16))
+
+        # 从本地K线存储构造；未启用本地存储时给出明确的错误
+        with self.assertRaises(ValueError):
+            PooledWindowDataset.from_store(StockDataCrawler(use_store=False), columns, sequence_length=30)
+        with tempfile.TemporaryDirectory() as data_dir:
+            store_crawler = StockDataCrawler(data_dir=data_dir)
+            for symbol in ['000001', '600000']:
+                store_crawler.store_for('daily').write(symbol, self.test_data, self.test_data['date'].iloc[0])
+            stored = PooledWindowDataset.from_store(store_crawler, columns, sequence_length=30, prediction_days=7)
+        self.assertEqual(sorted(stored.symbols), ['000001', '600000'])
+        self.assertEqual(len(stored), 2 * (len(self.test_data) - 36))
+
+        # 带股票嵌入的模型联合训练与预测
+        predictor = StockPredictor(input_features=14, sequence_length=30, prediction_days=7,
+                                   num_symbols=len(dataset.symbols))
+        with self.assertRaises(ValueError):
+            StockPredictor(input_features=14, sequence_length=30).train_pooled(dataset)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            predictor.checkpoint_path = os.path.join(tmp_dir, 'best_model.pth')
+            best_val_loss = predictor.train_pooled(dataset, epochs=2, batch_size=32)
+            self.assertTrue(os.path.exists(predictor.checkpoint_path))
+        self.assertTrue(np.isfinite(best_val_loss))
+        self.assertEqual(len(predictor.history), 2)
+        self.assertEqual(predictor.feature_columns, dataset.feature_columns)
+        self.assertEqual(predictor.symbol_index, dataset.symbol_index)
+        self.assertEqual(set(predictor.symbol_transforms), set(dataset.symbols))
+        self.assertIsNone(predictor.feature_transform)
+        print("✅ 联合训练流程测试通过")
+
+        predictions = predictor.predict_symbol(frames['600000'], '600000')
+        self.assertEqual(predictions.shape, (1, 7))
+        self.assertTrue(np.isfinite(predictions).all())
+        with self.assertRaises(ValueError):
+            predictor.predict_symbol(frames['000003'], '000003')
+        print(f"✅ 联合训练集测试通过: {len(dataset.symbols)} 只股票, {len(dataset)} 个样本")
+
     def test_rcsan_model(self):
         """测试R-CSAN模型"""
         print("🧠 测试R-CSAN模型...")
@@ -105,6 +1057,74 @@ class TestStockAnalysisSystem(unittest.TestCase):
         param_count = sum(p.numel() for p in model.parameters())
         print(f"   模型参数数量: {param_count:,}")
         
+    def test_rcsan_architectures(self):
+        """测试可配置的R-CSAN结构与消融对比"""
+        print("🧩 测试R-CSAN结构配置...")
+
+        # 默认为完整结构，预设可以再覆盖单个分支
+        self.assertEqual(resolve_architecture(num_layers=3)['transformer_layers'], 3)
+        lite = resolve_architecture({'base': 'lite', 'lstm_layers': 0})
+        self.assertEqual(lite['lstm_layers'], 0)
+        self.assertFalse(lite['attention_fusion'])
+        with self.assertRaises(ValueError):
+            resolve_architecture('unknown')
+        with self.assertRaises(ValueError):
+            resolve_architecture({'lstm': 1})
+
+        test_input = torch.randn(4, 30, 10)
+        full = RCSAN(input_features=10, sequence_length=30, hidden_dim=32, num_heads=4).eval()
+        full_profile = profile_rcsan(full, repeats=2)
+        for name in ARCHITECTURE_CONFIG:
+            model = RCSAN(input_features=10, sequence_length=30, hidden_dim=32, num_heads=4, architecture=name).eval()
+            with torch.no_grad():
+                self.assertEqual(model(test_input).shape, (4, 7))
+            profile = profile_rcsan(model, repeats=2)
+            self.assertGreater(profile['flops'], 0)
+            if name != 'full':
+                self.assertLess(profile['params'], full_profile['params'])
+                self.assertLess(profile['flops'], full_profile['flops'])
+        transformer_only = RCSAN(input_features=10, sequence_length=30, architecture='transformer_only')
+        self.assertIsNone(transformer_only.lstm)
+        self.assertEqual(len(transformer_only.conv_layers), 0)
+
+        # 注意力融合只查询最后一步，与对整个序列做自注意力后取最后一步相同
+        with torch.no_grad():
+            x = torch.randn(4, 30, 64)
+            fused, _ = full.attention_fusion(x[:, -1:, :], x, x)
+            reference, _ = full.attention_fusion(x, x, x)
+        np.testing.assert_allclose(fused[:, -1].numpy(), reference[:, -1].numpy(), atol=1e-5)
+
+        crawler = StockDataCrawler(use_store=False)
+        data = crawler.add_technical_indicators(self.test_data.copy())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results_path = os.path.join(tmp_dir, 'ablation_results.csv')
+            table = run_ablation(data, ['full', 'conv_lstm'], epochs=1, batch_size=16, results_path=results_path,
+                                 checkpoint_dir=tmp_dir, hidden_dim=16, num_layers=1, num_heads=2, sequence_length=30)
+            self.assertEqual(table['architecture'].tolist(), ['full', 'conv_lstm'])
+            self.assertEqual(table['status'].tolist(), ['completed', 'completed'])
+            self.assertTrue((table['params'] > 0).all() and (table['latency'] > 0).all())
+            self.assertTrue(os.path.exists(results_path))
+
+            # 模型文件记录结构和超参数，用相同参数创建的预测器可以加载，结构不同时给出明确的错误
+            model_kwargs = dict(input_features=14, sequence_length=30, hidden_dim=16, num_heads=2)
+            saved = StockPredictor(architecture={'base': 'lite', 'lstm_layers': 0}, **model_kwargs)
+            model_path = os.path.join(tmp_dir, 'lite.pth')
+            saved.save_model(model_path)
+            loaded = StockPredictor(architecture={'base': 'lite', 'lstm_layers': 0}, **model_kwargs)
+            loaded.load_model(model_path)
+            self.assertEqual(loaded.model.config(), saved.model.config())
+            saved.model.eval()
+            loaded.model.eval()
+            window = torch.randn(2, 30, 14)
+            with torch.no_grad():
+                np.testing.assert_allclose(loaded.model(window).numpy(), saved.model(window).numpy())
+            with self.assertRaisesRegex(ValueError, 'lstm_layers'):
+                StockPredictor(architecture='full', **model_kwargs).load_model(model_path)
+            with self.assertRaisesRegex(ValueError, 'hidden_dim'):
+                StockPredictor(architecture={'base': 'lite', 'lstm_layers': 0},
+                               **dict(model_kwargs, hidden_dim=32)).load_model(model_path)
+        print(f"✅ 结构配置测试通过: 完整结构 {full_profile['params']:,} 个参数, {full_profile['flops'] / 1e6:.1f} MFLOPs")
+
     def test_stock_predictor(self):
         """测试股票预测器"""
         print("🔮 测试股票预测器...")
@@ -132,7 +1152,9 @@ class TestStockAnalysisSystem(unittest.TestCase):
         # 测试小规模训练
         print("   进行小规模训练测试...")
         try:
-            predictor.train((X, y), epochs=5, batch_size=4)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                predictor.checkpoint_path = os.path.join(tmp_dir, 'best_model.pth')
+                predictor.train((X, y), epochs=5, batch_size=4)
             print("✅ 训练流程测试通过")
         except Exception as e:
             print(f"⚠️ 训练测试警告: {str(e)}")
@@ -144,6 +1166,289 @@ class TestStockAnalysisSystem(unittest.TestCase):
         self.assertEqual(len(predictions[0]), 7)
         print(f"✅ 预测功能测试通过，预测结果: {predictions[0]}")
         
+    def test_batch_inference(self):
+        """测试批量预测"""
+        print("📦 测试批量预测...")
+
+        torch.manual_seed(0)
+        crawler = StockDataCrawler(use_store=False)
+        data = crawler.add_technical_indicators(self.test_data.copy())
+        predictor = StockPredictor(input_features=14, sequence_length=30, prediction_days=7,
+                                   hidden_dim=32, num_layers=1, num_heads=4)
+        predictor.prepare_data(data)
+
+        # 不同截止日期的窗口一次预测，与逐个窗口调用 predict 的结果一致
+        frames = [data.iloc[:end] for end in range(60, 150, 10)]
+        batched = predictor.predict_batch(frames, batch_size=4)
+        self.assertEqual(batched.shape, (len(frames), 7))
+        for frame, row in zip(frames, batched):
+            window = frame[predictor.feature_columns].tail(30).fillna(method='bfill').fillna(method='ffill')
+            expected = predictor.predict(predictor.feature_transform.transform(window))
+            np.testing.assert_allclose(row, expected[0], rtol=1e-5)
+
+        # 原始特征数组与 DataFrame 输入结果相同
+        raw = np.stack([f[predictor.feature_columns].tail(30).fillna(method='bfill').fillna(method='ffill').to_numpy()
+                        for f in frames])
+        np.testing.assert_allclose(predictor.predict_batch(raw), batched, rtol=1e-6)
+        with self.assertRaises(ValueError):
+            predictor.predict_batch(raw[:, :20])
+
+        # 联合训练的模型按股票使用各自的归一化参数
+        frames = {'000001': data, '600000': data.assign(close=data['close'] * 2, open=data['open'] * 2)}
+        dataset = PooledWindowDataset(frames, predictor.feature_columns, sequence_length=30, prediction_days=7)
+        pooled = StockPredictor(input_features=14, sequence_length=30, prediction_days=7, num_symbols=2,
+                                hidden_dim=32, num_layers=1, num_heads=4)
+        pooled.symbol_index = dict(dataset.symbol_index)
+        pooled.symbol_transforms = dict(dataset.transforms)
+        results = pooled.predict_batch(frames)
+        self.assertEqual(list(results), ['000001', '600000'])
+        for symbol, frame in frames.items():
+            window = frame[pooled.feature_columns].tail(30).fillna(method='bfill').fillna(method='ffill').to_numpy()
+            with torch.no_grad():
+                output = pooled.model(torch.FloatTensor(dataset.normalize(symbol, window)).unsqueeze(0),
+                                      torch.tensor([dataset.symbol_index[symbol]])).numpy()
+            np.testing.assert_allclose(results[symbol], dataset.inverse_target(symbol, output[0]), rtol=1e-5)
+        with self.assertRaises(ValueError):
+            pooled.predict_batch([data])
+        with self.assertRaises(ValueError):
+            pooled.predict_batch({'000002': data})
+        print("✅ 批量预测测试通过")
+
+    def test_onnx_backend(self):
+        """测试 ONNX 导出与 ONNX Runtime 推理后端"""
+        print("📤 测试ONNX推理后端...")
+
+        if not ONNX_AVAILABLE:
+            print("⚠️ 未安装 onnxruntime，跳过ONNX测试")
+            return
+
+        torch.manual_seed(0)
+        crawler = StockDataCrawler(use_store=False)
+        data = crawler.add_technical_indicators(self.test_data.copy())
+        predictor = StockPredictor(input_features=14, sequence_length=30, prediction_days=7,
+                                   hidden_dim=32, num_layers=2, num_heads=4)
+        X, _ = predictor.prepare_data(data)
+        frames = [data.iloc[:end] for end in range(60, 150, 7)]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'rcsan.onnx')
+            metadata_path = predictor.export_onnx(path)
+            self.assertTrue(os.path.exists(path))
+            self.assertTrue(os.path.exists(metadata_path))
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f)['model_config'], predictor.model.config())
+            backend = OnnxPredictor(path)
+
+            # 与 PyTorch 结果一致（包括 Transformer 编码器、LSTM 和多头注意力融合），批次大小可变
+            np.testing.assert_allclose(backend.predict_batch(frames, batch_size=5),
+                                       predictor.predict_batch(frames), rtol=1e-4, atol=1e-5)
+            np.testing.assert_allclose(backend.predict(X[:3]), predictor.predict(X[:3]), rtol=1e-4, atol=1e-5)
+            self.assertEqual(backend.predict(X[0].numpy()).shape, (1, 7))
+
+            # 联合训练的模型导出时带 symbol_ids 输入
+            pooled_frames = {'000001': data, '600000': data.assign(close=data['close'] * 2)}
+            dataset = PooledWindowDataset(pooled_frames, predictor.feature_columns, sequence_length=30, prediction_days=7)
+            pooled = StockPredictor(input_features=14, sequence_length=30, prediction_days=7, num_symbols=2,
+                                    hidden_dim=32, num_layers=1, num_heads=4)
+            pooled.symbol_index = dict(dataset.symbol_index)
+            pooled.symbol_transforms = dict(dataset.transforms)
+            pooled_path = os.path.join(tmp_dir, 'pooled.onnx')
+            pooled.export_onnx(pooled_path)
+            pooled_backend = OnnxPredictor(pooled_path)
+            expected = pooled.predict_batch(pooled_frames)
+            for symbol, values in pooled_backend.predict_batch(pooled_frames).items():
+                np.testing.assert_allclose(values, expected[symbol], rtol=1e-4, atol=1e-5)
+            np.testing.assert_allclose(pooled_backend.predict_symbol(data, '000001'),
+                                       pooled.predict_symbol(data, '000001'), rtol=1e-4, atol=1e-5)
+            with self.assertRaises(ValueError):
+                pooled_backend.predict(X[:1])
+
+            # 导出失败时原模型的设备和训练状态不变
+            predictor.model.train()
+            with patch('torch.onnx.export', side_effect=RuntimeError('export failed')):
+                with self.assertRaises(RuntimeError):
+                    predictor.export_onnx(os.path.join(tmp_dir, 'failed.onnx'))
+            self.assertTrue(predictor.model.training)
+            self.assertEqual(next(predictor.model.parameters()).device.type, predictor.device.type)
+        print("✅ ONNX推理后端测试通过")
+
+    def test_quantized_inference(self):
+        """测试动态 int8 量化推理"""
+        print("🗜️ 测试int8量化推理...")
+
+        torch.manual_seed(0)
+        crawler = StockDataCrawler(use_store=False)
+        data = crawler.add_technical_indicators(self.test_data.copy())
+        predictor = StockPredictor(input_features=14, sequence_length=30, prediction_days=7,
+                                   hidden_dim=32, num_layers=2, num_heads=4)
+        self.assertFalse(predictor.quantized)
+        X, y = predictor.prepare_data(data)
+
+        # Transformer 编码器和多头注意力保持 float32，其余 Linear 与 LSTM 量化
+        quantized_model = quantize_rcsan(predictor.model)
+        self.assertIsInstance(quantized_model.lstm, torch.ao.nn.quantized.dynamic.LSTM)
+        self.assertIsInstance(quantized_model.input_projection, torch.ao.nn.quantized.dynamic.Linear)
+        self.assertIsInstance(quantized_model.transformer_encoder.layers[0].linear1, torch.nn.Linear)
+        self.assertIsInstance(quantized_model.attention_fusion.out_proj, torch.nn.Linear)
+        self.assertLess(model_size(quantized_model), model_size(predictor.model))
+        self.assertIsInstance(predictor.model.lstm, torch.nn.LSTM)  # 原模型不受影响
+
+        expected = predictor.predict_batch([data])
+        predictor.quantized = True
+        actual = predictor.predict_batch([data])
+        self.assertIsNotNone(predictor._quantized_model)
+        np.testing.assert_allclose(actual, expected, rtol=0.02)
+
+        # 验证窗口上的精度检查
+        report = predictor.quantization_report((X, y))
+        self.assertTrue(predictor.quantized)
+        self.assertEqual(report['samples'], len(X) - int(len(X) * 0.8))
+        self.assertLess(abs(report['int8_val_loss'] - report['fp32_val_loss']), 0.01)
+        self.assertLess(report['max_price_diff'], float(data['close'].max()) * 0.02)
+        self.assertLess(report['int8_size'], report['fp32_size'])
+
+        # 训练或加载后参数变化，量化模型重新生成
+        predictor.quantized = False
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            predictor.checkpoint_path = os.path.join(tmp_dir, 'best_model.pth')
+            predictor.train((X, y), epochs=1, batch_size=16)
+        self.assertIsNone(predictor._quantized_model)
+        print(f"✅ int8量化推理测试通过: 模型 {report['fp32_size'] / 1024:.0f}KB -> {report['int8_size'] / 1024:.0f}KB")
+
+    def test_training_fast_path(self):
+        """测试混合精度与 torch.compile 训练开关"""
+        print("⚡ 测试混合精度与编译训练开关...")
+
+        torch.manual_seed(0)
+        predictor = StockPredictor(input_features=14, sequence_length=30, prediction_days=7)
+        self.assertFalse(predictor.mixed_precision)
+        self.assertIs(predictor.train_module, predictor.model)
+
+        X = torch.rand(8, 30, 14)
+        y = torch.rand(8, 7)
+        predictor.model.eval()
+        with torch.no_grad():
+            expected, _ = predictor._forward((X, y))
+            predictor.mixed_precision = True
+            actual, _ = predictor._forward((X, y))
+
+        # bfloat16 前向的输出转回 float32，与 float32 结果只差舍入误差
+        self.assertEqual(actual.dtype, torch.float32)
+        self.assertLess(float((actual - expected).abs().max()), 0.05)
+
+        # 混合精度下反向传播得到 float32 梯度
+        predictor.model.train()
+        predictor.optimizer.zero_grad()
+        predictions, batch_y = predictor._forward((X, y))
+        predictor.criterion(predictions, batch_y).backward()
+        grads = [p.grad for p in predictor.model.parameters() if p.grad is not None]
+        self.assertTrue(all(g.dtype == torch.float32 and torch.isfinite(g).all() for g in grads))
+
+        # 编译后的模块与原模型共享参数，保存的 state_dict 键名不变
+        compiled = StockPredictor(input_features=14, sequence_length=30, prediction_days=7,
+                                  mixed_precision=True, compile_model=True)
+        self.assertIsNot(compiled.train_module, compiled.model)
+        self.assertEqual(list(compiled.model.state_dict()), list(predictor.model.state_dict()))
+        self.assertIs(next(compiled.train_module.parameters()), next(compiled.model.parameters()))
+        print("✅ 混合精度与编译训练开关测试通过")
+
+    def test_checkpointing(self):
+        """测试内存中保存最佳参数与后台写检查点"""
+        print("💾 测试检查点保存...")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # 写盘期间提交的多份只保留最后一份
+            path = os.path.join(tmp_dir, 'nested', 'checkpoint.pth')
+            writer = CheckpointWriter(path)
+            for i in range(5):
+                writer.submit({'step': torch.tensor(i)})
+            self.assertTrue(writer.close())
+            self.assertEqual(int(torch.load(path)['step']), 4)
+            self.assertFalse(os.path.exists(path + '.tmp'))
+
+            # 写盘失败只给出提示，不中断训练
+            blocker = os.path.join(tmp_dir, 'blocker')
+            open(blocker, 'w').close()
+            failing = CheckpointWriter(os.path.join(blocker, 'checkpoint.pth'))
+            failing.submit({'step': torch.tensor(0)})
+            self.assertFalse(failing.close())
+
+            # 序列化失败时删除临时文件；之后写盘成功则不再报告之前的失败
+            writer.submit({'step': lambda: 0})
+            self.assertFalse(writer.close())
+            self.assertFalse(os.path.exists(path + '.tmp'))
+            self.assertEqual(int(torch.load(path)['step']), 4)
+            writer.submit({'step': torch.tensor(5)})
+            self.assertTrue(writer.close())
+            self.assertIsNone(writer.error)
+
+            # 训练结束时恢复最佳参数，并与写入磁盘的检查点一致
+            crawler = StockDataCrawler(use_store=False)
+            data = crawler.add_technical_indicators(self.test_data.copy())
+            checkpoint_path = os.path.join(tmp_dir, 'best_model.pth')
+            predictor = StockPredictor(input_features=14, sequence_length=30, prediction_days=7,
+                                       checkpoint_path=checkpoint_path)
+            predictor.checkpoint_interval = 2
+            X, y = predictor.prepare_data(data)
+            predictor.train((X, y), epochs=3, batch_size=16)
+            saved = torch.load(checkpoint_path)
+            for name, tensor in predictor.model.state_dict().items():
+                self.assertTrue(torch.equal(saved[name], tensor))
+        print("✅ 检查点保存测试通过")
+
+    def test_hyperparameter_sweep(self):
+        """测试超参数搜索"""
+        print("🔍 测试超参数搜索...")
+
+        trials = grid_trials({'hidden_dim': [16, 32], 'num_heads': [2, 4], 'dropout': [0.1]})
+        self.assertEqual(len(trials), 4)
+        self.assertEqual(trials[0], {'hidden_dim': 16, 'num_heads': 2, 'dropout': 0.1})
+
+        workers, threads = partition_threads(100)
+        self.assertLessEqual(workers, os.cpu_count())
+        self.assertLessEqual(workers * threads, os.cpu_count())
+        self.assertEqual(partition_threads(1)[0], 1)
+
+        # 同一epoch比其他组的中位数差时剪枝
+        pruner = MedianPruner([], prune_after=2, min_trials=2)
+        for trial_id, value in enumerate([0.1, 0.2, 0.3]):
+            self.assertFalse(pruner.should_prune(trial_id, 0, value))
+            pruner.should_prune(trial_id, 1, value)
+        self.assertTrue(pruner.should_prune(3, 1, 0.25))
+        self.assertFalse(pruner.should_prune(4, 1, 0.15))
+
+        crawler = StockDataCrawler(use_store=False)
+        data = crawler.add_technical_indicators(self.test_data.copy())
+        params = {'hidden_dim': 16, 'num_layers': 1, 'num_heads': 2, 'sequence_length': 30}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # 总是剪枝的剪枝器：第一个epoch后就停止
+            always = MedianPruner([(i, 0, 0.0) for i in range(3)], prune_after=1, min_trials=1)
+            result = run_trial(0, params, data, epochs=5, batch_size=16, checkpoint_dir=tmp_dir, pruner=always)
+            self.assertEqual(result['status'], 'pruned')
+            self.assertEqual(result['epochs'], 1)
+            self.assertTrue(os.path.exists(os.path.join(tmp_dir, 'trial_0.pth')))
+
+            # 打开扩展特征时搜索使用与训练、预测相同的特征集合
+            extended_data = crawler.add_technical_indicators(self.test_data.copy(), extended=True)
+            with patch.dict(MODEL_CONFIG, {'extended_features': True}):
+                result = run_trial(2, params, extended_data, epochs=1, batch_size=16, checkpoint_dir=tmp_dir)
+            self.assertEqual(result['status'], 'completed')
+            state_dict = torch.load(os.path.join(tmp_dir, 'trial_2.pth'))
+            self.assertEqual(state_dict['input_projection.weight'].shape[1], len(get_feature_columns(True)))
+
+            # hidden_dim 不能被注意力头数整除时记为失败，不影响其他参数组
+            failed = run_trial(1, dict(params, num_heads=3), data, epochs=1, batch_size=16, checkpoint_dir=tmp_dir)
+            self.assertEqual(failed['status'], 'failed')
+
+            results_path = os.path.join(tmp_dir, 'sweep_results.csv')
+            table = run_sweep(data, {'hidden_dim': [16], 'num_layers': [1], 'num_heads': [2, 3], 'sequence_length': [30]},
+                              epochs=1, batch_size=16, max_workers=2, results_path=results_path, checkpoint_dir=tmp_dir)
+            self.assertEqual(table['status'].tolist(), ['completed', 'failed'])
+            self.assertTrue(np.isfinite(table['best_val_loss'].iloc[0]))
+            saved = pd.read_csv(results_path)
+            self.assertEqual(list(saved.columns), list(table.columns))
+        print("✅ 超参数搜索测试通过")
+
     def test_visualizer(self):
         """测试可视化模块"""
         print("🎨 测试可视化模块...")
@@ -186,7 +1491,9 @@ class TestStockAnalysisSystem(unittest.TestCase):
             X, y = predictor.prepare_data(data_with_indicators)
             
             # 快速训练测试
-            predictor.train((X, y), epochs=3, batch_size=4)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                predictor.checkpoint_path = os.path.join(tmp_dir, 'best_model.pth')
+                predictor.train((X, y), epochs=3, batch_size=4)
             print("✅ 模型训练集成成功")
             
             # 3. 预测
@@ -231,6 +1538,134 @@ def run_performance_test():
         'amount': np.random.uniform(10000000, 500000000, 500)
     })
     
+    # 性能测试：K线解析
+    klines = make_klines(200000)
+    start_time = time.time()
+    parse_klines_loop(klines)
+    loop_time = time.time() - start_time
+    start_time = time.time()
+    StockDataCrawler.parse_klines(klines)
+    bulk_time = time.time() - start_time
+    print(f"🧾 K线解析速度: 逐行 {len(klines) / loop_time:,.0f} 行/秒, "
+          f"批量 {len(klines) / bulk_time:,.0f} 行/秒 ({loop_time / bulk_time:.1f}x)")
+    
+    # 性能测试：多股票指标计算
+    rng = np.random.default_rng(0)
+    frames = {}
+    for i in range(500):
+        frame = large_data[['date']].copy()
+        frame['close'] = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(frame))))
+        frames[f"{i:06d}"] = frame
+    crawler = StockDataCrawler(use_store=False)
+    start_time = time.time()
+    for df in frames.values():
+        crawler.add_technical_indicators(df.copy())
+    loop_time = time.time() - start_time
+    start_time = time.time()
+    crawler.add_technical_indicators_panel(frames)
+    panel_time = time.time() - start_time
+    close = np.column_stack([df['close'].values for df in frames.values()])
+    start_time = time.time()
+    compute_indicators(close)
+    kernel_time = time.time() - start_time
+    print(f"🧮 指标计算 ({len(frames)}只x{len(large_data)}条): 逐只 {loop_time:.2f}秒, "
+          f"面板 {panel_time:.2f}秒 ({loop_time / panel_time:.1f}x), 其中数组计算 {kernel_time:.2f}秒")
+    
+    # 性能测试：路径依赖指标内核
+    ohlc = {name: np.column_stack([df['close'].values * factor for df in frames.values()])
+            for name, factor in [('close', 1.0), ('high', 1.01), ('low', 0.99)]}
+    start_time = time.time()
+    for df in frames.values():
+        close_series = df['close']
+        line = close_series.ewm(span=12).mean() - close_series.ewm(span=26).mean()
+        line.ewm(span=9).mean()
+    pandas_time = time.time() - start_time
+    backends = {'NumPy': False}
+    if indicator_kernels.NUMBA_AVAILABLE:
+        # 预先触发 JIT 编译
+        small = {name: values[:30, :2] for name, values in ohlc.items()}
+        indicator_kernels.macd(small['close'], use_numba=True)
+        indicator_kernels.wilder_rsi(small['close'], use_numba=True)
+        indicator_kernels.atr(small['high'], small['low'], small['close'], use_numba=True)
+        indicator_kernels.kdj(small['high'], small['low'], small['close'], use_numba=True)
+        indicator_kernels.parabolic_sar(small['high'], small['low'], use_numba=True)
+        backends['numba'] = True
+    for backend, use_numba in backends.items():
+        start_time = time.time()
+        indicator_kernels.macd(ohlc['close'], use_numba=use_numba)
+        macd_time = time.time() - start_time
+        start_time = time.time()
+        indicator_kernels.wilder_rsi(ohlc['close'], use_numba=use_numba)
+        indicator_kernels.atr(ohlc['high'], ohlc['low'], ohlc['close'], use_numba=use_numba)
+        indicator_kernels.kdj(ohlc['high'], ohlc['low'], ohlc['close'], use_numba=use_numba)
+        indicator_kernels.parabolic_sar(ohlc['high'], ohlc['low'], use_numba=use_numba)
+        other_time = time.time() - start_time
+        print(f"🧵 {backend} 内核 ({len(frames)}只): MACD {macd_time:.3f}秒 (pandas逐只 {pandas_time:.2f}秒), "
+              f"RSI/ATR/KDJ/SAR {other_time:.3f}秒")
+    
+    # 性能测试：扩展指标（共享滚动窗口）
+    ohlcv_frames = {code: df.assign(high=df['close'] * 1.01, low=df['close'] * 0.99,
+                                    volume=rng.integers(1_000_000, 50_000_000, len(df)).astype(float))
+                    for code, df in frames.items()}
+    start_time = time.time()
+    for df in ohlcv_frames.values():
+        crawler.add_technical_indicators(df.copy(), extended=True)
+    loop_time = time.time() - start_time
+    start_time = time.time()
+    crawler.add_technical_indicators_panel(ohlcv_frames, extended=True)
+    panel_time = time.time() - start_time
+    print(f"🧰 扩展指标 ({len(ohlcv_frames)}只, {len(crawler.extended_indicator_plan.outputs)}列): "
+          f"逐只 {loop_time:.2f}秒, 面板 {panel_time:.2f}秒")
+    
+    # 性能测试：逐根K线更新指标
+    history = large_data[['date', 'close']]
+    new_closes = np.random.uniform(8, 12, 200)
+    start_time = time.time()
+    for close in new_closes:
+        history = pd.concat([history, pd.DataFrame({'close': [close]})], ignore_index=True)
+        crawler.add_technical_indicators(history.copy())
+    recompute_time = time.time() - start_time
+    state = IndicatorState.from_history(large_data)
+    start_time = time.time()
+    for close in new_closes:
+        state.update(close)
+    update_time = time.time() - start_time
+    print(f"➕ 新K线指标更新: 全量重算 {recompute_time / len(new_closes) * 1e3:.2f}毫秒/根, "
+          f"增量 {update_time / len(new_closes) * 1e6:.1f}微秒/根")
+    
+    # 性能测试：长历史滑动窗口构造
+    long_features = np.random.rand(50000, 14)
+    long_target = np.random.rand(50000)
+    start_time = time.time()
+    X_loop, _ = prepare_windows_loop(long_features, long_target, 60, 7)
+    loop_time = time.time() - start_time
+    loop_mb = X_loop.nbytes / 1024 ** 2
+    del X_loop
+    start_time = time.time()
+    with warnings.catch_warnings():
+        # 与 StockPredictor.prepare_data 相同：只读视图，忽略 PyTorch 对只读数组的警告
+        warnings.filterwarnings('ignore', message='The given NumPy array is not writable')
+        X_view = torch.from_numpy(np.lib.stride_tricks.sliding_window_view(
+            long_features.astype(np.float32), 60, axis=0)).transpose(1, 2)
+    view_time = time.time() - start_time
+    print(f"🪟 窗口构造 (5万条, 序列60): 逐个复制 {loop_time:.2f}秒/{loop_mb:.0f}MB, "
+          f"滑动视图 {view_time * 1e3:.1f}毫秒/{X_view.untyped_storage().nbytes() / 1024 ** 2:.1f}MB")
+
+    # 性能测试：联合训练集按批次取数
+    pooled_frames = {f"{i:06d}": pd.DataFrame(np.random.rand(2000, 15), columns=[f"f{j}" for j in range(14)] + ['close'])
+                     for i in range(50)}
+    pooled = PooledWindowDataset(pooled_frames, [f"f{j}" for j in range(14)], sequence_length=60, prediction_days=7)
+    train_idx, _ = pooled.split(0.2)
+    start_time = time.time()
+    for _ in torch.utils.data.DataLoader(torch.utils.data.Subset(pooled, train_idx[:20480]), batch_size=256):
+        pass
+    sample_time = time.time() - start_time
+    start_time = time.time()
+    for _ in pooled.make_loader(train_idx[:20480], batch_size=256):
+        pass
+    batch_time = time.time() - start_time
+    print(f"📦 联合训练集取数 (50只股票, 2万样本): 逐样本 {sample_time:.2f}秒, 按批次 {batch_time:.2f}秒")
+
     # 性能测试：数据处理
     start_time = time.time()
     crawler = StockDataCrawler()
@@ -247,16 +1682,117 @@ def run_performance_test():
     
     # 小规模训练测试
     start_time = time.time()
-    predictor.train((X, y), epochs=5, batch_size=8)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        predictor.checkpoint_path = os.path.join(tmp_dir, 'best_model.pth')
+        predictor.train((X, y), epochs=5, batch_size=8)
     training_time = time.time() - start_time
     print(f"🧠 模型训练时间: {training_time:.2f}秒 (5个epoch)")
-    
+
+    # 性能测试：每次验证损失下降时同步写盘 vs 内存中复制最佳参数
+    state_dict = predictor.model.state_dict()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start_time = time.time()
+        for _ in range(20):
+            torch.save(state_dict, os.path.join(tmp_dir, 'best_model.pth'))
+        save_time = (time.time() - start_time) / 20
+    start_time = time.time()
+    for _ in range(20):
+        best_state = {name: tensor.detach().clone() for name, tensor in state_dict.items()}
+    clone_time = (time.time() - start_time) / 20
+    print(f"💾 保存最佳参数: 同步写盘 {save_time * 1e3:.1f}毫秒/次, 内存复制 {clone_time * 1e3:.1f}毫秒/次")
+
+    # 性能测试：混合精度与 torch.compile 训练路径（首个 epoch 含编译时间）
+    from torch.utils.data import DataLoader, TensorDataset
+    loader = DataLoader(TensorDataset(X.contiguous(), y.contiguous()), batch_size=32)
+    for mixed_precision, compile_model in [(False, False), (True, False), (False, True), (True, True)]:
+        torch.manual_seed(0)
+        fast = StockPredictor(input_features=14, sequence_length=60, prediction_days=7,
+                              mixed_precision=mixed_precision, compile_model=compile_model)
+        fast.model.train()
+        epoch_times = []
+        for _ in range(3):
+            start_time = time.time()
+            epoch_loss = 0.0
+            for batch in loader:
+                fast.optimizer.zero_grad()
+                predictions, batch_y = fast._forward(batch)
+                loss = fast.criterion(predictions, batch_y)
+                loss.backward()
+                fast.optimizer.step()
+                epoch_loss += loss.item()
+            epoch_times.append(time.time() - start_time)
+        label = ('bf16' if mixed_precision else 'fp32') + (' + compile' if compile_model else '')
+        print(f"⚡ 训练路径 {label}: 首个epoch {epoch_times[0]:.2f}秒, 之后 {np.mean(epoch_times[1:]):.2f}秒/epoch, "
+              f"第3个epoch损失 {epoch_loss / len(loader):.6f}")
+
     # 预测性能测试
     start_time = time.time()
     predictions = predictor.predict(X[:10])
     prediction_time = time.time() - start_time
     print(f"🔮 预测时间: {prediction_time:.2f}秒 (10个样本)")
-    
+
+    # 性能测试：逐个窗口预测（每次重新拟合归一化）vs 批量预测
+    from sklearn.preprocessing import MinMaxScaler
+    frames = [data_with_indicators.iloc[:end] for end in range(len(data_with_indicators) - 256, len(data_with_indicators))]
+    start_time = time.time()
+    for frame in frames:
+        window = frame[predictor.feature_columns].tail(60).fillna(method='bfill').fillna(method='ffill')
+        predictor.predict(MinMaxScaler().fit_transform(window))
+    single_time = time.time() - start_time
+    start_time = time.time()
+    predictor.predict_batch(frames)
+    batch_time = time.time() - start_time
+    raw_windows = np.stack([f[predictor.feature_columns].tail(60).to_numpy() for f in frames])
+    start_time = time.time()
+    predictor.predict_batch(raw_windows)
+    array_time = time.time() - start_time
+    print(f"📦 批量预测 ({len(frames)}个窗口): 逐个 {len(frames) / single_time:.0f}个/秒, "
+          f"批量(DataFrame) {len(frames) / batch_time:.0f}个/秒, 批量(数组) {len(frames) / array_time:.0f}个/秒")
+
+    # 性能测试：float32 vs 动态 int8 量化（验证窗口上的精度、模型大小和延迟）
+    report = predictor.quantization_report((X, y))
+    print(f"🗜️ int8量化 ({report['samples']}个验证窗口): 验证损失 {report['fp32_val_loss']:.6f} -> "
+          f"{report['int8_val_loss']:.6f}, 价格偏差 平均¥{report['mean_price_diff']:.4f}/最大¥{report['max_price_diff']:.4f}")
+    print(f"   模型大小 {report['fp32_size'] / 1024 ** 2:.2f}MB -> {report['int8_size'] / 1024 ** 2:.2f}MB, "
+          f"单窗口 {report['fp32_single_latency'] * 1e3:.1f} -> {report['int8_single_latency'] * 1e3:.1f}毫秒, "
+          f"批量 {report['fp32_batch_latency'] * 1e3:.0f} -> {report['int8_batch_latency'] * 1e3:.0f}毫秒")
+
+    # 性能测试：结构消融（参数量、浮点运算数、单窗口 CPU 延迟、验证损失）
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run_ablation(data_with_indicators, epochs=5, batch_size=32, checkpoint_dir=tmp_dir,
+                     results_path=os.path.join(tmp_dir, 'ablation_results.csv'))
+
+    # 性能测试：PyTorch vs ONNX Runtime 推理延迟（含进程冷启动）
+    if ONNX_AVAILABLE:
+        import subprocess
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            onnx_path = os.path.join(tmp_dir, 'rcsan.onnx')
+            model_path = os.path.join(tmp_dir, 'rcsan.pth')
+            predictor.export_onnx(onnx_path)
+            predictor.save_model(model_path)
+            backend = OnnxPredictor(onnx_path)
+            for name, model in [('PyTorch', predictor), ('ONNX Runtime', backend)]:
+                model.predict_batch(raw_windows[:1])
+                start_time = time.time()
+                for i in range(50):
+                    model.predict_batch(raw_windows[i:i + 1])
+                single_latency = (time.time() - start_time) / 50
+                start_time = time.time()
+                model.predict_batch(raw_windows)
+                batch_latency = time.time() - start_time
+                print(f"📤 {name}: 单窗口 {single_latency * 1e3:.1f}毫秒, {len(raw_windows)}个窗口 {batch_latency * 1e3:.0f}毫秒")
+
+            project_dir = os.path.dirname(os.path.abspath(__file__))
+            cold_start = {
+                'PyTorch': f"from rcsan_model import StockPredictor; p = StockPredictor(input_features=14); "
+                           f"p.load_model({model_path!r})",
+                'ONNX Runtime': f"from onnx_backend import OnnxPredictor; OnnxPredictor({onnx_path!r})",
+            }
+            for name, code in cold_start.items():
+                start_time = time.time()
+                subprocess.run([sys.executable, '-c', code], cwd=project_dir, capture_output=True, check=True)
+                print(f"🚀 {name} 冷启动（导入 + 加载模型）: {time.time() - start_time:.2f}秒")
+
     print("⚡ 性能测试完成")
 
 def main():
@@ -0,0 +1,105 @@
+import os
+from datetime import datetime
+import pandas as pd
+
+class StockUniverse:
+    """全市场A股代码表
+
+    以 (code, name, exchange) 三列保存在 {data_dir}/universe.csv，
+    加载后建立 代码 -> (名称, 交易所) 的字典，查询为 O(1)。
+    文件修改日期早于今天即视为过期，最多每天刷新一次。
+    """
+
+    COLUMNS = ['code', 'name', 'exchange']
+
+    def __init__(self, data_dir):
+        self.path = os.path.join(data_dir, 'universe.csv')
+        self.table = None
+        self._index = None
+
+    @staticmethod
+    def exchange_of(code, market=None):
+        """根据东方财富市场编号和代码判断交易所（sh/sz/bj）"""
+        if market is not None and int(market) == 1:
+            return 'sh'
+        if code.startswith(('4', '8', '92')):
+            return 'bj'
+        if market is None and code.startswith(('5', '6', '9')):
+            return 'sh'
+        return 'sz'
+
+    @classmethod
+    def parse_page(cls, payload):
+        """解析东方财富列表接口的一页数据，返回 (行列表, 总数)"""
+        data = (payload or {}).get('data') or {}
+        diff = data.get('diff') or []
+        if isinstance(diff, dict):
+            diff = list(diff.values())
+        rows = []
+        for item in diff:
+            code = str(item.get('f12', '')).strip()
+            name = str(item.get('f14', '')).strip()
+            if code and name and name != '-':
+                rows.append((code, name, cls.exchange_of(code, item.get('f13'))))
+        return rows, int(data.get('total') or 0)
+
+    def is_stale(self):
+        """本地代码表不存在或不是今天更新的"""
+        if not os.path.exists(self.path):
+            return True
+        modified = datetime.fromtimestamp(os.path.getmtime(self.path)).date()
+        return modified < datetime.now().date()
+
+    def load(self):
+        """从本地文件加载代码表，文件不存在时返回 False"""
+        if not os.path.exists(self.path):
+            return False
+        table = pd.read_csv(self.path, dtype=str, keep_default_na=False, encoding='utf-8')
+        self._set_table(table)
+        return True
+
+    def save(self, rows):
+        """保存代码表（去重后按代码排序）"""
+        table = pd.DataFrame(rows, columns=self.COLUMNS)
+        table = table.drop_duplicates('code').sort_values('code').reset_index(drop=True)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        table.to_csv(tmp_path, index=False, encoding='utf-8')
+        os.replace(tmp_path, self.path)
+        self._set_table(table)
+
+    def _set_table(self, table):
+        table['exchange'] = table['exchange'].astype('category')
+        self.table = table
+        self._index = dict(zip(table['code'], zip(table['name'], table['exchange'].astype(str))))
+
+    def _ensure_loaded(self):
+        if self._index is None:
+            if not self.load():
+                self._index = {}
+
+    def lookup(self, code):
+        """查询股票 (名称, 交易所)，不存在时返回 None"""
+        self._ensure_loaded()
+        return self._index.get(code)
+
+    def name(self, code):
+        entry = self.lookup(code)
+        return entry[0] if entry else None
+
+    def exchange(self, code):
+        entry = self.lookup(code)
+        return entry[1] if entry else None
+
+    def names(self):
+        """代码 -> 名称 字典"""
+        self._ensure_loaded()
+        return {code: entry[0] for code, entry in self._index.items()}
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._index)
+
+    def __contains__(self, code):
+        self._ensure_loaded()
+        return code in self._index
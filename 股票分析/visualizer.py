@@ -9,6 +9,9 @@ from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
+from config import PATH_CONFIG
+from universe import StockUniverse
+
 # 设置中文字体和美化样式
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']
 plt.rcParams['axes.unicode_minus'] = False
@@ -39,7 +42,11 @@ sns.set_style("whitegrid", {
 class StockVisualizer:
     """股票数据可视化类"""
     
-    def __init__(self):
+    def __init__(self, data_dir=None):
+        # 全市场代码表（由 StockDataCrawler.refresh_universe 维护）
+        self.universe = StockUniverse(data_dir or PATH_CONFIG['data_dir'])
+        self._stock_name_dict = None
+        
         # 更丰富的配色方案
         self.colors = {
             'up': '#f55353',         # 上涨红色 - 更柔和
@@ -67,7 +74,15 @@ class StockVisualizer:
         }
     
     def get_stock_name_dict(self):
-        """获取股票名称字典"""
+        """获取股票名称字典（常用股票 + 本地全市场代码表）"""
+        if self._stock_name_dict is None:
+            names = self._default_stock_names()
+            names.update(self.universe.names())
+            self._stock_name_dict = names
+        return self._stock_name_dict
+    
+    def _default_stock_names(self):
+        """常用股票名称，本地代码表不存在时使用"""
         return {
             '000001': '平安银行',
             '000002': '万科A', 